@@ -0,0 +1,271 @@
+# retail_selector/amazon_bench.py
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from .parsing import (
+    parse_amazon_price_stock,
+    parse_html_price_stock,
+    parse_jsonld_price_stock,
+    parse_generic_price_stock,
+)
+
+# Accuracy + speed check for the Amazon extractor on trimmed Amazon page
+# fixtures (buybox markup around the noise that trips the generic parser:
+# list prices, savings, other sellers, sponsored products):
+#
+#   python -m retailer_selector.amazon_bench
+#
+# "before" is the path Amazon pages took without the extractor (JSON-LD,
+# then generic text); a row goes to the AI fallback when neither finds a
+# price or stock. A page without a readable buybox price should go to the AI
+# rather than take a guessed price. Fails (exit 1) when the extractor gets a
+# fixture wrong. tests/test_amazon_parser.py asserts the same outcomes. On
+# real runs, the AI column of
+#   python -m retailer_selector.log_analytics --retailer amazon
+# shows the fallback rate; add a fixture for every Amazon layout still
+# reaching the AI.
+
+URL = "https://www.amazon.com/dp/B0EXAMPLE"
+
+_SPONSORED = """
+<div id="sp_detail" class="a-carousel">
+  <li><span class="a-price"><span class="a-offscreen">$9.99</span></span> Sponsored</li>
+  <li><span class="a-price"><span class="a-offscreen">$12.49</span></span> Sponsored</li>
+  <li><span class="a-price"><span class="a-offscreen">$4.97</span></span> 4.5 out of 5 stars</li>
+</div>
+"""
+
+_OTHER_SELLERS = """
+<div id="olp_feature_div">
+  <a>New (12) from <span class="a-price"><span class="a-offscreen">$18.20</span></span> & FREE Shipping</a>
+</div>
+<div id="usedBuySection">Used - Good <span class="a-color-price">$14.03</span></div>
+"""
+
+# name → (html, expected (price, stock), or None: left to the AI fallback)
+FIXTURES: Dict[str, Tuple[str, Optional[Tuple[Optional[float], Optional[str]]]]] = {
+    "core_price_with_list_price": (
+        f"""<html><body>
+<div id="corePriceDisplay_desktop_feature_div">
+  <span class="a-price aok-align-center priceToPay"><span class="a-offscreen">$24.99</span>
+    <span aria-hidden="true"><span class="a-price-symbol">$</span><span class="a-price-whole">24<span class="a-price-decimal">.</span></span><span class="a-price-fraction">99</span></span></span>
+  <span class="a-size-small">List Price: <span class="a-price a-text-price"><span class="a-offscreen">$39.99</span></span></span>
+  <span class="savingsPercentage">-38%</span> You Save: $15.00
+</div>
+<div id="availability"><span class="a-size-medium a-color-success">In Stock</span></div>
+<div>FREE delivery on orders shipped by Amazon over $35</div>
+{_OTHER_SELLERS}{_SPONSORED}
+</body></html>""",
+        (24.99, "Y"),
+    ),
+    "legacy_deal_price_low_stock": (
+        f"""<html><body>
+<table class="a-lineitem">
+  <tr><td>Was:</td><td><span class="a-text-strike">$29.99</span></td></tr>
+  <tr><td>Deal of the Day:</td><td><span id="priceblock_dealprice" class="a-color-price">$17.49</span></td></tr>
+  <tr><td>You Save:</td><td>$12.50 (42%)</td></tr>
+</table>
+<div id="availability"><span class="a-color-price">Only 3 left in stock - order soon.</span></div>
+{_SPONSORED}
+</body></html>""",
+        (17.49, "Y"),
+    ),
+    "currently_unavailable": (
+        f"""<html><body>
+<div id="corePrice_feature_div"></div>
+<div id="outOfStock"><div id="availability"><span class="a-color-price a-text-bold">Currently unavailable.</span>
+  We don't know when or if this item will be back in stock.</div></div>
+{_OTHER_SELLERS}{_SPONSORED}
+</body></html>""",
+        (None, "N"),
+    ),
+    "whole_fraction_only": (
+        f"""<html><body>
+<div id="corePrice_feature_div">
+  <span class="a-price aok-align-center"><span aria-hidden="true"><span class="a-price-symbol">$</span><span class="a-price-whole">129<span class="a-price-decimal">.</span></span><span class="a-price-fraction">99</span></span></span>
+</div>
+<input type="submit" id="add-to-cart-button" value="Add to Cart">
+<div>Protection plan: 2-Year for $14.99, 3-Year for $21.99</div>
+{_SPONSORED}
+</body></html>""",
+        (129.99, "Y"),
+    ),
+    "twister_buying_options_json": (
+        f"""<html><body>
+<div id="twister-plus-inline-twister">
+  <div class="twister-plus-buying-options-price-data">{{"desktop_buybox_group_1":[
+    {{"displayPrice":"$41.20","priceAmount":41.2,"currencySymbol":"$","buyingOptionType":"USED"}},
+    {{"displayPrice":"$54.00","priceAmount":54.0,"currencySymbol":"$","buyingOptionType":"NEW"}}]}}</div>
+</div>
+<div id="availability"><span class="a-size-medium a-color-success">In Stock</span></div>
+{_OTHER_SELLERS}
+</body></html>""",
+        (54.00, "Y"),
+    ),
+    "temporarily_out_of_stock": (
+        f"""<html><body>
+<div id="apex_desktop">
+  <span class="a-price a-text-price a-size-medium"><span class="a-offscreen">$11.99</span></span>
+  <span class="a-price"><span class="a-offscreen">$8.99</span></span>
+</div>
+<div id="availability"><span class="a-color-price">Temporarily out of stock.</span>
+  We are working hard to be back in stock as soon as possible.</div>
+{_SPONSORED}
+</body></html>""",
+        (8.99, "N"),
+    ),
+    "thousands_separator": (
+        f"""<html><body>
+<div id="apex_desktop">
+  <span class="a-price a-text-price"><span class="a-offscreen">$1,499.00</span></span>
+  <span class="a-price reinventPricePriceToPayMargin priceToPay"><span class="a-offscreen">$1,249.00</span></span>
+</div>
+<div id="availability"><span class="a-color-success">In Stock</span></div>
+<div>Or $104.09/mo (12 mo). Select from 1 card</div>
+{_SPONSORED}
+</body></html>""",
+        (1249.00, "Y"),
+    ),
+    "buybox_ships_within": (
+        f"""<html><body>
+<div id="buybox">
+  <span id="price_inside_buybox" class="a-size-medium a-color-price">$33.15</span>
+  <div id="availability"><span class="a-color-success">Usually ships within 2 to 3 days.</span></div>
+</div>
+{_OTHER_SELLERS}{_SPONSORED}
+</body></html>""",
+        (33.15, "Y"),
+    ),
+    "twister_price_amount_only": (
+        f"""<html><body>
+<div id="twister-plus-inline-twister">
+  <div class="twister-plus-buying-options-price-data">{{"desktop_buybox_group_1":[
+    {{"priceAmount":54.0,"currencySymbol":"$","buyingOptionType":"NEW"}}]}}</div>
+</div>
+<div id="availability"><span class="a-color-success">Usually ships within 4 to 5 days.</span></div>
+</body></html>""",
+        (54.00, "Y"),
+    ),
+    "whole_fraction_ships_from": (
+        """<html><body>
+<div id="corePrice_feature_div">
+  <span class="a-price"><span aria-hidden="true"><span class="a-price-whole">19<span class="a-price-decimal">.</span></span><span class="a-price-fraction">49</span></span></span>
+</div>
+<div id="availability"><span>Ships from and sold by Amazon.com.</span></div>
+</body></html>""",
+        (19.49, "Y"),
+    ),
+    "in_stock_no_buybox_price": (
+        f"""<html><body>
+<div id="corePrice_feature_div"><div class="a-section a-spacing-micro"></div></div>
+<div id="availability"><span class="a-size-medium a-color-success">In Stock</span></div>
+<input type="submit" id="add-to-cart-button" value="Add to Cart">
+{_OTHER_SELLERS}{_SPONSORED}
+</body></html>""",
+        None,
+    ),
+}
+
+RUNS = 20
+
+
+def _before(html: str) -> Optional[Dict[str, Any]]:
+    """
+    Amazon pages without the extractor: JSON-LD, then generic text, each
+    parsing the page on its own.
+    """
+    for strategy in (parse_jsonld_price_stock, parse_generic_price_stock):
+        res = strategy(html)
+        if res:
+            return res
+    return None
+
+
+def _answered(res: Optional[Dict[str, Any]]) -> bool:
+    # hybrid_lookup_from_bee_result calls the AI when this is False
+    return bool(res) and (res["price"] is not None or res["stock"] is not None)
+
+
+def _correct(res: Optional[Dict[str, Any]], expected: Optional[Tuple[Optional[float], Optional[str]]]) -> bool:
+    if expected is None:
+        return not _answered(res)
+    if not _answered(res):
+        return False
+    price, stock = expected
+    got = res["price"]
+    same_price = (got is None and price is None) or (
+        got is not None and price is not None and abs(got - price) < 0.005
+    )
+    return same_price and res["stock"] == stock
+
+
+def _time_ms(fn, *args, runs: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        fn(*args)
+    return (time.perf_counter() - t0) * 1000.0 / runs
+
+
+def run_bench(runs: int = RUNS) -> List[str]:
+    """
+    Score every fixture before / after; returns the failures (empty = ok).
+    """
+    problems = []
+    totals = {f"{key}_{what}": 0 for key in ("before", "after") for what in ("ok", "ai", "wrong")}
+    before_ms = after_ms = 0.0
+    print(f"{'fixture':32} {'before':>16} {'after':>16} {'before ms':>10} {'after ms':>9}")
+    for name, (html, expected) in FIXTURES.items():
+        before = _before(html)
+        after = parse_html_price_stock(URL, html)
+        direct = parse_amazon_price_stock(html)
+
+        states = []
+        for key, res in (("before", before), ("after", after)):
+            ok = _correct(res, expected)
+            totals[f"{key}_ok"] += ok
+            totals[f"{key}_ai"] += not _answered(res)
+            totals[f"{key}_wrong"] += _answered(res) and not ok
+            state = "AI fallback" if not _answered(res) else ("ok" if ok else "wrong")
+            states.append(state + (" (ok)" if ok and expected is None else ""))
+
+        b_ms = _time_ms(_before, html, runs=runs)
+        a_ms = _time_ms(parse_html_price_stock, URL, html, runs=runs)
+        before_ms += b_ms
+        after_ms += a_ms
+        print(f"{name:32} {states[0]:>16} {states[1]:>16} {b_ms:10.2f} {a_ms:9.2f}")
+
+        if not _correct(after, expected) or (expected is not None and after.get("source") != "amazon_buybox"):
+            problems.append(
+                f"{name}: expected {expected or 'AI fallback'}, got {after} "
+                f"(extractor alone: {direct})"
+            )
+
+    n = len(FIXTURES)
+    readable = sum(1 for _, expected in FIXTURES.values() if expected is not None)
+    print(
+        f"\ncorrect: {totals['before_ok']}/{n} before → {totals['after_ok']}/{n} after; "
+        f"AI fallbacks: {totals['before_ai']}/{n} before → {totals['after_ai']}/{n} after "
+        f"({n - readable} without a buybox price); "
+        f"wrong prices accepted: {totals['before_wrong']} → {totals['after_wrong']}; "
+        f"parse time {before_ms:.1f} ms → {after_ms:.1f} ms"
+    )
+    return problems
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Amazon extractor accuracy / speed on the built-in fixtures.")
+    p.add_argument("--runs", type=int, default=RUNS, help="Timing repetitions per fixture")
+    args = p.parse_args()
+
+    problems = run_bench(args.runs)
+    if problems:
+        print("\nAmazon extractor failures:\n  " + "\n  ".join(problems))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,13 @@ from __future__ import annotations
 
 import os
 import json
+import threading
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import TYPE_CHECKING, Dict, Any, Optional
 import time
-from openai import OpenAI
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 # -------------------------
 # Base project root
@@ -46,11 +49,107 @@ SERVICE_ACCOUNT_FILE = PROJECT_ROOT / "retailer_selector" / "retail-selector-bot
 # Scraping concurrency
 MAX_CONCURRENCY = 10
 
+# HTML parse worker processes (0 = parse on a thread in the main process)
+PARSE_WORKERS = 0
+
+# Run deadline (--deadline / --max-runtime):
+# stop starting fetches this long before the deadline to leave time for save/upload/email,
+FINALIZE_RESERVE_SECONDS = 180
+# and let in-flight fetches run this much longer before they are cancelled.
+DEADLINE_GRACE_SECONDS = 60
+
+# -------------------------
+# Local run state (incremental scanning etc.)
+# -------------------------
+
+# Package folder itself (PROJECT_ROOT / "retailer_selector")
+PACKAGE_ROOT = Path(__file__).resolve().parent
+
+# Local, git-ignored folder for state that must survive between runs
+STATE_DIR = PACKAGE_ROOT / "state"
+
+# Per-row scan history used by incremental mode
+SCAN_STATE_PATH = STATE_DIR / "scan_state.json"
+
+# Adaptive revisit window: volatile rows shrink towards MIN, stable rows grow towards MAX
+MIN_REVISIT_HOURS = 6.0
+DEFAULT_REVISIT_HOURS = 24.0
+MAX_REVISIT_HOURS = 24.0 * 14
+
+# Master workbook XLSX exports, keyed by Drive revision
+XLSX_CACHE_DIR = STATE_DIR / "xlsx_cache"
+
+# Default folder for --shard result partitions (point all shards at a shared dir)
+SHARD_DIR = STATE_DIR / "shards"
+
+# -------------------------
+# Retailer fetch profiles (Retailers tab + local overrides, see retailers.py)
+# -------------------------
+
+RETAILER_PROFILES_PATH = Path(
+    os.environ.get("RETAIL_SELECTOR_RETAILER_PROFILES", PACKAGE_ROOT / "retailer_profiles.json")
+)
+
+# -------------------------
+# Logs (<LOG_ROOT>/<mode>/date=YYYY-MM-DD/hour=HH/retail_selector-<run id>-<seq>.jsonl)
+# -------------------------
+
+LOG_ROOT = Path(os.environ.get("RETAIL_SELECTOR_LOG_ROOT", PACKAGE_ROOT / "logs"))
+
+# Rotate a run's log file at this size; closed files are compressed
+# ("gzip", "zstd" if the zstandard package is installed, or "none")
+LOG_MAX_BYTES = 64 * 1024 * 1024
+LOG_COMPRESSION = os.environ.get("RETAIL_SELECTOR_LOG_COMPRESSION", "gzip")
+
+# -------------------------
+# Backends (offline runs / benchmarking)
+# -------------------------
+
+# Scraper API endpoint; point at a local fake_scraper for offline runs
+SCRAPINGBEE_ENDPOINT = os.environ.get(
+    "RETAIL_SELECTOR_SCRAPER_ENDPOINT", "https://app.scrapingbee.com/api/v1/"
+)
+
+# Sheets/Drive storage: "google" (real sheets) or "local" (file-backed stand-in)
+STORAGE_BACKEND = os.environ.get("RETAIL_SELECTOR_STORAGE", "google")
+
+# Local backend folder (master.xlsx in, output_map.json out) and per-call latency
+LOCAL_STORAGE_DIR = Path(os.environ.get("RETAIL_SELECTOR_LOCAL_DIR", STATE_DIR / "local_backend"))
+LOCAL_STORAGE_LATENCY_MS = float(os.environ.get("RETAIL_SELECTOR_LOCAL_LATENCY_MS", "0"))
+
+# When set, emails are written here as .eml files instead of going out over SMTP
+EMAIL_OUTBOX_DIR: Optional[Path] = (
+    Path(os.environ["RETAIL_SELECTOR_OUTBOX"]) if os.environ.get("RETAIL_SELECTOR_OUTBOX") else None
+)
+
+# -------------------------
+# Daemon mode (python -m retailer_selector.daemon)
+# -------------------------
+
+# Nightly full scan + email, local time HH:MM
+DAEMON_FULL_SCAN_AT = os.environ.get("RETAIL_SELECTOR_FULL_SCAN_AT", "02:00")
+
+# Active Watch List sweep interval (0 disables the sweeps)
+DAEMON_WATCH_SWEEP_MINUTES = float(os.environ.get("RETAIL_SELECTOR_WATCH_SWEEP_MINUTES", "30"))
+
+# A failed scan is retried (resuming its journal) this many minutes later,
+# at most DAEMON_MAX_RETRIES times before waiting for the next regular run
+DAEMON_RETRY_MINUTES = float(os.environ.get("RETAIL_SELECTOR_RETRY_MINUTES", "10"))
+DAEMON_MAX_RETRIES = 2
+
+# Local status endpoint (GET /status, /metrics)
+DAEMON_STATUS_HOST = "127.0.0.1"
+DAEMON_STATUS_PORT = int(os.environ.get("RETAIL_SELECTOR_STATUS_PORT", "8780"))
+
 # -------------------------
 # OpenAI global client/model
 # -------------------------
 
+# The client is built on first use (get_openai_client): importing openai
+# takes about a second, and most rows never reach the AI fallback.
 client: Optional[OpenAI] = None
+OPENAI_API_KEY: Optional[str] = None
+_CLIENT_LOCK = threading.Lock()
 OPENAI_MODEL: str = "gpt-4o-mini"  # default; can be overridden via secrets.json
 
 # Toggle for HTML → AI parsing
@@ -72,7 +171,7 @@ def load_secrets(secrets_path: Path | str | None = None) -> Dict[str, Any]:
       - EMAIL_FROM
       - EMAIL_TO
     """
-    global client, OPENAI_MODEL, USE_AI_HTML
+    global client, OPENAI_API_KEY, OPENAI_MODEL, USE_AI_HTML
 
     if secrets_path is None:
         secrets_path = DEFAULT_SECRETS_PATH
@@ -109,7 +208,25 @@ def load_secrets(secrets_path: Path | str | None = None) -> Dict[str, Any]:
     os.environ["SCRAPINGBEE_API_KEY"] = secrets["SCRAPINGBEE_API_KEY"]
     os.environ["OPENAI_API_KEY"] = secrets["OPENAI_API_KEY"]
 
-    # Initialize the shared OpenAI client
-    client = OpenAI(api_key=secrets["OPENAI_API_KEY"])
+    # The shared OpenAI client is (re)built lazily with this key; an
+    # unchanged key keeps the warm client (daemon mode reloads secrets per scan)
+    if secrets["OPENAI_API_KEY"] != OPENAI_API_KEY:
+        OPENAI_API_KEY = secrets["OPENAI_API_KEY"]
+        client = None
 
     return secrets
+
+
+def get_openai_client() -> OpenAI:
+    """
+    Shared OpenAI client, created (and openai imported) on first use.
+    """
+    global client
+    with _CLIENT_LOCK:
+        if client is None:
+            if OPENAI_API_KEY is None:
+                raise RuntimeError("OpenAI client not initialized. Call load_secrets() first.")
+            from openai import OpenAI
+
+            client = OpenAI(api_key=OPENAI_API_KEY)
+        return client
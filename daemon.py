@@ -0,0 +1,416 @@
+# retail_selector/daemon.py
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import json
+import signal
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from aiohttp import web
+
+from . import config
+from .config import (
+    DEFAULT_WORKBOOK_PATH,
+    DEFAULT_SECRETS_PATH,
+    PARSE_WORKERS,
+    STORAGE_BACKEND,
+    DAEMON_FULL_SCAN_AT,
+    DAEMON_WATCH_SWEEP_MINUTES,
+    DAEMON_RETRY_MINUTES,
+    DAEMON_MAX_RETRIES,
+    DAEMON_STATUS_HOST,
+    DAEMON_STATUS_PORT,
+    load_secrets,
+)
+from .logger import log, set_run_mode, close_logs, RUN_ID
+from .metrics import counter_total, to_openmetrics
+from .journal import journal_path
+from .scraping import open_warm_session, close_warm_session
+from .storage import close_storage_backend
+from .orchestrator import run_scan_from_gsheet_and_email, run_hybrid_pricer_async
+
+# Long-running scanner: one process, one event loop, so the scraper session,
+# the Google client (token + connection pool) and the OpenAI client stay warm
+# between scans. Runs
+#   full   nightly at DAEMON_FULL_SCAN_AT: scan everything, upload, email
+#   watch  every DAEMON_WATCH_SWEEP_MINUTES: rescan the Active Watch List rows
+#          and upload (others carried forward)
+# one at a time (a failed scan is retried soon, resuming its journal), and
+# serves progress / last-run stats on
+#   http://127.0.0.1:<DAEMON_STATUS_PORT>/status   (and /metrics, OpenMetrics)
+
+# Counters reported per run in /status (deltas over the run)
+RUN_COUNTERS = (
+    "fetches",
+    "fetches_completed",
+    "fetch_retries",
+    "fetch_timeouts",
+    "fetch_exceptions",
+    "fetch_skipped",
+    "ai_calls",
+    "ai_errors",
+)
+
+# Longest sleep between schedule checks (picks up clock changes)
+SCHEDULER_TICK_SECONDS = 60.0
+
+
+def _parse_hhmm(value: str) -> tuple:
+    hh, mm = value.strip().split(":")
+    return int(hh), int(mm)
+
+
+def next_daily(at: str, now: datetime) -> datetime:
+    """
+    Next local datetime at HH:MM strictly after now.
+    """
+    hh, mm = _parse_hhmm(at)
+    t = now.replace(hour=hh, minute=mm, second=0, microsecond=0)
+    return t if t > now else t + timedelta(days=1)
+
+
+class ScanDaemon:
+    def __init__(
+        self,
+        secrets_path: Path,
+        workbook_dir: Path,
+        full_at: Optional[str] = DAEMON_FULL_SCAN_AT,
+        watch_every_min: float = DAEMON_WATCH_SWEEP_MINUTES,
+        concurrency: int = 20,
+        parse_workers: int = PARSE_WORKERS,
+        upload: bool = True,
+        save_copies: bool = False,
+        resume: bool = False,
+        status_host: str = DAEMON_STATUS_HOST,
+        status_port: int = DAEMON_STATUS_PORT,
+    ):
+        self.secrets_path = secrets_path
+        self.workbook_dir = workbook_dir
+        self.full_at = full_at
+        self.watch_every = timedelta(minutes=watch_every_min) if watch_every_min > 0 else None
+        self.concurrency = concurrency
+        self.parse_workers = parse_workers
+        self.upload = upload
+        self.save_copies = save_copies
+        self.status_host = status_host
+        self.status_port = status_port
+
+        self.started_at = datetime.now()
+        self.next_runs: Dict[str, Optional[datetime]] = {
+            "full": next_daily(full_at, self.started_at) if full_at else None,
+            "watch": self.started_at + self.watch_every if self.watch_every else None,
+        }
+        self.retry_after = timedelta(minutes=DAEMON_RETRY_MINUTES)
+        self.current: Optional[Dict[str, Any]] = None
+        self.last_runs: Dict[str, Dict[str, Any]] = {}
+        # Kinds whose last scan did not finish → epoch seconds from which its
+        # journaled rows are resumed; older rows are stale and rescanned
+        self.resume_kinds: Dict[str, float] = {}
+        self.retries: Dict[str, int] = {"full": 0, "watch": 0}
+        if resume:
+            self._resume_at_start()
+        self.totals = {"runs": 0, "failures": 0}
+        self._stop = asyncio.Event()
+        self._scan_task: Optional[asyncio.Task] = None
+
+    def _resume_at_start(self) -> None:
+        # --resume: a scan stopped with the daemon runs right away (or as
+        # --run-now), resuming rows journaled within one interval of its kind
+        now = datetime.now()
+        intervals = {"full": timedelta(days=1), "watch": self.watch_every or timedelta(days=1)}
+        for kind, name in (("full", "workbook"), ("watch", "map")):
+            if not journal_path(name).exists():
+                continue
+            self.resume_kinds[kind] = (now - intervals[kind]).timestamp()
+            if self.next_runs[kind] is not None:
+                self.next_runs[kind] = now
+
+    # ---------------------------------------------------------------
+    # Scans
+    # ---------------------------------------------------------------
+
+    async def _scan(self, kind: str) -> Dict[str, Any]:
+        resume_since = self.resume_kinds.get(kind)
+        resume = resume_since is not None
+        if resume:
+            log(
+                f"daemon: {kind} scan resumes rows journaled since "
+                f"{datetime.fromtimestamp(resume_since).isoformat(timespec='seconds')}",
+                context="daemon",
+            )
+        if kind == "full":
+            workbook_path = self.workbook_dir / (
+                f"Retail Arbitrage Targeting List {time.strftime('%Y%m%d-%H%M%S')}.xlsx"
+            )
+            return await run_scan_from_gsheet_and_email(
+                workbook_path=workbook_path,
+                secrets_path=self.secrets_path,
+                concurrency=self.concurrency,
+                upload=self.upload,
+                incremental=False,
+                resume=resume,
+                resume_since=resume_since,
+                parse_workers=self.parse_workers,
+                # Emailed every night; a file per night only with --save-copy
+                save_copy=self.save_copies,
+            )
+
+        secrets = load_secrets(self.secrets_path)
+        df = await run_hybrid_pricer_async(
+            scrapingbee_api_key=secrets["SCRAPINGBEE_API_KEY"],
+            upload=self.upload,
+            concurrency=self.concurrency,
+            resume=resume,
+            resume_since=resume_since,
+            parse_workers=self.parse_workers,
+            watch_only=True,
+        )
+        return {"rows_in_map": len(df)}
+
+    async def run_once(self, kind: str) -> Dict[str, Any]:
+        """
+        Run one scan and record its outcome in last_runs.
+        """
+        before = {name: counter_total(name) for name in RUN_COUNTERS}
+        started = datetime.now()
+        self.current = {"kind": kind, "started_at": started.isoformat(timespec="seconds"), "_before": before}
+        log(f"daemon: {kind} scan starting", context="daemon")
+
+        record: Dict[str, Any] = {"started_at": started.isoformat(timespec="seconds")}
+        try:
+            self._scan_task = asyncio.create_task(self._scan(kind))
+            record["result"] = await self._scan_task
+            record["ok"] = True
+            self.resume_kinds.pop(kind, None)
+            self.retries[kind] = 0
+            if kind == "full":
+                # The full scan also refreshed the watch rows
+                self.resume_kinds.pop("watch", None)
+        except asyncio.CancelledError:
+            record.update(ok=False, error="cancelled (daemon stopping)")
+            raise
+        except Exception as e:
+            record.update(ok=False, error=repr(e))
+            self.totals["failures"] += 1
+            log(f"daemon: {kind} scan failed: {e!r}", context="daemon")
+            self.retries[kind] += 1
+            if self.retries[kind] <= DAEMON_MAX_RETRIES:
+                # Retries resume from the first failed attempt's start
+                self.resume_kinds.setdefault(kind, started.timestamp())
+            else:
+                log(f"daemon: {kind} scan gave up after {DAEMON_MAX_RETRIES} retries", context="daemon")
+                self.resume_kinds.pop(kind, None)
+                self.retries[kind] = 0
+        finally:
+            self._scan_task = None
+            finished = datetime.now()
+            record["finished_at"] = finished.isoformat(timespec="seconds")
+            record["duration_s"] = round((finished - started).total_seconds(), 1)
+            record["stats"] = {
+                name: counter_total(name) - before[name] for name in RUN_COUNTERS
+            }
+            self.last_runs[kind] = record
+            self.totals["runs"] += 1
+            self.current = None
+            log(
+                f"daemon: {kind} scan finished ok={record.get('ok')} in {record['duration_s']}s",
+                context="daemon",
+            )
+        return record
+
+    def _due(self, now: datetime) -> Optional[str]:
+        # The nightly full scan wins; it also covers the watch-list rows
+        for kind in ("full", "watch"):
+            at = self.next_runs[kind]
+            if at is not None and at <= now:
+                return kind
+        return None
+
+    def _reschedule(self, kind: str, finished: datetime, ok: bool = True) -> None:
+        if not ok and kind in self.resume_kinds:
+            # Retry the failed scan soon instead of a whole interval later
+            retry = self.retry_after
+            if kind == "watch" and self.watch_every:
+                retry = min(retry, self.watch_every)
+            self.next_runs[kind] = finished + retry
+            return
+        if self.full_at and kind == "full":
+            self.next_runs["full"] = next_daily(self.full_at, finished)
+        if self.watch_every:
+            # A full scan just refreshed the watch rows too
+            self.next_runs["watch"] = finished + self.watch_every
+
+    async def scheduler(self) -> None:
+        while not self._stop.is_set():
+            now = datetime.now()
+            kind = self._due(now)
+            if kind is not None:
+                record = await self.run_once(kind)
+                self._reschedule(kind, datetime.now(), ok=record["ok"])
+                continue
+
+            upcoming = [t for t in self.next_runs.values() if t is not None]
+            wait = SCHEDULER_TICK_SECONDS
+            if upcoming:
+                wait = min(wait, max(0.0, (min(upcoming) - now).total_seconds()))
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self) -> None:
+        log("daemon: stop requested", context="daemon")
+        self._stop.set()
+        if self._scan_task is not None:
+            # The scan's journal is kept: start the daemon with --resume to
+            # continue where it stopped
+            self._scan_task.cancel()
+
+    # ---------------------------------------------------------------
+    # Status endpoint
+    # ---------------------------------------------------------------
+
+    def status(self) -> Dict[str, Any]:
+        current = None
+        if self.current is not None:
+            before = self.current["_before"]
+            to_fetch = counter_total("fetches") - before["fetches"]
+            fetched = counter_total("fetches_completed") - before["fetches_completed"]
+            started = datetime.fromisoformat(self.current["started_at"])
+            current = {
+                "kind": self.current["kind"],
+                "started_at": self.current["started_at"],
+                "elapsed_s": round((datetime.now() - started).total_seconds(), 1),
+                "fetched": fetched,
+                "to_fetch": to_fetch,
+                "progress": round(fetched / to_fetch, 4) if to_fetch else None,
+            }
+        return {
+            "run_id": RUN_ID,
+            "state": "scanning" if current else "idle",
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "storage": config.STORAGE_BACKEND,
+            "current": current,
+            "next_runs": {
+                k: v.isoformat(timespec="seconds") if v else None for k, v in self.next_runs.items()
+            },
+            "last_runs": self.last_runs,
+            "totals": self.totals,
+        }
+
+    def make_status_app(self) -> web.Application:
+        async def handle_status(request: web.Request) -> web.Response:
+            return web.json_response(self.status(), dumps=functools.partial(json.dumps, default=str))
+
+        async def handle_metrics(request: web.Request) -> web.Response:
+            return web.Response(
+                text=to_openmetrics(),
+                content_type="application/openmetrics-text",
+            )
+
+        app = web.Application()
+        app.router.add_get("/status", handle_status)
+        app.router.add_get("/metrics", handle_metrics)
+        return app
+
+    # ---------------------------------------------------------------
+    # Lifecycle
+    # ---------------------------------------------------------------
+
+    async def run(self, run_now: Optional[str] = None) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, AttributeError, RuntimeError):
+                pass  # Windows: Ctrl+C arrives as KeyboardInterrupt instead
+
+        # Warm clients: secrets (→ OpenAI client), scraper session. The
+        # Google client is created by the first scan and kept by the loop.
+        load_secrets(self.secrets_path)
+        if config.USE_AI_HTML:
+            config.get_openai_client()
+        open_warm_session(pool_size=max(10, self.concurrency))
+
+        runner = web.AppRunner(self.make_status_app())
+        await runner.setup()
+        await web.TCPSite(runner, self.status_host, self.status_port).start()
+        log(
+            f"daemon started: status http://{self.status_host}:{self.status_port}/status "
+            f"next={self.status()['next_runs']}",
+            context="daemon",
+        )
+        print(f"Retail selector daemon – status on http://{self.status_host}:{self.status_port}/status")
+
+        try:
+            if run_now:
+                record = await self.run_once(run_now)
+                self._reschedule(run_now, datetime.now(), ok=record["ok"])
+            await self.scheduler()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await runner.cleanup()
+            await close_warm_session()
+            await close_storage_backend()
+            log("daemon stopped", context="daemon")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(
+        description=(
+            "Run the scanner as a long-lived daemon: nightly full scan + email and "
+            "frequent Active Watch List sweeps, with warm clients and a local status endpoint."
+        )
+    )
+    p.add_argument("--full-at", type=str, default=DAEMON_FULL_SCAN_AT,
+                   help="Nightly full scan, local HH:MM ('off' to disable)")
+    p.add_argument("--watch-every", type=float, default=DAEMON_WATCH_SWEEP_MINUTES,
+                   help="Watch-list sweep interval in minutes (0 disables)")
+    p.add_argument("--run-now", choices=["full", "watch"], default=None,
+                   help="Run one scan immediately at startup")
+    p.add_argument("--concurrency", type=int, default=5)
+    p.add_argument("--parse-workers", type=int, default=PARSE_WORKERS)
+    p.add_argument("--workbook-dir", type=str, default=str(DEFAULT_WORKBOOK_PATH.parent))
+    p.add_argument("--save-copy", action="store_true",
+                   help="Also keep each nightly workbook in --workbook-dir")
+    p.add_argument("--secrets-path", type=str, default=str(DEFAULT_SECRETS_PATH))
+    p.add_argument("--no-upload", action="store_true")
+    p.add_argument("--resume", action="store_true",
+                   help="Restart a scan stopped with the daemon now, resuming its journal")
+    p.add_argument("--storage", choices=["google", "local"], default=STORAGE_BACKEND)
+    p.add_argument("--host", type=str, default=DAEMON_STATUS_HOST)
+    p.add_argument("--port", type=int, default=DAEMON_STATUS_PORT)
+    args = p.parse_args()
+
+    set_run_mode("prod")
+    config.STORAGE_BACKEND = args.storage
+
+    daemon = ScanDaemon(
+        secrets_path=Path(args.secrets_path),
+        workbook_dir=Path(args.workbook_dir),
+        full_at=None if args.full_at.lower() == "off" else args.full_at,
+        watch_every_min=args.watch_every,
+        concurrency=args.concurrency,
+        parse_workers=args.parse_workers,
+        upload=not args.no_upload,
+        save_copies=args.save_copy,
+        resume=args.resume,
+        status_host=args.host,
+        status_port=args.port,
+    )
+    try:
+        asyncio.run(daemon.run(run_now=args.run_now))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"\n[logger] Logs written to: {close_logs()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,15 @@
 from __future__ import annotations
 
 import smtplib
+import time
 from email.message import EmailMessage
 from email.utils import formatdate
 from pathlib import Path
+from typing import Optional
 import asyncio
 
+from . import config
+
 
 def send_email_with_attachment_sync(
     smtp_server: str,
@@ -17,10 +21,20 @@ def send_email_with_attachment_sync(
     email_to: str,
     subject: str,
     body: str,
-    attachment_path: Path,
+    attachment_path: Optional[Path] = None,
+    attachment_bytes: Optional[bytes] = None,
+    attachment_name: Optional[str] = None,
 ) -> None:
-    if not attachment_path.exists():
-        raise FileNotFoundError(f"Attachment not found: {attachment_path}")
+    """
+    Send the workbook either from disk (attachment_path) or straight from
+    memory (attachment_bytes + attachment_name).
+    """
+    if attachment_bytes is None:
+        if attachment_path is None or not attachment_path.exists():
+            raise FileNotFoundError(f"Attachment not found: {attachment_path}")
+        attachment_bytes = attachment_path.read_bytes()
+        attachment_name = attachment_name or attachment_path.name
+    attachment_name = attachment_name or "workbook.xlsx"
 
     msg = EmailMessage()
     msg["From"] = email_from
@@ -29,20 +43,27 @@ def send_email_with_attachment_sync(
     msg["Date"] = formatdate(localtime=True)
     msg.set_content(body)
 
-    file_bytes = attachment_path.read_bytes()
     msg.add_attachment(
-        file_bytes,
+        attachment_bytes,
         maintype="application",
         subtype="vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename=attachment_path.name,
+        filename=attachment_name,
     )
 
+    if config.EMAIL_OUTBOX_DIR is not None:
+        # Offline runs: drop the message into the outbox instead of sending it
+        config.EMAIL_OUTBOX_DIR.mkdir(parents=True, exist_ok=True)
+        out = config.EMAIL_OUTBOX_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{attachment_name}.eml"
+        out.write_bytes(msg.as_bytes())
+        print(f"📧 Email to {email_to} written to outbox {out}")
+        return
+
     with smtplib.SMTP(smtp_server, smtp_port) as server:
         server.starttls()
         server.login(username, password)
         server.send_message(msg)
 
-    print(f"📧 Email sent to {email_to} with attachment {attachment_path.name}")
+    print(f"📧 Email sent to {email_to} with attachment {attachment_name}")
 
 
 async def send_email_with_attachment_async(
@@ -54,7 +75,9 @@ async def send_email_with_attachment_async(
     email_to: str,
     subject: str,
     body: str,
-    attachment_path: Path,
+    attachment_path: Optional[Path] = None,
+    attachment_bytes: Optional[bytes] = None,
+    attachment_name: Optional[str] = None,
 ) -> None:
     await asyncio.to_thread(
         send_email_with_attachment_sync,
@@ -67,4 +90,6 @@ async def send_email_with_attachment_async(
         subject,
         body,
         attachment_path,
+        attachment_bytes,
+        attachment_name,
     )
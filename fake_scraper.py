@@ -0,0 +1,177 @@
+# retail_selector/fake_scraper.py
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from typing import Dict, Any
+
+from aiohttp import web
+
+from .logger import log
+
+# Local stand-in for the ScrapingBee API: GET /api/v1/?url=... returns a
+# synthetic product page (JSON-LD price + availability derived from the URL),
+# or Shopify product JSON for .../products/<handle>.js URLs, or – with
+# extract_rules={"name": "css selector", ...} – just the selected text as
+# JSON, after a configurable delay. Point the pipeline at it with
+#   RETAIL_SELECTOR_SCRAPER_ENDPOINT=http://127.0.0.1:8765/api/v1/
+
+FAKE_PATH = "/api/v1/"
+
+
+def fake_product(url: str) -> Dict[str, Any]:
+    """
+    Deterministic price/stock for a URL (stable between runs).
+    """
+    h = int(hashlib.sha1(url.encode("utf-8")).hexdigest()[:8], 16)
+    return {
+        "price": round(5 + (h % 20000) / 100.0, 2),
+        "in_stock": h % 5 != 0,
+    }
+
+
+def fake_product_html(url: str) -> str:
+    p = fake_product(url)
+    ld = {
+        "@context": "https://schema.org",
+        "@type": "Product",
+        "name": url.rsplit("/", 1)[-1],
+        "offers": {
+            "@type": "Offer",
+            "price": p["price"],
+            "priceCurrency": "USD",
+            "availability": "https://schema.org/" + ("InStock" if p["in_stock"] else "OutOfStock"),
+        },
+    }
+    return (
+        "<html><head><title>Fake product</title>"
+        f'<script type="application/ld+json">{json.dumps(ld)}</script>'
+        f"</head><body><h1>{ld['name']}</h1><span class=\"price\">${p['price']:.2f}</span>"
+        f"<span class=\"availability\">{'In stock' if p['in_stock'] else 'Out of stock'}</span>"
+        "</body></html>"
+    )
+
+
+def fake_extract(html: str, rules: Dict[str, Any]) -> str:
+    """
+    ScrapingBee extract_rules response: {name: text of the first match}
+    (empty string when the selector matches nothing).
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    out = {}
+    for name, rule in rules.items():
+        selector = rule.get("selector") if isinstance(rule, dict) else rule
+        node = soup.select_one(selector)
+        out[name] = node.get_text(" ", strip=True) if node is not None else ""
+    return json.dumps(out)
+
+
+def fake_shopify_product_js(url: str) -> str:
+    """
+    Shopify /products/<handle>.js payload for the page url[:-3]: a sold-out
+    bundle variant first, then the variant the page's JSON-LD describes.
+    """
+    page_url = url[: -len(".js")]
+    p = fake_product(page_url)
+    h = int(hashlib.sha1(page_url.encode("utf-8")).hexdigest()[:8], 16)
+    cents = int(round(p["price"] * 100))
+    return json.dumps({
+        "id": h,
+        "handle": page_url.rsplit("/", 1)[-1],
+        "available": p["in_stock"],
+        "price": cents,
+        "variants": [
+            {"id": h * 10 + 1, "title": "Bundle", "price": cents + 500, "available": False},
+            {"id": h * 10 + 2, "title": "Default", "price": cents, "available": p["in_stock"]},
+        ],
+    })
+
+
+def make_fake_scraper_app(
+    latency_ms: float = 500.0,
+    jitter_ms: float = 250.0,
+    error_rate: float = 0.0,
+    seed: int = 0,
+) -> web.Application:
+    """
+    aiohttp app mimicking ScrapingBee: latency_ms ± jitter_ms per request and
+    a 503 (retried by the client like a real transient error) with
+    probability error_rate.
+    """
+    rng = random.Random(seed)
+    stats = {"requests": 0, "errors": 0, "bytes": 0}
+
+    async def handle(request: web.Request) -> web.Response:
+        url = request.query.get("url", "")
+        stats["requests"] += 1
+        delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000.0
+        await asyncio.sleep(delay)
+        if not url:
+            return web.Response(status=400, text="missing url")
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            return web.Response(status=503, text="fake transient error")
+        if url.split("?", 1)[0].endswith(".js"):
+            body, content_type = fake_shopify_product_js(url.split("?", 1)[0]), "application/json"
+        elif request.query.get("extract_rules"):
+            try:
+                rules = json.loads(request.query["extract_rules"])
+            except ValueError:
+                return web.Response(status=400, text="invalid extract_rules")
+            body, content_type = fake_extract(fake_product_html(url), rules), "application/json"
+        else:
+            body, content_type = fake_product_html(url), "text/html"
+        stats["bytes"] += len(body)
+        return web.Response(text=body, content_type=content_type)
+
+    async def handle_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get(FAKE_PATH, handle)
+    app.router.add_get("/stats", handle_stats)
+    app["stats"] = stats
+    return app
+
+
+async def start_fake_scraper(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    **app_kwargs,
+) -> web.AppRunner:
+    """
+    Start the fake scraper in the current event loop; returns the runner
+    (await runner.cleanup() to stop it).
+    """
+    runner = web.AppRunner(make_fake_scraper_app(**app_kwargs))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log(f"fake scraper listening on http://{host}:{port}{FAKE_PATH}", context="fake_scraper")
+    return runner
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Local fake ScrapingBee endpoint for offline runs")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency-ms", type=float, default=500.0)
+    p.add_argument("--jitter-ms", type=float, default=250.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    args = p.parse_args()
+
+    print(f"Fake scraper on http://{args.host}:{args.port}{FAKE_PATH} (Ctrl+C to stop)")
+    web.run_app(
+        make_fake_scraper_app(args.latency_ms, args.jitter_ms, args.error_rate),
+        host=args.host,
+        port=args.port,
+        print=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
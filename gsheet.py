@@ -2,22 +2,27 @@
 from __future__ import annotations
 
 import json
+import math
+import os
+import threading
 from pathlib import Path
-from typing import Tuple
+from typing import TYPE_CHECKING, Tuple, Dict, Any, List, Optional
 
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-import requests
 
 from .config import (
     SERVICE_ACCOUNT_FILE,
- 
-    MASTER_SHEET_ID,
-    OUTPUT_SHEET_ID,
-    PRODUCT_MAP_TAB
+    STATE_DIR,
+    XLSX_CACHE_DIR,
 )
+from .metrics import inc
+
+# Shared by the Google (gsheet_async) and local storage backends: service
+# account credentials plus the pure frame / diff / snapshot / XLSX-cache
+# helpers. google-auth is imported inside get_credentials so the local
+# backend does not pay for it at import time.
+if TYPE_CHECKING:
+    from google.oauth2.service_account import Credentials
 
 # SCOPES just to be explicit here
 SCOPES = [
@@ -26,96 +31,251 @@ SCOPES = [
 ]
 
 
-def get_google_clients():
+# -------------------------------------------------------------------
+# Process-wide credentials
+# -------------------------------------------------------------------
+
+# Service-account credentials are loaded once per process; the async
+# client keeps the OAuth token and refreshes it only when it expires.
+_CLIENTS: Dict[str, Any] = {}
+_CLIENTS_LOCK = threading.RLock()
+
+# Connection pool size for the Google API HTTP session
+HTTP_POOL_SIZE = 10
+
+
+def get_credentials() -> Credentials:
     """
-    Create authorized gspread + Drive clients using the service account.
-    Also prints the 'Using service account... Project ID...' banner.
+    Service-account credentials (cached). Prints the
+    'Using service account... Project ID...' banner once per process.
     """
-    try:
-        with open(SERVICE_ACCOUNT_FILE, "r") as f:
-            info = json.load(f)
-        print(f"Using service account: {info.get('client_email')}")
-        print(f"Project ID          : {info.get('project_id')}")
-    except Exception as e:
-        print("⚠️ Could not read service account JSON:", e)
+    with _CLIENTS_LOCK:
+        creds = _CLIENTS.get("creds")
+        if creds is not None:
+            return creds
+
+        try:
+            with open(SERVICE_ACCOUNT_FILE, "r") as f:
+                info = json.load(f)
+            print(f"Using service account: {info.get('client_email')}")
+            print(f"Project ID          : {info.get('project_id')}")
+        except Exception as e:
+            print("⚠️ Could not read service account JSON:", e)
+
+        from google.oauth2.service_account import Credentials
+
+        creds = Credentials.from_service_account_file(
+            str(SERVICE_ACCOUNT_FILE),
+            scopes=SCOPES,
+        )
+        _CLIENTS["creds"] = creds
+        return creds
 
-    creds = Credentials.from_service_account_file(
-        str(SERVICE_ACCOUNT_FILE),
-        scopes=SCOPES,
-    )
 
-    gc = gspread.authorize(creds)
-    drive = build("drive", "v3", credentials=creds)
-    return gc, drive
+# -------------------------------------------------------------------
+# Upload planning: typed values, diff against last snapshot, batches
+# -------------------------------------------------------------------
 
+# Sheets API limits we stay under per values.batchUpdate call
+MAX_RANGES_PER_BATCH = 500
+MAX_CELLS_PER_BATCH = 40_000
 
-def download_product_map() -> pd.DataFrame:
+# Above this fraction of changed cells a full rewrite is cheaper than a diff
+FULL_REWRITE_FRACTION = 0.5
+
+# Retries for quota (429) and transient (5xx) Sheets API errors
+QUOTA_RETRIES = 6
+QUOTA_BASE_BACKOFF = 2.0
+RETRYABLE_API_STATUS = {429, 500, 502, 503}
+
+
+def snapshot_path(sheet_id: str) -> Path:
+    return STATE_DIR / f"upload_snapshot_{sheet_id}.json"
+
+
+def typed_cell(value: Any) -> Any:
     """
-    Read Product↔Retailer Map from HIS master sheet using gspread.
-    Used mainly for logging & sanity.
+    Convert a DataFrame cell to a JSON/Sheets value: numbers stay numbers,
+    NaN/None become "", numpy scalars and timestamps are unwrapped.
     """
-    gc, _ = get_google_clients()
+    if value is None:
+        return ""
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        try:
+            value = value.item()
+        except Exception:
+            pass
+    if isinstance(value, float):
+        return "" if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, (bool, int, str)):
+        return value
+    if value is pd.NaT:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
 
-    print("⬇️ Downloading Product↔Retailer Map from Master Sheet...")
-    sh = gc.open_by_key(MASTER_SHEET_ID)
-    ws = sh.worksheet(PRODUCT_MAP_TAB)
 
-    data = ws.get_all_records()
-    df = pd.DataFrame(data)
-    df.columns = [str(c).strip() for c in df.columns]
+def frame_to_values(df: pd.DataFrame) -> List[List[Any]]:
+    header = [str(c) for c in df.columns]
+    rows = [[typed_cell(v) for v in row] for row in df.itertuples(index=False, name=None)]
+    return [header] + rows
 
-    print(
-        f"⬇️ Downloaded {len(df)} rows from '{PRODUCT_MAP_TAB}' "
-        f"in master sheet {MASTER_SHEET_ID}"
-    )
-    return df
+
+def _same(a: Any, b: Any) -> bool:
+    """
+    Whether a cell is unchanged. Uploads are RAW and reads unformatted, so
+    types round-trip: the text "0012" is not the number 12 and True is not 1.
+    Sheets may hand back 12 for 12.0, so int / float compare by value.
+    """
+    a = "" if a is None else a
+    b = "" if b is None else b
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return float(a) == float(b)
+    return type(a) is type(b) and a == b
 
 
-def upload_product_map(df: pd.DataFrame) -> Tuple[str, str]:
+def rowcol_to_a1(row: int, col: int) -> str:
     """
-    Overwrite Product↔Retailer Map in YOUR output Google Sheet
-    and print the classic logs you wanted.
+    (1, 1) → "A1".
     """
-    if OUTPUT_SHEET_ID == MASTER_SHEET_ID:
-        raise RuntimeError(
-            "OUTPUT_SHEET_ID is the same as MASTER_SHEET_ID – "
-            "refusing to overwrite the master sheet."
-        )
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return f"{letters}{row}"
 
-    gc, _ = get_google_clients()
-    sh = gc.open_by_key(OUTPUT_SHEET_ID)
 
-    try:
-        ws = sh.worksheet(PRODUCT_MAP_TAB)
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title=PRODUCT_MAP_TAB, rows="100", cols="20")
+def diff_ranges(old: List[List[Any]], new: List[List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Changed cells between two value grids as A1 ranges, one per contiguous
+    run of changed cells within a row. Rows/cols only in `old` are blanked.
+    """
+    width = max([len(r) for r in new] + [len(r) for r in old] + [0])
+    out: List[Dict[str, Any]] = []
 
-    ws.clear()
+    for r in range(max(len(old), len(new))):
+        new_row = new[r] if r < len(new) else []
+        old_row = old[r] if r < len(old) else []
+        new_row = list(new_row) + [""] * (width - len(new_row))
+        old_row = list(old_row) + [""] * (width - len(old_row))
 
-    values = [list(df.columns)] + df.astype(str).fillna("").values.tolist()
-    ws.update("A1", values)  # DeprecationWarning here, as desired.
+        c = 0
+        while c < width:
+            if _same(old_row[c], new_row[c]):
+                c += 1
+                continue
+            start = c
+            while c < width and not _same(old_row[c], new_row[c]):
+                c += 1
+            out.append({
+                "range": f"{rowcol_to_a1(r + 1, start + 1)}:{rowcol_to_a1(r + 1, c)}",
+                "values": [new_row[start:c]],
+            })
+    return out
 
-    print(f"⬆️ Wrote {len(df)} rows to '{PRODUCT_MAP_TAB}' in sheet {OUTPUT_SHEET_ID}")
-    print("✅ Upload complete (no new files created).")
-    web_link = f"https://docs.google.com/spreadsheets/d/{OUTPUT_SHEET_ID}/edit"
-    print("   Updated output sheet link:", web_link)
 
-    return OUTPUT_SHEET_ID, web_link
+def plan_upload(
+    old: Optional[List[List[Any]]],
+    values: List[List[Any]],
+    mode: str = "diff",
+) -> Tuple[Optional[List[Dict[str, Any]]], int]:
+    """
+    Diff-or-rewrite decision shared by every upload path → (changed ranges,
+    changed cells), or (None, all cells) for a full rewrite: mode="full",
+    no diff base, a changed header, or most cells differ.
+    """
+    width = max(len(r) for r in values)
+    total_cells = len(values) * width
+    if mode != "diff" or not old or old[0] != values[0]:
+        return None, total_cells
+    data = diff_ranges(old, values)
+    changed = sum(len(d["values"][0]) for d in data)
+    if changed > FULL_REWRITE_FRACTION * total_cells:
+        return None, total_cells
+    return data, changed
 
 
-def download_gsheet_as_xlsx(sheet_id: str, dest_path: Path) -> Path:
+def rewrite_blocks(values: List[List[Any]]) -> List[Dict[str, Any]]:
     """
-    Download the entire Google Sheets workbook as XLSX via export endpoint.
+    A full rewrite as A1-anchored blocks of rows, each under MAX_CELLS_PER_BATCH.
     """
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=xlsx"
-    resp = requests.get(url, stream=True, timeout=60)
-    resp.raise_for_status()
+    width = max(len(r) for r in values)
+    rows_per_call = max(1, MAX_CELLS_PER_BATCH // max(1, width))
+    return [
+        {"range": rowcol_to_a1(start + 1, 1), "values": values[start:start + rows_per_call]}
+        for start in range(0, len(values), rows_per_call)
+    ]
+
+
+def chunk_ranges(data: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    chunks, current, cells = [], [], 0
+    for item in data:
+        n = sum(len(row) for row in item["values"])
+        if current and (len(current) >= MAX_RANGES_PER_BATCH or cells + n > MAX_CELLS_PER_BATCH):
+            chunks.append(current)
+            current, cells = [], 0
+        current.append(item)
+        cells += n
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def load_snapshot(sheet_id: str) -> Optional[List[List[Any]]]:
+    path = snapshot_path(sheet_id)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
 
-    with open(dest_path, "wb") as f:
-        for chunk in resp.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
+def save_snapshot(sheet_id: str, values: List[List[Any]]) -> None:
+    path = snapshot_path(sheet_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(values, f, ensure_ascii=False)
+    os.replace(tmp, path)
 
-    print(f"⬇️ Downloaded full workbook {sheet_id} → {dest_path}")
-    return dest_path
+
+# Streaming chunk size for the XLSX export
+EXPORT_CHUNK_BYTES = 256 * 1024
+
+
+# -------------------------------------------------------------------
+# Revision-keyed XLSX cache
+# -------------------------------------------------------------------
+
+def xlsx_cache_path(sheet_id: str, revision: str) -> Path:
+    safe_rev = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in revision)
+    return XLSX_CACHE_DIR / f"{sheet_id}-{safe_rev}.xlsx"
+
+
+def read_cached_xlsx(sheet_id: str, revision: str) -> Optional[bytes]:
+    cached = xlsx_cache_path(sheet_id, revision)
+    if not cached.exists():
+        inc("xlsx_cache", result="miss")
+        return None
+    inc("xlsx_cache", result="hit")
+    print(f"♻️ Master sheet unchanged ({revision}); using cached XLSX {cached.name}")
+    return cached.read_bytes()
+
+
+def store_cached_xlsx(sheet_id: str, revision: str, data: bytes) -> None:
+    """
+    Cache one revision's export (tmp + rename) and prune older revisions.
+    """
+    cached = xlsx_cache_path(sheet_id, revision)
+    XLSX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_suffix(".xlsx.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, cached)
+    for old in XLSX_CACHE_DIR.glob(f"{sheet_id}-*.xlsx"):
+        if old != cached:
+            old.unlink(missing_ok=True)
@@ -0,0 +1,386 @@
+# retail_selector/gsheet_async.py
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Tuple, Dict, Any, List, Optional
+
+import aiohttp
+import pandas as pd
+from google.auth.transport.requests import Request
+
+from .config import (
+    MASTER_SHEET_ID,
+    OUTPUT_SHEET_ID,
+    PRODUCT_MAP_TAB,
+    ACTIVE_WATCH_TAB,
+)
+from .gsheet import (
+    get_credentials,
+    frame_to_values,
+    plan_upload,
+    rewrite_blocks,
+    chunk_ranges,
+    load_snapshot,
+    save_snapshot,
+    read_cached_xlsx,
+    store_cached_xlsx,
+    HTTP_POOL_SIZE,
+    QUOTA_RETRIES,
+    QUOTA_BASE_BACKOFF,
+    RETRYABLE_API_STATUS,
+    EXPORT_CHUNK_BYTES,
+)
+from .logger import log
+
+SHEETS_API = "https://sheets.googleapis.com/v4/spreadsheets"
+DRIVE_API = "https://www.googleapis.com/drive/v3/files"
+EXPORT_URL = "https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=xlsx"
+
+API_TIMEOUT = 60  # seconds
+
+
+class SheetsAPIError(RuntimeError):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Google API error: HTTP {status}: {message}")
+        self.status = status
+
+
+# -------------------------------------------------------------------
+# Pooled aiohttp client
+# -------------------------------------------------------------------
+
+class AsyncGoogleClient:
+    """
+    Sheets v4 / Drive v3 over one pooled aiohttp session.
+
+    The OAuth token comes from the cached service-account credentials and
+    is refreshed (in a thread, once for all waiters) only when it expires.
+    429 / 5xx responses, connection errors and timeouts are retried with
+    exponential backoff (gsheet.QUOTA_RETRIES / QUOTA_BASE_BACKOFF).
+    """
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE):
+        self._creds = get_credentials()
+        self._token_lock = asyncio.Lock()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size),
+            timeout=aiohttp.ClientTimeout(total=API_TIMEOUT),
+        )
+
+    @property
+    def closed(self) -> bool:
+        return self._session.closed
+
+    async def close(self) -> None:
+        await self._session.close()
+
+    async def _auth_headers(self) -> Dict[str, str]:
+        if not self._creds.valid:
+            async with self._token_lock:
+                if not self._creds.valid:
+                    await asyncio.to_thread(self._creds.refresh, Request())
+        return {"Authorization": f"Bearer {self._creds.token}"}
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Any = None,
+        json: Optional[Dict[str, Any]] = None,
+        raw: bool = False,
+    ) -> Any:
+        """
+        One API call → parsed JSON (or bytes with raw=True), retried on
+        quota / transient errors and on network errors / timeouts.
+        """
+        for attempt in range(1, QUOTA_RETRIES + 1):
+            headers = await self._auth_headers()
+            try:
+                async with self._session.request(
+                    method, url, params=params, json=json, headers=headers
+                ) as resp:
+                    if resp.status < 400:
+                        if raw:
+                            buf = bytearray()
+                            async for chunk in resp.content.iter_chunked(EXPORT_CHUNK_BYTES):
+                                buf.extend(chunk)
+                            return bytes(buf)
+                        return await resp.json(content_type=None)
+
+                    body = await resp.text()
+                    if resp.status not in RETRYABLE_API_STATUS or attempt == QUOTA_RETRIES:
+                        raise SheetsAPIError(resp.status, body[:500])
+                    reason = f"HTTP {resp.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == QUOTA_RETRIES:
+                    raise
+                reason = repr(e)
+
+            sleep_for = QUOTA_BASE_BACKOFF * (2 ** (attempt - 1))
+            log(
+                f"{method} {url} → {reason}, retrying in {sleep_for:.0f}s (attempt {attempt})",
+                context="gsheet_async",
+            )
+            await asyncio.sleep(sleep_for)
+
+    # ---- Sheets values ----
+
+    async def values_batch_get(
+        self,
+        sheet_id: str,
+        ranges: List[str],
+        render: str = "UNFORMATTED_VALUE",
+    ) -> List[List[List[Any]]]:
+        """
+        Several ranges in one values:batchGet call → one grid per range.
+        """
+        data = await self.request(
+            "GET",
+            f"{SHEETS_API}/{sheet_id}/values:batchGet",
+            params=[("ranges", r) for r in ranges] + [
+                ("valueRenderOption", render),
+                ("dateTimeRenderOption", "FORMATTED_STRING"),
+            ],
+        )
+        return [vr.get("values", []) for vr in data.get("valueRanges", [])]
+
+    async def values_batch_update(self, sheet_id: str, data: List[Dict[str, Any]]) -> int:
+        """
+        Write A1 ranges with values:batchUpdate, chunked under the API
+        limits. Returns the number of calls made.
+        """
+        chunks = chunk_ranges(data)
+        for chunk in chunks:
+            await self.request(
+                "POST",
+                f"{SHEETS_API}/{sheet_id}/values:batchUpdate",
+                json={"valueInputOption": "RAW", "data": chunk},
+            )
+        return len(chunks)
+
+    async def values_clear(self, sheet_id: str, a1_range: str) -> None:
+        await self.request("POST", f"{SHEETS_API}/{sheet_id}/values/{a1_range}:clear", json={})
+
+    # ---- Spreadsheet structure ----
+
+    async def sheet_properties(self, sheet_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        {tab title: properties} (sheetId, gridProperties.rowCount/columnCount).
+        """
+        data = await self.request(
+            "GET",
+            f"{SHEETS_API}/{sheet_id}",
+            params={"fields": "sheets.properties"},
+        )
+        return {s["properties"]["title"]: s["properties"] for s in data.get("sheets", [])}
+
+    async def batch_update(self, sheet_id: str, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return await self.request(
+            "POST",
+            f"{SHEETS_API}/{sheet_id}:batchUpdate",
+            json={"requests": requests},
+        )
+
+    async def ensure_grid(self, sheet_id: str, props: Dict[str, Any], rows: int, cols: int) -> None:
+        grid = props.get("gridProperties", {})
+        if grid.get("rowCount", 0) >= rows and grid.get("columnCount", 0) >= cols:
+            return
+        await self.batch_update(sheet_id, [{
+            "updateSheetProperties": {
+                "properties": {
+                    "sheetId": props["sheetId"],
+                    "gridProperties": {
+                        "rowCount": max(grid.get("rowCount", 0), rows),
+                        "columnCount": max(grid.get("columnCount", 0), cols),
+                    },
+                },
+                "fields": "gridProperties.rowCount,gridProperties.columnCount",
+            }
+        }])
+
+    # ---- Drive ----
+
+    async def file_revision(self, file_id: str) -> Optional[str]:
+        """
+        Drive revision marker (version + modifiedTime) of a file, or None
+        if Drive metadata is unavailable.
+        """
+        try:
+            meta = await self.request(
+                "GET",
+                f"{DRIVE_API}/{file_id}",
+                params={"fields": "modifiedTime,version", "supportsAllDrives": "true"},
+            )
+        except Exception as e:
+            log(f"could not read Drive revision for {file_id}: {e}", context="gsheet_async")
+            return None
+        return f"v{meta.get('version', '')}-{meta.get('modifiedTime', '')}"
+
+    async def export_xlsx(self, sheet_id: str) -> bytes:
+        return await self.request("GET", EXPORT_URL.format(sheet_id=sheet_id), raw=True)
+
+
+# One client per event loop (aiohttp sessions are bound to their loop)
+_ASYNC_CLIENTS: Dict[int, AsyncGoogleClient] = {}
+
+
+def get_async_client() -> AsyncGoogleClient:
+    loop_id = id(asyncio.get_running_loop())
+    client = _ASYNC_CLIENTS.get(loop_id)
+    if client is None or client.closed:
+        client = AsyncGoogleClient()
+        _ASYNC_CLIENTS[loop_id] = client
+    return client
+
+
+async def close_async_client() -> None:
+    client = _ASYNC_CLIENTS.pop(id(asyncio.get_running_loop()), None)
+    if client is not None:
+        await client.close()
+
+
+# -------------------------------------------------------------------
+# Pipeline operations
+# -------------------------------------------------------------------
+
+def _records_frame(values: List[List[Any]]) -> pd.DataFrame:
+    """
+    Header row + data rows → DataFrame (one record per data row).
+    """
+    if not values:
+        return pd.DataFrame()
+    header = [str(c).strip() for c in values[0]]
+    width = len(header)
+    rows = [list(r[:width]) + [""] * (width - len(r)) for r in values[1:]]
+    return pd.DataFrame(rows, columns=header)
+
+
+def _quote_tab(title: str) -> str:
+    return "'" + title.replace("'", "''") + "'"
+
+
+async def download_master_tabs_async(
+    tabs: Tuple[str, ...] = (PRODUCT_MAP_TAB, ACTIVE_WATCH_TAB),
+) -> Dict[str, pd.DataFrame]:
+    """
+    Several master-sheet tabs in a single values:batchGet call.
+    Tabs that do not exist come back as empty DataFrames.
+    """
+    client = get_async_client()
+    props = await client.sheet_properties(MASTER_SHEET_ID)
+    present = [t for t in tabs if t in props]
+    grids = await client.values_batch_get(MASTER_SHEET_ID, [_quote_tab(t) for t in present])
+
+    frames = {t: pd.DataFrame() for t in tabs}
+    for tab, grid in zip(present, grids):
+        frames[tab] = _records_frame(grid)
+        print(f"⬇️ Downloaded {len(frames[tab])} rows from '{tab}' in master sheet {MASTER_SHEET_ID}")
+    for tab in tabs:
+        if tab not in props:
+            print(f"⚠️ No '{tab}' tab in master sheet {MASTER_SHEET_ID}")
+    return frames
+
+
+async def read_output_sheet_values_async() -> Optional[List[List[Any]]]:
+    """
+    Current contents of the output Product↔Retailer Map (the upload's diff
+    base), or None if the tab does not exist yet.
+    """
+    client = get_async_client()
+    props = await client.sheet_properties(OUTPUT_SHEET_ID)
+    if PRODUCT_MAP_TAB not in props:
+        return None
+    grids = await client.values_batch_get(OUTPUT_SHEET_ID, [_quote_tab(PRODUCT_MAP_TAB)])
+    return grids[0] if grids else []
+
+
+async def download_gsheet_xlsx_bytes_cached_async(sheet_id: str) -> bytes:
+    """
+    The whole workbook as XLSX bytes, keyed by the sheet's Drive revision:
+    an unchanged master sheet is read from XLSX_CACHE_DIR instead of being
+    exported again. Older cached revisions of the sheet are pruned.
+    """
+    client = get_async_client()
+    revision = await client.file_revision(sheet_id)
+    if revision is not None:
+        cached = await asyncio.to_thread(read_cached_xlsx, sheet_id, revision)
+        if cached is not None:
+            return cached
+
+    t0 = time.perf_counter()
+    data = await client.export_xlsx(sheet_id)
+    print(
+        f"⬇️ Downloaded full workbook {sheet_id} into memory "
+        f"({len(data)} bytes, {time.perf_counter() - t0:.1f}s)"
+    )
+    if revision is not None:
+        await asyncio.to_thread(store_cached_xlsx, sheet_id, revision, data)
+    return data
+
+
+async def upload_product_map_async(
+    df: pd.DataFrame,
+    mode: str = "diff",
+    current_values: Optional[List[List[Any]]] = None,
+) -> Tuple[str, str]:
+    """
+    Async upload_product_map: same diff/full-rewrite rules, snapshot and
+    typed values, over the pooled aiohttp session.
+    """
+    if OUTPUT_SHEET_ID == MASTER_SHEET_ID:
+        raise RuntimeError(
+            "OUTPUT_SHEET_ID is the same as MASTER_SHEET_ID – "
+            "refusing to overwrite the master sheet."
+        )
+
+    client = get_async_client()
+    props = (await client.sheet_properties(OUTPUT_SHEET_ID)).get(PRODUCT_MAP_TAB)
+    if props is None:
+        reply = await client.batch_update(OUTPUT_SHEET_ID, [{
+            "addSheet": {"properties": {
+                "title": PRODUCT_MAP_TAB,
+                "gridProperties": {"rowCount": 100, "columnCount": 20},
+            }}
+        }])
+        props = reply["replies"][0]["addSheet"]["properties"]
+        current_values = []
+
+    values = frame_to_values(df)
+    width = max(len(r) for r in values)
+    tab = _quote_tab(PRODUCT_MAP_TAB)
+
+    old = None
+    if mode == "diff":
+        old = current_values
+        if old is None:
+            old = load_snapshot(OUTPUT_SHEET_ID)
+        if old is None:
+            old = (await client.values_batch_get(OUTPUT_SHEET_ID, [tab]))[0]
+
+    data, changed = plan_upload(old, values, mode)
+    if data is not None:
+        await client.ensure_grid(OUTPUT_SHEET_ID, props, max(len(values), len(old)), width)
+        for d in data:
+            d["range"] = f"{tab}!{d['range']}"
+        calls = await client.values_batch_update(OUTPUT_SHEET_ID, data)
+        print(
+            f"⬆️ Updated {changed} changed cells in {len(data)} ranges "
+            f"({calls} batch calls) of '{PRODUCT_MAP_TAB}' in sheet {OUTPUT_SHEET_ID}"
+        )
+    else:
+        await client.ensure_grid(OUTPUT_SHEET_ID, props, len(values), width)
+        await client.values_clear(OUTPUT_SHEET_ID, tab)
+        blocks = rewrite_blocks(values)
+        for b in blocks:
+            b["range"] = f"{tab}!{b['range']}"
+        await client.values_batch_update(OUTPUT_SHEET_ID, blocks)
+        print(f"⬆️ Wrote {len(df)} rows to '{PRODUCT_MAP_TAB}' in sheet {OUTPUT_SHEET_ID}")
+
+    await asyncio.to_thread(save_snapshot, OUTPUT_SHEET_ID, values)
+
+    print("✅ Upload complete (no new files created).")
+    web_link = f"https://docs.google.com/spreadsheets/d/{OUTPUT_SHEET_ID}/edit"
+    print("   Updated output sheet link:", web_link)
+
+    return OUTPUT_SHEET_ID, web_link
@@ -0,0 +1,109 @@
+# retail_selector/import_budget.py
+from __future__ import annotations
+
+import argparse
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Import-time budget for the CLI entry points, measured with
+# `python -X importtime` in a fresh interpreter:
+#
+#   python -m retailer_selector.import_budget
+#
+# Fails (exit 1) when an entry point takes longer than its budget or pulls in
+# one of the heavy libraries that must only load on the code paths using them.
+# Run it after touching module-level imports.
+
+PACKAGE = __package__ or "retailer_selector"
+
+# entry point module → budget (ms, best of RUNS cold interpreters)
+IMPORT_BUDGETS_MS: Dict[str, float] = {
+    "orchestrator": 900.0,      # pandas is the only heavy dependency loaded eagerly
+    "log_analytics": 150.0,
+    "fake_scraper": 600.0,
+}
+
+# Must not be imported by any entry point above (fake_scraper excepted for aiohttp)
+LAZY_MODULES = (
+    "openai",
+    "google.auth",
+    "google.oauth2",
+    "requests",
+    "openpyxl",
+    "bs4",
+    "aiohttp",
+)
+ALLOWED_EAGER = {"fake_scraper": ("aiohttp",)}
+
+RUNS = 3
+
+RE_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure_import(module: str) -> Tuple[float, List[str]]:
+    """
+    (cumulative import ms, every module imported) for `import module`
+    in a fresh interpreter.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    total_us = 0
+    imported = []
+    for line in proc.stderr.splitlines():
+        m = RE_IMPORTTIME.match(line)
+        if not m:
+            continue
+        imported.append(m.group(4))
+        if m.group(4) == module:
+            total_us = int(m.group(2))
+    return total_us / 1000.0, imported
+
+
+def check_budgets(runs: int = RUNS) -> List[str]:
+    """
+    Measure every entry point; returns the list of violations (empty = ok).
+    """
+    problems = []
+    for name, budget in IMPORT_BUDGETS_MS.items():
+        module = f"{PACKAGE}.{name}"
+        best = None
+        imported: List[str] = []
+        for _ in range(runs):
+            ms, imported = measure_import(module)
+            best = ms if best is None else min(best, ms)
+
+        allowed = ALLOWED_EAGER.get(name, ())
+        eager = sorted({
+            lazy for lazy in LAZY_MODULES
+            if lazy not in allowed and any(m == lazy or m.startswith(lazy + ".") for m in imported)
+        })
+        status = "ok" if best <= budget and not eager else "FAIL"
+        print(f"{status:4} {module:40} {best:8.1f} ms (budget {budget:.0f} ms)"
+              + (f"  eager: {', '.join(eager)}" if eager else ""))
+        if best > budget:
+            problems.append(f"{module}: {best:.1f} ms > {budget:.0f} ms")
+        if eager:
+            problems.append(f"{module}: imports {', '.join(eager)} at import time")
+    return problems
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Check CLI import time against its budget (python -X importtime).")
+    p.add_argument("--runs", type=int, default=RUNS, help="Fresh interpreters per entry point (best is used)")
+    args = p.parse_args()
+
+    problems = check_budgets(args.runs)
+    if problems:
+        print("\nImport budget exceeded:\n  " + "\n  ".join(problems))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# retail_selector/journal.py
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from .config import STATE_DIR
+from .logger import log, RUN_ID
+from .state import json_safe
+
+
+# fsync the journal after this many records or this many seconds, whichever first
+JOURNAL_FSYNC_EVERY = 20
+JOURNAL_FSYNC_SECONDS = 2.0
+
+# Journaled rows older than this are never resumed: their prices are stale
+# and a fresh scan is cheaper than emailing yesterday's numbers
+JOURNAL_MAX_AGE_HOURS = 12.0
+
+
+def journal_path(name: str) -> Path:
+    """
+    Location of the checkpoint journal for one entry point ('workbook', 'map').
+    """
+    return STATE_DIR / f"journal_{name}.jsonl"
+
+
+def load_journal(path: Path | str, since: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Read a checkpoint journal → {row_key: KPI values}. The last record per
+    key wins; a torn final line (crash mid-write) is ignored.
+
+    Records written before since (epoch seconds; at most
+    JOURNAL_MAX_AGE_HOURS ago) are stale and dropped.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+
+    cutoff = time.time() - JOURNAL_MAX_AGE_HOURS * 3600
+    if since is not None:
+        cutoff = max(cutoff, since)
+
+    rows: Dict[str, Dict[str, Any]] = {}
+    runs = []
+    bad = stale = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+                if "run" in rec:
+                    # Header written when a run opened the journal fresh
+                    runs.append(rec["run"])
+                    continue
+                if float(rec.get("ts") or 0.0) < cutoff:
+                    stale += 1
+                    continue
+                rows[rec["key"]] = rec["values"]
+            except Exception:
+                bad += 1
+
+    log(
+        f"Loaded {len(rows)} journaled rows from {path} (run {runs[-1] if runs else '?'})"
+        + (f" ({stale} stale records dropped)" if stale else "")
+        + (f" ({bad} unreadable lines skipped)" if bad else ""),
+        context="journal",
+    )
+    return rows
+
+
+class RunJournal:
+    """
+    Append-only JSONL journal of per-row results for crash-safe resume.
+
+    Each completed row is appended immediately; the file is fsync'ed in
+    batches (JOURNAL_FSYNC_EVERY records / JOURNAL_FSYNC_SECONDS). Once the
+    run's results are committed (saved/uploaded) call compact() to drop it.
+
+    A fresh journal starts with a header record naming the run and its
+    start time; resume=True appends to the existing file instead.
+    """
+
+    def __init__(self, path: Path | str, resume: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.path, "a" if resume else "w", encoding="utf-8")
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        if not resume:
+            self._f.write(json.dumps({"run": RUN_ID, "started": time.time()}) + "\n")
+        log(f"Journal open ({'resume' if resume else 'fresh'}) → {self.path}", context="journal")
+
+    def record(self, key: str, values: Dict[str, Any]) -> None:
+        rec = {
+            "key": key,
+            "ts": time.time(),
+            "values": {k: json_safe(v) for k, v in values.items()},
+        }
+        self._f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+        self._pending += 1
+        if (
+            self._pending >= JOURNAL_FSYNC_EVERY
+            or time.monotonic() - self._last_sync >= JOURNAL_FSYNC_SECONDS
+        ):
+            self.sync()
+
+    def sync(self) -> None:
+        if self._f.closed:
+            return
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self.sync()
+            self._f.close()
+
+    def compact(self) -> None:
+        """
+        Run committed successfully: everything journaled is now durable
+        elsewhere, so the journal is dropped.
+        """
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        log(f"Journal compacted (run committed) → {self.path}", context="journal")
+
+
+def open_journal(
+    name: str,
+    resume: bool = False,
+    since: Optional[float] = None,
+) -> tuple[RunJournal, Dict[str, Dict[str, Any]]]:
+    """
+    Open the journal for an entry point. With resume=True the previous
+    run's rows (those journaled after since, see load_journal) are
+    returned so the caller can skip them; a journal with nothing fresh
+    left is started over.
+    """
+    path = journal_path(name)
+    done = load_journal(path, since=since) if resume else {}
+    return RunJournal(path, resume=bool(done)), done
+
+
+def apply_journaled(df, idx, values: Dict[str, Any]) -> None:
+    """
+    Write journaled KPI values back into a DataFrame row.
+    """
+    for col, value in values.items():
+        if col not in df.columns:
+            df[col] = None
+        if col in ("Price ($USD)", "Response ms"):
+            value = float("nan") if value is None else float(value)
+        df.at[idx, col] = value
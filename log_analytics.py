@@ -0,0 +1,328 @@
+# retail_selector/log_analytics.py
+from __future__ import annotations
+
+import argparse
+import gzip
+import io
+import json
+import math
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+from .config import LOG_ROOT
+
+try:
+    import zstandard  # only needed to read .jsonl.zst partitions
+except ImportError:
+    zstandard = None
+
+
+# Streaming analytics over the partitioned JSONL history
+#   <LOG_ROOT>/<mode>/date=YYYY-MM-DD/hour=HH/*.jsonl[.gz|.zst]
+# Only partitions inside the requested modes/date range are opened, lines are
+# pre-filtered on raw text before json.loads, and every aggregate is
+# fixed-size (latency percentiles come from log-scale histograms), so memory
+# stays constant however many months are scanned.
+
+
+# -------------------------------------------------------------------
+# Partition pruning
+# -------------------------------------------------------------------
+
+LOG_SUFFIXES = (".jsonl", ".jsonl.gz", ".jsonl.zst")
+
+
+def _partition_value(name: str, key: str) -> Optional[str]:
+    prefix = key + "="
+    return name[len(prefix):] if name.startswith(prefix) else None
+
+
+def iter_partition_files(
+    root: Path,
+    modes: Optional[List[str]] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> Iterator[Tuple[str, str, str, Path]]:
+    """
+    (mode, date, hour, file) for every log file inside the requested modes
+    and [since, until] date range; other directories are never listed.
+    """
+    if not root.exists():
+        return
+    for mode_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        if modes and mode_dir.name not in modes:
+            continue
+        for date_dir in sorted(mode_dir.iterdir()):
+            day = _partition_value(date_dir.name, "date")
+            if day is None:
+                continue
+            try:
+                d = date.fromisoformat(day)
+            except ValueError:
+                continue
+            if (since and d < since) or (until and d > until):
+                continue
+            for hour_dir in sorted(date_dir.iterdir()):
+                hour = _partition_value(hour_dir.name, "hour")
+                if hour is None:
+                    continue
+                for f in sorted(hour_dir.iterdir()):
+                    if f.name.endswith(LOG_SUFFIXES):
+                        yield mode_dir.name, day, hour, f
+
+
+def open_log_file(path: Path):
+    if path.name.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    if path.name.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is not installed; cannot read {path}")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        return io.TextIOWrapper(raw, encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+# -------------------------------------------------------------------
+# Constant-memory aggregates
+# -------------------------------------------------------------------
+
+# Log-scale latency bins: 1 ms .. ~30 min at ~5% resolution
+HIST_BASE = 1.05
+HIST_BINS = int(math.log(30 * 60 * 1000, HIST_BASE)) + 2
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * HIST_BINS
+        self.n = 0
+        self.total = 0.0
+
+    def add(self, ms: float) -> None:
+        b = 0 if ms <= 1 else min(HIST_BINS - 1, int(math.log(ms, HIST_BASE)) + 1)
+        self.counts[b] += 1
+        self.n += 1
+        self.total += ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.n:
+            return None
+        rank = q / 100.0 * self.n
+        seen = 0
+        for b, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                # bin upper bound (bin 0 holds <= 1 ms)
+                return 1.0 if b == 0 else round(HIST_BASE ** b, 1)
+        return round(HIST_BASE ** (HIST_BINS - 1), 1)
+
+
+class RetailerStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.fetches = 0        # URLs started
+        self.attempts = 0       # HTTP attempts with a response
+        self.retries = 0        # attempts beyond the first
+        self.timeouts = 0       # timeout events (retried or final)
+        self.failures = 0       # gave up after retries / hard errors
+        self.parse_methods: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, int] = defaultdict(int)
+
+    def summary(self) -> Dict[str, Any]:
+        parsed = sum(self.parse_methods.values())
+        return {
+            "fetches": self.fetches,
+            "attempts": self.attempts,
+            "latency_ms": {
+                "p50": self.latency.percentile(50),
+                "p90": self.latency.percentile(90),
+                "p99": self.latency.percentile(99),
+                "mean": round(self.latency.total / self.latency.n, 1) if self.latency.n else None,
+            },
+            "retry_rate": _rate(self.retries, self.attempts),
+            "timeout_rate": _rate(self.timeouts, self.attempts + self.timeouts),
+            "failure_rate": _rate(self.failures, self.fetches),
+            "parse_methods": dict(self.parse_methods),
+            "ai_fallback_rate": _rate(self.parse_methods.get("ai", 0), parsed),
+            "row_status": dict(self.statuses),
+        }
+
+
+def _rate(num: int, den: int) -> Optional[float]:
+    return round(num / den, 4) if den else None
+
+
+# -------------------------------------------------------------------
+# Event parsing (message formats from scraping.py / parsing.py / orchestrator)
+# -------------------------------------------------------------------
+
+RE_ATTEMPT = re.compile(r"^attempt=(\d+) status=(\S+) elapsed_ms=([\d.]+) request_url=(\S+)")
+RE_URL = re.compile(r"url=(\S+?),?(?:\s|$)")
+RE_SOURCE = re.compile(r"source=(\S+)")
+RE_STATUS = re.compile(r" status=(\S*) err=")
+
+# Raw-text markers of the only lines we need to json-decode
+PREFILTER = ('"scraping"', "pattern_parse success", "AI fallback", "row_result")
+
+
+RE_HOST = re.compile(r"^\w+://(?:www\.)?([^/?#:]+)")
+RE_TARGET = re.compile(r"[?&]url=([^&]+)")
+
+
+def _host(url: str) -> str:
+    """
+    Retailer host of a logged URL. Parser lines log the scraper's final_url
+    (the API URL), so the target is taken from its url= query parameter.
+    Regex instead of urlparse: this runs once per decoded line.
+    """
+    target = RE_TARGET.search(url)
+    if target:
+        url = unquote(target.group(1))
+    m = RE_HOST.match(url)
+    return m.group(1).lower() if m else "unknown"
+
+
+def _bucket(ts: str, by: str) -> str:
+    if by == "day":
+        return ts[:10]
+    if by == "hour":
+        return ts[:13].replace("T", " ") + ":00"
+    return "all"
+
+
+def analyze(
+    root: Path = LOG_ROOT,
+    modes: Optional[List[str]] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    by: str = "none",
+    retailer: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Stream the selected partitions → {bucket: {retailer host: summary}}
+    plus scan counters.
+    """
+    stats: Dict[Tuple[str, str], RetailerStats] = defaultdict(RetailerStats)
+    files = lines = decoded = 0
+
+    for _, _, _, path in iter_partition_files(root, modes, since, until):
+        files += 1
+        with open_log_file(path) as f:
+            for line in f:
+                lines += 1
+                if not any(m in line for m in PREFILTER):
+                    continue
+                if retailer and retailer not in line:
+                    continue
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue
+                decoded += 1
+                msg = ev.get("message", "")
+                ctx = ev.get("context", "")
+
+                m = RE_ATTEMPT.match(msg) if ctx == "scraping" else None
+                if m:
+                    host = _host(m.group(4))
+                else:
+                    u = RE_URL.search(msg)
+                    if not u:
+                        continue
+                    host = _host(u.group(1))
+                if retailer and retailer not in host:
+                    continue
+                s = stats[(_bucket(ev.get("timestamp", ""), by), host)]
+
+                if ctx == "scraping":
+                    if m:
+                        s.attempts += 1
+                        s.latency.add(float(m.group(3)))
+                        if int(m.group(1)) > 1:
+                            s.retries += 1
+                    elif msg.startswith("starting fetch"):
+                        s.fetches += 1
+                    elif msg.startswith(("timeout on", "timeout final")):
+                        s.timeouts += 1
+                        if msg.startswith("timeout final"):
+                            s.failures += 1
+                    elif msg.startswith(("giving up", "exception final", "hard error")):
+                        s.failures += 1
+                elif ctx == "parsing":
+                    if msg.startswith("pattern_parse success"):
+                        src = RE_SOURCE.search(msg)
+                        s.parse_methods[src.group(1) if src else "pattern"] += 1
+                    elif msg.startswith("invoking AI fallback"):
+                        s.parse_methods["ai"] += 1
+                    elif msg.startswith("AI fallback skipped"):
+                        s.parse_methods["ai_skipped"] += 1
+                elif msg.startswith("row_result"):
+                    st = RE_STATUS.search(msg)
+                    s.statuses[st.group(1) if st else ""] += 1
+
+    out: Dict[str, Dict[str, Any]] = defaultdict(dict)
+    for (bucket, host), s in sorted(stats.items()):
+        out[bucket][host] = s.summary()
+    return {
+        "scan": {"files": files, "lines": lines, "decoded": decoded},
+        "buckets": dict(out),
+    }
+
+
+# -------------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------------
+
+def _ms(v: Optional[float]) -> str:
+    return "-" if v is None else f"{v:.0f}"
+
+
+def _pct(v: Optional[float]) -> str:
+    return "-" if v is None else f"{v:.1%}"
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    scan = report["scan"]
+    print(f"Scanned {scan['files']} files, {scan['lines']} lines ({scan['decoded']} decoded)")
+    header = f"{'retailer':32} {'fetch':>6} {'p50ms':>7} {'p90ms':>7} {'p99ms':>7} {'retry':>6} {'tmout':>6} {'fail':>6} {'AI':>6}  methods"
+    for bucket, rows in report["buckets"].items():
+        print(f"\n== {bucket} ==")
+        print(header)
+        for host, s in rows.items():
+            lat = s["latency_ms"]
+            methods = ", ".join(f"{k}={v}" for k, v in sorted(s["parse_methods"].items()))
+            print(
+                f"{host[:32]:32} {s['fetches']:>6} {_ms(lat['p50']):>7} {_ms(lat['p90']):>7} "
+                f"{_ms(lat['p99']):>7} {_pct(s['retry_rate']):>6} {_pct(s['timeout_rate']):>6} "
+                f"{_pct(s['failure_rate']):>6} {_pct(s['ai_fallback_rate']):>6}  {methods}"
+            )
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(
+        description="Per-retailer fetch latency, retry/timeout rates and parse-method mix from the log partitions."
+    )
+    p.add_argument("--root", type=str, default=str(LOG_ROOT))
+    p.add_argument("--mode", action="append", choices=["debug", "test", "prod"],
+                   help="Only these run modes (repeatable; default all)")
+    p.add_argument("--since", type=date.fromisoformat, default=None, help="YYYY-MM-DD (inclusive)")
+    p.add_argument("--until", type=date.fromisoformat, default=None, help="YYYY-MM-DD (inclusive)")
+    p.add_argument("--by", choices=["none", "day", "hour"], default="none", help="Time bucket")
+    p.add_argument("--retailer", type=str, default=None, help="Substring of the retailer host")
+    p.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = p.parse_args()
+
+    started = datetime.now()
+    report = analyze(Path(args.root), args.mode, args.since, args.until, args.by, args.retailer)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+        print(f"\n({(datetime.now() - started).total_seconds():.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,37 @@
 
 from __future__ import annotations
 
+import atexit
+import gzip
 import json
-from datetime import datetime
+import os
+import queue
+import secrets
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Union
+
+
+from .config import LOG_ROOT, LOG_MAX_BYTES, LOG_COMPRESSION
+
+try:
+    import zstandard  # optional: LOG_COMPRESSION = "zstd"
+except ImportError:
+    zstandard = None
 
 
 # ================================================================
-# BASE DIRECTORY (WINDOWS-SAFE)
+# RUN ID
 # ================================================================
 
-# Always use forward slashes — avoids \U unicode escape errors.
-PROJECT_ROOT = Path("C:/Users/suzan/Projects/card/retailer_selector")
-
-# Root folder for all logs
-LOG_ROOT = PROJECT_ROOT / "logs"
-LOG_ROOT.mkdir(parents=True, exist_ok=True)
+# Unique per process, so runs in the same hour never share a file
+RUN_ID = (
+    f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{os.getpid()}-{secrets.token_hex(2)}"
+)
 
 
 # ================================================================
@@ -41,62 +56,371 @@ def set_run_mode(mode: str) -> None:
 
 
 # ================================================================
-# IN-MEMORY LOG BUFFER
+# LEVELS
 # ================================================================
 
-_LOG_BUFFER: List[Dict[str, Any]] = []
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+
+# Events below this level are dropped in log() before any formatting
+LOG_LEVEL = INFO
+
+def set_log_level(level: Union[int, str]) -> None:
+    global LOG_LEVEL
+    if isinstance(level, str):
+        by_name = {v: k for k, v in LEVEL_NAMES.items()}
+        level = by_name[level.lower()]
+    LOG_LEVEL = int(level)
 
 
 # ================================================================
-# LOGGING FUNCTIONS
+# IN-MEMORY RING (recent events only, for get_logs / text export)
 # ================================================================
 
-def log(message: str, context: str = "general", extra: Optional[Dict[str, Any]] = None) -> None:
+# Max events kept in memory; 0 disables the ring. Everything is still
+# streamed to the JSONL partition.
+LOG_RING_SIZE = 20_000
+
+_LOG_RING: deque = deque(maxlen=LOG_RING_SIZE or None)
+
+# Held by the writer thread while appending and by readers / resizes
+_RING_LOCK = threading.Lock()
+
+def set_ring_size(size: int) -> None:
+    global LOG_RING_SIZE, _LOG_RING
+    flush()
+    with _RING_LOCK:
+        LOG_RING_SIZE = max(0, int(size))
+        _LOG_RING = deque(list(_LOG_RING)[-LOG_RING_SIZE:] if LOG_RING_SIZE else [], maxlen=LOG_RING_SIZE or None)
+
+
+def _ring_events() -> List[Dict[str, Any]]:
+    with _RING_LOCK:
+        return list(_LOG_RING)
+
+
+# ================================================================
+# BACKGROUND WRITER
+# ================================================================
+
+# Buffered writes; the file is flushed every FLUSH_EVERY events or
+# FLUSH_SECONDS, whichever comes first (and on flush()/exit)
+WRITE_BUFFER_BYTES = 1024 * 1024
+FLUSH_EVERY = 500
+FLUSH_SECONDS = 1.0
+
+# Events waiting for the writer. When the writer falls this far behind,
+# log() drops new events (counted, reported in the log) instead of growing
+# memory without bound.
+LOG_QUEUE_SIZE = 100_000
+
+_QUEUE: "queue.Queue" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_WRITER: Optional[threading.Thread] = None
+_WRITER_LOCK = threading.Lock()
+
+_DROPPED = 0
+_DROPPED_LOCK = threading.Lock()
+
+# Set by the writer: the partition file currently being appended to
+_CURRENT_FILE: Optional[Path] = None
+
+
+class _Close(threading.Event):
+    """
+    Queue sentinel: close (and compress) the current file, then set().
+    """
+
+
+def partition_dir(mode: str, ts: float) -> Path:
+    """
+    Athena-style partition folder for an event:
+
+        logs/<mode>/date=YYYY-MM-DD/hour=HH
+    """
+    now = datetime.fromtimestamp(ts, timezone.utc)
+    return LOG_ROOT / mode / f"date={now:%Y-%m-%d}" / f"hour={now:%H}"
+
+
+def _render(raw: tuple) -> Dict[str, Any]:
     """
-    Append a structured log entry into the global buffer.
+    Queue tuple → event dict. Runs on the writer thread, so message
+    formatting and timestamp conversion stay off the caller's path.
     """
-    event = {
-        "timestamp": datetime.utcnow().isoformat(),
-        "mode": CURRENT_RUN_MODE,
+    ts, level, mode, context, message, args, extra = raw
+    if callable(message):
+        message = message()
+    elif args:
+        try:
+            message = message % args
+        except Exception:
+            message = f"{message} {args!r}"
+    return {
+        "timestamp": datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat(),
+        "level": LEVEL_NAMES.get(level, str(level)),
+        "mode": mode,
         "context": context,
-        "message": message,
+        "message": str(message),
         "extra": extra or {},
     }
-    _LOG_BUFFER.append(event)
+
+
+def compress_log_file(path: Path) -> Path:
+    """
+    Compress a closed JSONL file per LOG_COMPRESSION ("gzip", "zstd",
+    "none"); zstd falls back to gzip when zstandard is not installed.
+    Returns the resulting path.
+    """
+    method = LOG_COMPRESSION
+    if method == "zstd" and zstandard is None:
+        method = "gzip"
+    if method == "none" or not path.exists():
+        return path
+
+    if method == "zstd":
+        out = path.with_name(path.name + ".zst")
+        with open(path, "rb") as src, open(out, "wb") as dst:
+            zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+    else:
+        out = path.with_name(path.name + ".gz")
+        with open(path, "rb") as src, gzip.open(out, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, WRITE_BUFFER_BYTES)
+    path.unlink()
+    return out
+
+
+def _next_free_file(directory: Path, seq: int) -> tuple:
+    """
+    First <run id>-<seq> file name in directory not already used (plain or
+    compressed) by this run → (path, seq).
+    """
+    while True:
+        path = directory / f"retail_selector-{RUN_ID}-{seq:03d}.jsonl"
+        if not any(path.with_name(path.name + ext).exists() for ext in ("", ".gz", ".zst")):
+            return path, seq
+        seq += 1
+
+
+def _enqueue(item: tuple) -> None:
+    """
+    Hand an event to the writer, or drop (and count) it when the queue is full.
+    """
+    global _DROPPED
+    try:
+        _QUEUE.put_nowait(item)
+    except queue.Full:
+        with _DROPPED_LOCK:
+            _DROPPED += 1
+
+
+def dropped_log_events() -> int:
+    """
+    Events dropped so far because the writer queue was full.
+    """
+    return _DROPPED
+
+
+def _writer_loop() -> None:
+    global _CURRENT_FILE
+    f = None
+    current_dir: Optional[Path] = None
+    seq = 0
+    size = 0
+    pending = 0
+    last_flush = time.monotonic()
+    dropped_reported = 0
+
+    def close_current() -> Optional[Path]:
+        nonlocal f
+        if f is None:
+            return None
+        f.close()
+        f = None
+        return compress_log_file(_CURRENT_FILE)
+
+    def write_event(raw: tuple) -> None:
+        global _CURRENT_FILE
+        nonlocal f, current_dir, seq, size, pending
+        ev = _render(raw)
+        if LOG_RING_SIZE:
+            with _RING_LOCK:
+                _LOG_RING.append(ev)
+
+        target = partition_dir(ev["mode"], raw[0])
+        if f is None or target != current_dir or size >= LOG_MAX_BYTES:
+            close_current()
+            seq = seq + 1 if target == current_dir else 0
+            target.mkdir(parents=True, exist_ok=True)
+            _CURRENT_FILE, seq = _next_free_file(target, seq)
+            f = _CURRENT_FILE.open("a", encoding="utf-8", buffering=WRITE_BUFFER_BYTES)
+            current_dir = target
+            size = 0
+        line = json.dumps(ev, ensure_ascii=False) + "\n"
+        f.write(line)
+        size += len(line)
+        pending += 1
+
+    while True:
+        try:
+            item = _QUEUE.get(timeout=FLUSH_SECONDS)
+        except queue.Empty:
+            item = None
+
+        if isinstance(item, _Close):
+            final = close_current()
+            if final is not None:
+                _CURRENT_FILE = final
+            item.set()
+            continue
+
+        if isinstance(item, threading.Event):
+            # flush() barrier: everything queued before it has been written
+            if f is not None:
+                f.flush()
+                pending = 0
+                last_flush = time.monotonic()
+            item.set()
+            continue
+
+        if item is not None:
+            write_event(item)
+
+        if _DROPPED > dropped_reported:
+            write_event((
+                time.time(), WARNING, CURRENT_RUN_MODE, "logger",
+                f"log queue full: {_DROPPED - dropped_reported} events dropped",
+                (), {"dropped_total": _DROPPED},
+            ))
+            dropped_reported = _DROPPED
+
+        if f is not None and pending and (
+            pending >= FLUSH_EVERY or time.monotonic() - last_flush >= FLUSH_SECONDS
+        ):
+            f.flush()
+            pending = 0
+            last_flush = time.monotonic()
+
+
+def _ensure_writer() -> None:
+    global _WRITER
+    if _WRITER is not None:
+        return
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = threading.Thread(target=_writer_loop, name="log-writer", daemon=True)
+            _WRITER.start()
+
+
+def flush(timeout: float = 10.0) -> None:
+    """
+    Block until every event logged so far is written to disk.
+    """
+    if _WRITER is None:
+        return
+    done = threading.Event()
+    _QUEUE.put(done)
+    done.wait(timeout)
+
+
+def close_logs(timeout: float = 30.0) -> str:
+    """
+    Flush and close (and compress) the current log file. Logging again
+    afterwards starts a new file in the same run. Returns the final path.
+    """
+    if _WRITER is not None:
+        done = _Close()
+        _QUEUE.put(done)
+        done.wait(timeout)
+    return str(_CURRENT_FILE) if _CURRENT_FILE is not None else ""
+
+
+atexit.register(close_logs)
 
 
 # ================================================================
-# JSONL EXPORT
+# WORKER PROCESSES (parse pool)
 # ================================================================
 
-def export_logs_as_jsonl() -> str:
+# Set in pool workers: log() keeps events here for the parent to replay,
+# so worker logs land in the parent's file under the parent's RUN_ID.
+_CAPTURED: Optional[List[tuple]] = None
+
+def capture_logs() -> None:
+    """
+    Pool initializer: this process never writes log files itself (a forked
+    child also drops the writer it inherited without its thread).
     """
-    Write buffered logs into Athena-style partition paths:
+    global _CAPTURED, _WRITER
+    _CAPTURED = []
+    _WRITER = None
 
-        logs/<mode>/date=YYYY-MM-DD/hour=HH/retail_selector.jsonl
 
-    Returns the full file path as a string.
+def take_captured_logs() -> List[tuple]:
     """
-    now = datetime.utcnow()
+    Events logged in this worker since the last call (picklable).
+    """
+    global _CAPTURED
+    if _CAPTURED is None:
+        return []
+    events, _CAPTURED = _CAPTURED, []
+    return events
+
 
-    date = f"{now.year:04d}-{now.month:02d}-{now.day:02d}"
-    hour = f"{now.hour:02d}"
+def replay_logs(events: List[tuple]) -> None:
+    """
+    Queue events captured in a worker process under this process's run mode.
+    """
+    for ts, level, context, message, args, extra in events:
+        _ensure_writer()
+        _enqueue((ts, level, CURRENT_RUN_MODE, context, message, args, extra))
 
-    partition = (
-        LOG_ROOT
-        / CURRENT_RUN_MODE
-        / f"date={date}"
-        / f"hour={hour}"
-    )
-    partition.mkdir(parents=True, exist_ok=True)
 
-    out_file = partition / "retail_selector.jsonl"
+# ================================================================
+# LOGGING FUNCTIONS
+# ================================================================
 
-    with out_file.open("w", encoding="utf-8") as f:
-        for entry in _LOG_BUFFER:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+def log(
+    message: Union[str, Callable[[], str]],
+    context: str = "general",
+    extra: Optional[Dict[str, Any]] = None,
+    level: int = INFO,
+    args: tuple = (),
+) -> None:
+    """
+    Queue a structured log entry for the background writer.
 
-    return str(out_file)
+    Events below LOG_LEVEL return immediately. Formatting is lazy: pass
+    %-style args (log("status=%s", "scraping", args=(status,))) or a
+    zero-arg callable as message; either is rendered on the writer thread.
+    """
+    if level < LOG_LEVEL:
+        return
+    if _CAPTURED is not None:
+        _CAPTURED.append((time.time(), level, context, message() if callable(message) else message, args, extra))
+        return
+    _ensure_writer()
+    _enqueue((time.time(), level, CURRENT_RUN_MODE, context, message, args, extra))
+
+
+# ================================================================
+# JSONL EXPORT
+# ================================================================
+
+def export_logs_as_jsonl() -> str:
+    """
+    Logs are streamed to Athena-style partition paths as they happen:
+
+        logs/<mode>/date=YYYY-MM-DD/hour=HH/retail_selector-<run id>-<seq>.jsonl
+
+    one file per run (rotated at LOG_MAX_BYTES, closed files compressed).
+    This only flushes the writer; safe to call any number of times.
+    Returns the current file path as a string.
+    """
+    flush()
+    return str(_CURRENT_FILE) if _CURRENT_FILE is not None else ""
 
 
 # ================================================================
@@ -105,10 +429,12 @@ def export_logs_as_jsonl() -> str:
 
 def export_logs_as_text() -> str:
     """
-    Convert buffered events into a plain-text block.
+    Convert the in-memory ring (most recent LOG_RING_SIZE events) into a
+    plain-text block.
     """
+    flush()
     lines = []
-    for ev in _LOG_BUFFER:
+    for ev in _ring_events():
         ts = ev["timestamp"]
         ctx = ev["context"]
         msg = ev["message"]
@@ -123,10 +449,12 @@ def export_logs_as_text() -> str:
 
 def get_logs(context: Optional[str] = None, text: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Search the in-memory buffer.
+    Search the in-memory ring (recent events only; the full history is in
+    the JSONL partitions).
     """
+    flush()
     out = []
-    for ev in _LOG_BUFFER:
+    for ev in _ring_events():
         if context and ev["context"] != context:
             continue
         if text and text.lower() not in ev["message"].lower():
@@ -0,0 +1,239 @@
+# retail_selector/metrics.py
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, Tuple, Optional
+from urllib.parse import urlparse
+
+# Process-wide counters and latency histograms for one run, exported at the
+# end as OpenMetrics text (metrics-<run id>.prom) and a JSON summary.
+# Recording is a dict update under a lock, cheap enough for per-attempt use.
+
+# Histogram bucket upper bounds (ms)
+LATENCY_BUCKETS_MS = (
+    5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000, 120000,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_LOCK = threading.Lock()
+_COUNTERS: Dict[str, Dict[LabelKey, float]] = {}
+_HISTOGRAMS: Dict[str, Dict[LabelKey, list]] = {}
+# Thread CPU time (ms) spent inside timed() blocks, per histogram name
+_CPU_MS: Dict[str, float] = {}
+_HELP: Dict[str, str] = {
+    "fetches": "URLs handed to the scraper",
+    "fetches_completed": "URLs whose fetch finished (after retries)",
+    "fetch_attempts": "HTTP attempts that got a response, by status",
+    "fetch_retries": "Attempts retried, by reason",
+    "fetch_timeouts": "Fetch attempts that timed out",
+    "fetch_exceptions": "Fetch attempts that raised, by exception type",
+    "fetch_skipped": "URLs never fetched (run deadline)",
+    "fetch_bytes_received": "Response body characters received",
+    "shopify_json": "Shopify product JSON fetches, by outcome (ok, fallback, not_product_url)",
+    "extract_rules": "Selector-extraction fetches, by outcome (ok, fallback)",
+    "parse_results": "Rows parsed, by method",
+    "ai_calls": "OpenAI fallback calls",
+    "ai_errors": "OpenAI fallback calls that failed",
+    "xlsx_cache": "Master XLSX cache lookups, by result",
+    "rows": "Rows by outcome (scanned, carried_forward, resumed)",
+    "fetch_latency_ms": "Scraper round trip per attempt",
+    "parse_latency_ms": "HTML heuristics parse time per page",
+    "ai_latency_ms": "OpenAI fallback call time",
+}
+
+
+@lru_cache(maxsize=4096)
+def host_label(url: str) -> str:
+    """
+    Retailer host of a URL, used as the 'host' label.
+    """
+    host = urlparse(url or "").netloc.lower()
+    return host[4:] if host.startswith("www.") else host or "unknown"
+
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels: Any) -> None:
+    key = _key(labels)
+    with _LOCK:
+        series = _COUNTERS.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+
+def observe(name: str, value_ms: float, **labels: Any) -> None:
+    """
+    Record one latency sample (ms) into the histogram `name`.
+    """
+    key = _key(labels)
+    with _LOCK:
+        series = _HISTOGRAMS.setdefault(name, {})
+        h = series.get(key)
+        if h is None:
+            # [bucket counts..., +Inf count, sum]
+            h = series[key] = [0] * (len(LATENCY_BUCKETS_MS) + 1) + [0.0]
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if value_ms <= bound:
+                h[i] += 1
+                break
+        else:
+            h[len(LATENCY_BUCKETS_MS)] += 1
+        h[-1] += value_ms
+
+
+class timed:
+    """
+    with timed("parse_latency_ms", host=h): ...  → observe() on exit.
+    Also adds the block's thread CPU time to histogram_total(name).
+    """
+
+    def __init__(self, name: str, **labels: Any):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        self._c0 = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        cpu_ms = (time.thread_time() - self._c0) * 1000.0
+        observe(self.name, (time.perf_counter() - self._t0) * 1000.0, **self.labels)
+        with _LOCK:
+            _CPU_MS[self.name] = _CPU_MS.get(self.name, 0.0) + cpu_ms
+        return False
+
+
+def counter_total(name: str) -> float:
+    """
+    Sum of a counter across all label sets.
+    """
+    with _LOCK:
+        return sum(_COUNTERS.get(name, {}).values())
+
+
+def histogram_total(name: str) -> Tuple[int, float, Optional[float]]:
+    """
+    (samples, summed ms, thread CPU ms) of a histogram across all label
+    sets; CPU is only known for samples recorded through timed().
+    """
+    with _LOCK:
+        series = _HISTOGRAMS.get(name, {})
+        count = sum(sum(h[:-1]) for h in series.values())
+        total = sum(h[-1] for h in series.values())
+        return count, total, _CPU_MS.get(name)
+
+
+def reset_metrics() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
+        _HISTOGRAMS.clear()
+        _CPU_MS.clear()
+
+
+# -------------------------------------------------------------------
+# Export
+# -------------------------------------------------------------------
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join(
+        f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for k, v in items
+    )
+    return "{" + body + "}"
+
+
+def _quantile(h: list, q: float) -> Optional[float]:
+    """
+    Bucket upper bound containing the q-quantile (like histogram_quantile).
+    """
+    total = sum(h[:-1])
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, c in enumerate(h[:-1]):
+        seen += c
+        if seen >= rank:
+            return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else math.inf
+    return math.inf
+
+
+def to_openmetrics() -> str:
+    lines = []
+    with _LOCK:
+        for name, series in sorted(_COUNTERS.items()):
+            lines.append(f"# TYPE retail_selector_{name} counter")
+            if name in _HELP:
+                lines.append(f"# HELP retail_selector_{name} {_HELP[name]}")
+            for key, v in sorted(series.items()):
+                lines.append(f"retail_selector_{name}_total{_fmt_labels(key)} {v:g}")
+        for name, series in sorted(_HISTOGRAMS.items()):
+            lines.append(f"# TYPE retail_selector_{name} histogram")
+            if name in _HELP:
+                lines.append(f"# HELP retail_selector_{name} {_HELP[name]}")
+            for key, h in sorted(series.items()):
+                cumulative = 0
+                for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                    cumulative += h[i]
+                    lines.append(
+                        f"retail_selector_{name}_bucket{_fmt_labels(key, ('le', f'{bound:g}'))} {cumulative}"
+                    )
+                cumulative += h[len(LATENCY_BUCKETS_MS)]
+                lines.append(f"retail_selector_{name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {cumulative}")
+                lines.append(f"retail_selector_{name}_sum{_fmt_labels(key)} {h[-1]:.3f}")
+                lines.append(f"retail_selector_{name}_count{_fmt_labels(key)} {cumulative}")
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_summary() -> Dict[str, Any]:
+    """
+    JSON-friendly view: counters per label set, histograms as
+    count / mean / p50 / p90 / p99 (bucket upper bounds, ms).
+    """
+    def label_str(key: LabelKey) -> str:
+        return ",".join(f"{k}={v}" for k, v in key) or "all"
+
+    with _LOCK:
+        counters = {
+            name: {label_str(k): v for k, v in sorted(series.items())}
+            for name, series in sorted(_COUNTERS.items())
+        }
+        histograms = {}
+        for name, series in sorted(_HISTOGRAMS.items()):
+            histograms[name] = {}
+            for key, h in sorted(series.items()):
+                n = sum(h[:-1])
+                histograms[name][label_str(key)] = {
+                    "count": n,
+                    "mean": round(h[-1] / n, 1) if n else None,
+                    "p50": _quantile(h, 0.50),
+                    "p90": _quantile(h, 0.90),
+                    "p99": _quantile(h, 0.99),
+                }
+    return {"counters": counters, "histograms": histograms}
+
+
+def export_metrics(out_dir: Path | str, run_id: str) -> Tuple[Path, Path]:
+    """
+    Write metrics-<run_id>.prom (OpenMetrics) and metrics-<run_id>.json.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    prom = out_dir / f"metrics-{run_id}.prom"
+    summary = out_dir / f"metrics-{run_id}.json"
+    prom.write_text(to_openmetrics(), encoding="utf-8")
+    with open(summary, "w", encoding="utf-8") as f:
+        json.dump({"run_id": run_id, **metrics_summary()}, f, indent=2, default=str)
+    return prom, summary
@@ -3,9 +3,11 @@ from __future__ import annotations
 
 import argparse
 import asyncio
-from datetime import datetime, timezone
+import os
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Optional, Iterable, Dict, Any, List
+from typing import Optional, Iterable, Dict, Any, List, Tuple
 
 import pandas as pd
 
@@ -13,194 +15,132 @@ from .config import (
     load_secrets,
     DEFAULT_WORKBOOK_PATH,
     DEFAULT_SECRETS_PATH,
-    MASTER_SHEET_ID,
+    FINALIZE_RESERVE_SECONDS,
+    PRODUCT_MAP_TAB,
+    SHARD_DIR,
+    PARSE_WORKERS,
+    STORAGE_BACKEND,
 )
-from .gsheet import (
-    download_product_map,
-    upload_product_map,
-    download_gsheet_as_xlsx,
+from . import config
+from .storage import get_storage_backend, close_storage_backend
+from .workbook import (
+    scan_workbook_tables_async,
+    load_workbook_tables,
+    extract_product_map,
+    save_updated_workbook,
+    workbook_to_bytes,
 )
-from .workbook import scan_workbook_async
 from .emailer import send_email_with_attachment_async
-from .scraping import scrapingbee_fetch_many
-from .parsing import hybrid_lookup_from_bee_result
-from .logger import log, set_run_mode, export_logs_as_jsonl, export_logs_as_text
+from .parsing import make_parse_executor
+from .pipeline import run_pipeline, StorageMapSource, StorageMapSink
+from .logger import log, set_run_mode, close_logs, export_logs_as_jsonl, export_logs_as_text, RUN_ID
+from .metrics import export_metrics
+from .tracing import enable_tracing, tracing_enabled, export_trace
+from .profiling import phase, enable_profiling, profiling_enabled, export_profile, format_profile
+from .journal import RunJournal, open_journal, apply_journaled
+from .sharding import (
+    parse_shard_spec,
+    select_shard_rows,
+    write_shard_partition,
+    load_shard_partitions,
+    load_shard_states,
+    shard_state_path,
+    clear_shard_partitions,
+)
+from .state import CARRY_COLUMNS, row_key, save_scan_state
 
 
 # -------------------------------------------------------------------
 # MODE 1: Direct Product↔Retailer Map scanner (debug / --rows mode)
 # -------------------------------------------------------------------
 
+def _open_run_journal(
+    name: str,
+    limit: Optional[int],
+    resume: bool,
+    resume_since: Optional[float] = None,
+) -> Tuple[Optional[RunJournal], Dict[str, Dict[str, Any]]]:
+    """
+    Checkpoint journal for a run. --limit test runs get none: they must not
+    truncate (or compact) the journal of an interrupted production run.
+    """
+    if limit is not None:
+        if resume:
+            log("--resume ignored for a --limit test run", context="orchestrator")
+        return None, {}
+    return open_journal(name, resume=resume, since=resume_since)
+
+
 async def run_hybrid_pricer_async(
     scrapingbee_api_key: str,
     limit: Optional[int] = None,
     upload: bool = False,
     concurrency: int = 20,
     row_indices: Optional[Iterable[int]] = None,
+    incremental: bool = False,
+    deadline: Optional[float] = None,
+    resume: bool = False,
+    resume_since: Optional[float] = None,
+    parse_workers: int = PARSE_WORKERS,
+    watch_only: bool = False,
+    save_state: bool = True,
 ) -> pd.DataFrame:
     """
-    Direct scanner that works only on the Product↔Retailer Map sheet.
-    """
-
-    log("Downloading Product↔Retailer Map...", context="orchestrator")
-    df = download_product_map()
-    df.columns = [str(c).strip() for c in df.columns]
-
-    if df.empty:
-        log("Product↔Retailer Map is empty. Nothing to scan.", context="orchestrator")
-        return df
-
-    # Mode detection was done by main(), but log here too
-    log(f"Filtered to {len(df)} valid URLs", context="orchestrator")
-
-    # Row filtering
-    if row_indices is not None:
-        idx_list = sorted(set(int(i) for i in row_indices))
-        df = df.iloc[idx_list].copy()
-        log(f"Debug mode: filtered rows {idx_list}", context="orchestrator")
-    elif limit is not None:
-        df = df.head(limit).copy()
-        log(f"Test mode: limit={limit}", context="orchestrator")
-
-    if df.empty:
-        log("After filtering, no rows remain to scan.", context="orchestrator")
-        return df
-
-    # KPI / output columns
-    output_cols = {
-        "In Stock (Y/N)": "object",
-        "Price ($USD)": "float64",
-        "Last Scan (UTC)": "object",
-        "HTTP Status": "object",
-        "Parse Method": "object",
-        "Response ms": "float64",
-        "Last Error": "object",
-        "URL Status": "object",
-        "Validation Issues": "object",
-    }
-
-    for col, dtype in output_cols.items():
-        if col not in df.columns:
-            df[col] = pd.Series([None] * len(df), dtype="object")
-        if dtype.startswith("float"):
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-
-    if "search_url" not in df.columns:
-        raise KeyError("Expected column 'search_url'")
-
-    urls = []
-    row_lookup = []
-
-    for idx, row in df.iterrows():
-        url = str(row.get("search_url") or "").strip()
-        if not url:
-            df.at[idx, "URL Status"] = "missing_url"
-            df.at[idx, "Last Error"] = "No search_url provided"
-            log(f"row={idx} missing search_url", context="orchestrator")
-            continue
-
-        urls.append(url)
-        row_lookup.append(idx)
-
-    if not urls:
-        log("No valid URLs to scan (all blank).", context="orchestrator")
-        return df
-
-    log(f"Starting fetch for {len(urls)} urls, concurrency={concurrency}", context="orchestrator")
-
-    # Scrape
-    bee_results = await scrapingbee_fetch_many(
-        urls=urls,
-        api_key=scrapingbee_api_key,
-        concurrency=concurrency,
-    )
-
-    now_iso = datetime.now(timezone.utc).isoformat()
+    Direct scanner that works only on the Product↔Retailer Map sheet:
+    pipeline.run_pipeline from the storage backend's map tab back to the
+    output sheet.
 
-    # -------- Parse each row with progress output --------
-    total = len(row_lookup)
+    With incremental=True only rows that are due for a revisit are scraped;
+    the rest are carried forward from the local scan state.
 
-    for idx, (url, df_idx, bee) in enumerate(zip(urls, row_lookup, bee_results), start=1):
-        row = df.loc[df_idx]
+    deadline (epoch seconds) is when the whole run must be finished; fetching
+    stops FINALIZE_RESERVE_SECONDS earlier so the upload still happens.
 
-        product_id = str(row.get("product_id") or row.get("Product ID") or "").strip()
-        description = str(row.get("DESCRIPTION") or row.get("product_name") or "").strip()
-        retailer_key = str(row.get("retailer_key") or row.get("Retailer") or "").strip()
+    Every parsed row is appended to a checkpoint journal; resume=True
+    restores the rows a crashed run already finished instead of rescanning
+    (only those journaled after resume_since, epoch seconds, and never
+    older than journal.JOURNAL_MAX_AGE_HOURS).
 
-        # progress print + log
-        msg = (
-            f"[progress] {idx}/{total} "
-            f"row={df_idx} pid={product_id} retailer={retailer_key} url={url}"
-        )
-        print(msg, flush=True)
-        log(msg, context="orchestrator")
+    parse_workers > 0 moves HTML parsing into that many worker processes.
 
-        try:
-            parsed = hybrid_lookup_from_bee_result(
-                product_id=product_id,
-                description=description,
-                retailer_key=retailer_key,
-                original_url=url,
-                bee=bee,
-                debug=False,
-            )
-        except Exception as e:
-            http_status = bee.get("status_code") or bee.get("status") or ""
-            df.at[df_idx, "In Stock (Y/N)"] = ""
-            df.at[df_idx, "Price ($USD)"] = float("nan")
-            df.at[df_idx, "Last Scan (UTC)"] = now_iso
-            df.at[df_idx, "HTTP Status"] = str(http_status)
-            df.at[df_idx, "Parse Method"] = "error"
-            df.at[df_idx, "Response ms"] = float(bee.get("response_ms") or 0)
-            df.at[df_idx, "Last Error"] = f"parse_error: {e!r}"
-            df.at[df_idx, "URL Status"] = "error"
-            df.at[df_idx, "Validation Issues"] = "exception_in_parser"
-
-            log(
-                f"row={df_idx} pid={product_id} retailer={retailer_key} EXCEPTION={e!r}",
-                context="orchestrator",
-            )
-            continue
-
-        # Normal fill
-        in_stock = parsed.get("stock")
-        price = parsed.get("price")
-        parse_method = parsed.get("method") or ""
-        status = parsed.get("status") or ""
-        http_status = parsed.get("http_status") or bee.get("status_code") or bee.get("status")
-        elapsed_ms = parsed.get("response_ms") or bee.get("response_ms") or 0
-        error_msg = parsed.get("error") or ""
-        val_issues = parsed.get("validation_issues") or ""
-
-        if in_stock in (True, "Y", "y", "yes"):
-            stock_flag = "Y"
-        elif in_stock in (False, "N", "n", "no"):
-            stock_flag = "N"
-        else:
-            stock_flag = str(in_stock or "")
-
-        df.at[df_idx, "In Stock (Y/N)"] = stock_flag
-        df.at[df_idx, "Price ($USD)"] = float(price) if price is not None else float("nan")
-        df.at[df_idx, "Last Scan (UTC)"] = now_iso
-        df.at[df_idx, "HTTP Status"] = str(http_status)
-        df.at[df_idx, "Parse Method"] = parse_method
-        df.at[df_idx, "Response ms"] = float(elapsed_ms)
-        df.at[df_idx, "Last Error"] = error_msg
-        df.at[df_idx, "URL Status"] = status
-        df.at[df_idx, "Validation Issues"] = val_issues
+    watch_only=True (daemon sweeps) scans just the Active Watch List rows and
+    carries the rest forward, so the uploaded map stays complete.
 
-        log(
-            f"row_result row={df_idx} pid={product_id} retailer={retailer_key} "
-            f"url={url} price={price} stock={stock_flag} method={parse_method} "
-            f"status={status} err={error_msg}",
-            context="orchestrator",
+    save_state=False keeps the run out of the scan state (debug / test).
+    """
+    # Resume: rows journaled by a crashed run are restored, not rescanned
+    journal, resumed_rows = _open_run_journal("map", limit, resume, resume_since)
+    parse_executor = make_parse_executor(parse_workers)
+    try:
+        df, _ = await run_pipeline(
+            # Explicit rows are scanned as given: no watch list download
+            StorageMapSource(watch_list=row_indices is None),
+            scrapingbee_api_key,
+            sinks=[StorageMapSink()] if upload else [],
+            limit=limit,
+            row_indices=row_indices,
+            watch_only=watch_only,
+            incremental=incremental,
+            concurrency=concurrency,
+            fetch_deadline=deadline - FINALIZE_RESERVE_SECONDS if deadline is not None else None,
+            journal=journal,
+            resumed_rows=resumed_rows,
+            parse_executor=parse_executor,
+            progress=True,
+            save_state=save_state,
         )
-
+    finally:
+        if parse_executor is not None:
+            parse_executor.shutdown()
 
     if upload:
-        log("Uploading updated Product↔Retailer Map to Google Sheets...", context="orchestrator")
-        upload_product_map(df)
+        # Results are committed → the checkpoint journal is no longer needed
+        if journal is not None:
+            journal.compact()
     else:
+        # Nothing was committed: keep the journal for --resume
+        if journal is not None:
+            journal.close()
         log("Upload disabled (debug/test mode).", context="orchestrator")
 
     return df
@@ -210,13 +150,48 @@ async def run_hybrid_pricer_async(
 # FULL PIPELINE (XLSX workflow + email)
 # -------------------------------------------------------------------
 
+def _write_workbook_copy(path: Path, data: bytes) -> None:
+    """
+    Persist the emailed workbook (tmp + rename so a crash never leaves a
+    truncated .xlsx behind).
+    """
+    with phase("save_workbook", bytes=len(data)):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+
 async def run_scan_from_gsheet_and_email(
     workbook_path: Path,
     secrets_path: Path,
     limit: Optional[int] = None,
     concurrency: int = 20,
     upload: bool = True,
+    incremental: bool = False,
+    deadline: Optional[float] = None,
+    resume: bool = False,
+    resume_since: Optional[float] = None,
+    parse_workers: int = PARSE_WORKERS,
+    save_state: bool = True,
+    save_copy: bool = True,
 ) -> Dict[str, Any]:
+    """
+    Full pipeline: master sheet → XLSX → scan → upload map → email XLSX.
+
+    deadline (epoch seconds) is when the whole run must be finished; fetching
+    stops FINALIZE_RESERVE_SECONDS earlier and the partial results are still
+    saved, uploaded and emailed.
+
+    resume=True restores rows from the previous (crashed) run's journal
+    that were journaled after resume_since (see run_hybrid_pricer_async).
+
+    save_state=False (--limit test runs) leaves the scan state untouched;
+    runs with a limit keep no checkpoint journal either.
+
+    save_copy=False only emails the workbook; workbook_path then just names
+    the attachment and nothing is written to disk.
+    """
     log("Loading secrets...", context="orchestrator")
     secrets = load_secrets(secrets_path)
 
@@ -228,25 +203,57 @@ async def run_scan_from_gsheet_and_email(
     email_from = secrets["EMAIL_FROM"]
     email_to = secrets["EMAIL_TO"]
 
-    await asyncio.to_thread(download_product_map)
-    log("Downloaded Product↔Retailer Map for sanity.", context="orchestrator")
-
-    log("Downloading Google Sheet → XLSX", context="orchestrator")
+    # Inputs: master XLSX (revision-cached) and, when uploading, the output
+    # sheet's current values as the diff base – fetched concurrently.
+    # The XLSX stays in memory end to end (download → parse → scan → email);
+    # the on-disk copy (save_copy) is only written alongside the email.
+    log("Downloading Google Sheet → XLSX (in memory)", context="orchestrator")
     workbook_path = Path(workbook_path)
-    workbook_path.parent.mkdir(parents=True, exist_ok=True)
-    await asyncio.to_thread(download_gsheet_as_xlsx, MASTER_SHEET_ID, workbook_path)
+    storage = get_storage_backend()
+    with phase("download_inputs"):
+        if upload:
+            xlsx_bytes, current_output = await asyncio.gather(
+                storage.download_workbook_bytes(),
+                storage.read_output_values(),
+            )
+        else:
+            xlsx_bytes = await storage.download_workbook_bytes()
+            current_output = None
+
+    with phase("load_workbook", bytes=len(xlsx_bytes)):
+        sheets = load_workbook_tables(xlsx_bytes)
+    del xlsx_bytes
 
     log("Running workbook scan...", context="orchestrator")
-    workbook_path, updated_product_df = await scan_workbook_async(
-        workbook_path=workbook_path,
-        scrapingbee_api_key=scrapingbee_api_key,
-        limit=limit,
-        concurrency=concurrency,
-    )
+    journal, resumed_rows = _open_run_journal("workbook", limit, resume, resume_since)
+    parse_executor = make_parse_executor(parse_workers)
+    try:
+        sheets, updated_product_df = await scan_workbook_tables_async(
+            sheets=sheets,
+            scrapingbee_api_key=scrapingbee_api_key,
+            limit=limit,
+            concurrency=concurrency,
+            incremental=incremental,
+            deadline=deadline - FINALIZE_RESERVE_SECONDS if deadline is not None else None,
+            journal=journal,
+            resumed_rows=resumed_rows,
+            parse_executor=parse_executor,
+            save_state=save_state,
+        )
+    finally:
+        if parse_executor is not None:
+            parse_executor.shutdown()
+
+    with phase("serialize_workbook"):
+        out_bytes = workbook_to_bytes(sheets)
+
+    skipped_deadline = 0
+    if "URL Status" in updated_product_df.columns:
+        skipped_deadline = int((updated_product_df["URL Status"] == "skipped_deadline").sum())
 
     if upload:
-        log("Uploading results back to Google Sheets...", context="orchestrator")
-        sheet_id, web_link = await asyncio.to_thread(upload_product_map, updated_product_df)
+        uploaded = await StorageMapSink(current_values=current_output).write(updated_product_df)
+        sheet_id, web_link = uploaded["sheet_id"], uploaded["google_sheet_link"]
     else:
         sheet_id, web_link = None, None
         log("Upload disabled (--no-upload)", context="orchestrator")
@@ -257,9 +264,13 @@ async def run_scan_from_gsheet_and_email(
         "Attached is the latest updated copy of your Retail Arbitrage Targeting List.\n\n"
         f"Generated at {datetime.now(timezone.utc).isoformat()}"
     )
+    if skipped_deadline:
+        body += (
+            f"\n\nPartial run: {skipped_deadline} rows were not scanned before the run "
+            "deadline (URL Status = skipped_deadline)."
+        )
 
-    log(f"Emailing workbook to {email_to}", context="orchestrator")
-    await send_email_with_attachment_async(
+    email = send_email_with_attachment_async(
         smtp_server=smtp_server,
         smtp_port=smtp_port,
         username=smtp_user,
@@ -268,15 +279,182 @@ async def run_scan_from_gsheet_and_email(
         email_to=email_to,
         subject=subject,
         body=body,
-        attachment_path=workbook_path,
+        attachment_bytes=out_bytes,
+        attachment_name=workbook_path.name,
     )
+    with phase("email"):
+        if save_copy:
+            log(f"Emailing workbook to {email_to}; saving copy → {workbook_path}", context="orchestrator")
+            await asyncio.gather(email, asyncio.to_thread(_write_workbook_copy, workbook_path, out_bytes))
+        else:
+            log(f"Emailing workbook to {email_to} (no local copy)", context="orchestrator")
+            await email
+
+    # Map uploaded + workbook emailed → the checkpoint journal is no longer needed
+    if journal is not None:
+        journal.compact()
 
     log("Pipeline complete.", context="orchestrator")
 
     return {
-        "workbook_path": str(workbook_path),
+        "workbook_path": str(workbook_path) if save_copy else None,
         "email_to": email_to,
         "rows_scanned_limit": limit,
+        "rows_skipped_deadline": skipped_deadline,
+        "google_sheet_link": web_link,
+        "sheet_id": sheet_id,
+    }
+
+
+# -------------------------------------------------------------------
+# SHARDED RUNS (--shard i/N per worker, then one --merge-shards N)
+# -------------------------------------------------------------------
+
+async def run_shard_scan(
+    secrets_path: Path,
+    shard: Tuple[int, int],
+    shard_dir: Path,
+    limit: Optional[int] = None,
+    concurrency: int = 20,
+    incremental: bool = False,
+    deadline: Optional[float] = None,
+    resume: bool = False,
+    parse_workers: int = PARSE_WORKERS,
+) -> Dict[str, Any]:
+    """
+    Scan one deterministic shard of the Product↔Retailer Map and write its
+    result partition to shard_dir. No upload / email – the merge step does
+    that once for all shards. Shards can run as separate processes on one
+    box or on several machines sharing shard_dir. The master workbook stays
+    in memory; nothing but the partition (and shard state) is written.
+    """
+    shard_index, num_shards = shard
+    log(f"Shard {shard_index}/{num_shards}: loading secrets...", context="orchestrator")
+    secrets = load_secrets(secrets_path)
+
+    with phase("download_inputs"):
+        xlsx_bytes = await get_storage_backend().download_workbook_bytes()
+    with phase("load_workbook", bytes=len(xlsx_bytes)):
+        sheets = load_workbook_tables(xlsx_bytes)
+    del xlsx_bytes
+
+    journal, resumed_rows = _open_run_journal(
+        f"workbook_shard{shard_index}of{num_shards}", limit, resume
+    )
+    parse_executor = make_parse_executor(parse_workers)
+    try:
+        _, df = await scan_workbook_tables_async(
+            sheets=sheets,
+            scrapingbee_api_key=secrets["SCRAPINGBEE_API_KEY"],
+            limit=limit,
+            concurrency=concurrency,
+            incremental=incremental,
+            deadline=deadline - FINALIZE_RESERVE_SECONDS if deadline is not None else None,
+            journal=journal,
+            resumed_rows=resumed_rows,
+            shard=shard,
+            parse_executor=parse_executor,
+            # Not the shared state file: the merge step folds this one in
+            state_path=shard_state_path(shard_dir, shard_index, num_shards),
+        )
+    finally:
+        if parse_executor is not None:
+            parse_executor.shutdown()
+
+    rows = select_shard_rows(df, shard_index, num_shards)
+    part = write_shard_partition(df, rows, CARRY_COLUMNS, shard_dir, shard_index, num_shards)
+
+    # Partition written → the checkpoint journal is no longer needed
+    if journal is not None:
+        journal.compact()
+
+    log(f"Shard {shard_index}/{num_shards} complete.", context="orchestrator")
+    return {
+        "shard": f"{shard_index}/{num_shards}",
+        "rows_in_shard": len(rows),
+        "partition": str(part),
+    }
+
+
+async def run_merge_shards_and_email(
+    workbook_path: Path,
+    secrets_path: Path,
+    num_shards: int,
+    shard_dir: Path,
+    upload: bool = True,
+) -> Dict[str, Any]:
+    """
+    Merge all shard partitions into the master workbook's Product↔Retailer
+    Map, then do the single save → upload → email of a normal full run.
+    """
+    log(f"Merging {num_shards} shard partitions from {shard_dir}", context="orchestrator")
+    secrets = load_secrets(secrets_path)
+    results = load_shard_partitions(shard_dir, num_shards)
+    shard_states = load_shard_states(shard_dir, num_shards)
+
+    workbook_path = Path(workbook_path)
+    with phase("download_inputs"):
+        xlsx_bytes = await get_storage_backend().download_workbook_bytes()
+    with phase("load_workbook", bytes=len(xlsx_bytes)):
+        sheets = load_workbook_tables(xlsx_bytes)
+    del xlsx_bytes
+    df = extract_product_map(sheets)
+    df["search_url"] = df["search_url"].fillna("").astype(str).str.strip()
+    df = df[df["search_url"] != ""].copy()
+
+    merged = 0
+    for idx in df.index:
+        values = results.get(row_key(df.loc[idx]))
+        if values:
+            apply_journaled(df, idx, values)
+            merged += 1
+    log(f"Merged results into {merged}/{len(df)} rows", context="orchestrator")
+
+    # One writer for the shared scan state: the shards' entries go in here
+    if shard_states:
+        save_scan_state(shard_states, keys=list(shard_states))
+
+    sheets[PRODUCT_MAP_TAB] = df
+    workbook_path.parent.mkdir(parents=True, exist_ok=True)
+    with phase("save_workbook"):
+        save_updated_workbook(workbook_path, sheets)
+
+    if upload:
+        log("Uploading merged results back to Google Sheets...", context="orchestrator")
+        with phase("upload", rows=len(df)):
+            sheet_id, web_link = await get_storage_backend().upload_product_map(df)
+    else:
+        sheet_id, web_link = None, None
+        log("Upload disabled (--no-upload)", context="orchestrator")
+
+    subject = "Retail Selector: Updated Retail Arbitrage Targeting List"
+    body = (
+        "Attached is the latest updated copy of your Retail Arbitrage Targeting List.\n\n"
+        f"Merged from {num_shards} shards at {datetime.now(timezone.utc).isoformat()}"
+    )
+
+    log(f"Emailing workbook to {secrets['EMAIL_TO']}", context="orchestrator")
+    with phase("email"):
+        await send_email_with_attachment_async(
+            smtp_server=secrets["SMTP_SERVER"],
+            smtp_port=int(secrets["SMTP_PORT"]),
+            username=secrets["SMTP_USERNAME"],
+            password=secrets["SMTP_PASSWORD"],
+            email_from=secrets["EMAIL_FROM"],
+            email_to=secrets["EMAIL_TO"],
+            subject=subject,
+            body=body,
+            attachment_path=workbook_path,
+        )
+
+    clear_shard_partitions(shard_dir, num_shards)
+    log("Shard merge complete.", context="orchestrator")
+
+    return {
+        "workbook_path": str(workbook_path),
+        "email_to": secrets["EMAIL_TO"],
+        "shards_merged": num_shards,
+        "rows_merged": merged,
         "google_sheet_link": web_link,
         "sheet_id": sheet_id,
     }
@@ -299,13 +477,67 @@ def _parse_row_indices(arg: Optional[str]) -> Optional[List[int]]:
     return out or None
 
 
+def _deadline_target(deadline: str) -> datetime:
+    """
+    --deadline value (HH:MM local time, next occurrence, or ISO datetime)
+    → aware datetime. Raises ValueError for anything else.
+    """
+    now = datetime.now().astimezone()
+    parts = deadline.strip().split(":")
+    if len(parts) == 2 and all(p.isdigit() for p in parts):
+        hh, mm = (int(p) for p in parts)
+        target = now.replace(hour=hh, minute=mm, second=0, microsecond=0)  # ValueError if out of range
+        return target if target > now else target + timedelta(days=1)
+    target = datetime.fromisoformat(deadline.strip())
+    return target if target.tzinfo is not None else target.astimezone()
+
+
+def _deadline_arg(value: str) -> str:
+    """
+    argparse type for --deadline: reject unreadable values up front.
+    """
+    try:
+        _deadline_target(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid deadline {value!r} (expected HH:MM local time or an ISO datetime)"
+        )
+    return value
+
+
+def _resolve_deadline(deadline: Optional[str], max_runtime: Optional[float]) -> Optional[float]:
+    """
+    Turn --deadline (HH:MM local time, or ISO datetime) and --max-runtime
+    (minutes) into one epoch-seconds deadline; the earlier one wins.
+    """
+    candidates = []
+
+    if max_runtime is not None:
+        candidates.append(time.time() + float(max_runtime) * 60.0)
+
+    if deadline:
+        candidates.append(_deadline_target(deadline).timestamp())
+
+    return min(candidates) if candidates else None
+
+
 def build_cli_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(
         description=(
             "Retail selector orchestrator.\n"
             "Default: prod mode. "
             "With --rows: debug mode. "
-            "With --limit: test mode."
+            "With --limit: test mode. "
+            "Scans are incremental (only rows due for a revisit) unless --full. "
+            "--deadline HH:MM / --max-runtime MINUTES end the scan early with partial results. "
+            "--resume continues a crashed run from its checkpoint journal. "
+            "The emailed workbook is also saved to --workbook-path unless --no-save-copy "
+            "(test runs never save it). "
+            "--shard i/N scans one slice and writes a partition to --shard-dir; "
+            "--merge-shards N then merges, uploads and emails once. "
+            "--storage local runs against the file-backed stand-in for the Google sheets. "
+            "--trace writes a Chrome trace-event JSON (per-row stages and run phases) next to the logs. "
+            "--profile reports per-phase CPU / wall / peak memory plus a cProfile of the run."
         )
     )
 
@@ -315,9 +547,40 @@ def build_cli_parser() -> argparse.ArgumentParser:
     p.add_argument("--workbook-path", type=str, default=str(DEFAULT_WORKBOOK_PATH))
     p.add_argument("--secrets-path", type=str, default=str(DEFAULT_SECRETS_PATH))
     p.add_argument("--no-upload", action="store_true")
+    p.add_argument("--no-save-copy", action="store_true")
+    p.add_argument("--full", action="store_true")
+    p.add_argument("--deadline", type=_deadline_arg, default=None)
+    p.add_argument("--max-runtime", type=float, default=None)
+    p.add_argument("--resume", action="store_true")
+    p.add_argument("--shard", type=str, default=None)
+    p.add_argument("--merge-shards", type=int, default=None)
+    p.add_argument("--shard-dir", type=str, default=str(SHARD_DIR))
+    p.add_argument("--parse-workers", type=int, default=PARSE_WORKERS)
+    p.add_argument("--storage", choices=["google", "local"], default=STORAGE_BACKEND)
+    p.add_argument("--trace", action="store_true")
+    p.add_argument("--profile", action="store_true")
     return p
 
 
+def _profile_metadata() -> Dict[str, Any]:
+    """
+    Write the --profile results next to the run's log partition and return
+    them as metadata lines.
+    """
+    summary = export_profile(Path(export_logs_as_jsonl()).parent, RUN_ID)
+    return {"profile": summary["files"]["json"], **format_profile(summary)}
+
+
+async def _closing_clients(coro):
+    """
+    Await a pipeline run, then close the storage backend's pooled session.
+    """
+    try:
+        return await coro
+    finally:
+        await close_storage_backend()
+
+
 def main() -> None:
     parser = build_cli_parser()
     args = parser.parse_args()
@@ -332,49 +595,105 @@ def main() -> None:
 
     log(f"run_mode={args.rows and 'debug' or args.limit and 'test' or 'prod'}", context="orchestrator")
 
+    config.STORAGE_BACKEND = args.storage
+    if args.trace:
+        enable_tracing()
+    if args.profile:
+        enable_profiling()
+
     row_indices = _parse_row_indices(args.rows)
     workbook_path = Path(args.workbook_path)
     secrets_path = Path(args.secrets_path)
 
+    deadline = _resolve_deadline(args.deadline, args.max_runtime)
+    if deadline is not None:
+        log(
+            f"Run deadline: {datetime.fromtimestamp(deadline).astimezone().isoformat()}",
+            context="orchestrator",
+        )
+
     secrets = load_secrets(secrets_path)
     scrapingbee_api_key = secrets["SCRAPINGBEE_API_KEY"]
 
     # -------- DEBUG MODE (rows only) --------
     if row_indices is not None:
         log(f"Debug mode: scanning rows {row_indices}", context="orchestrator")
-        df = asyncio.run(
+        df = asyncio.run(_closing_clients(
             run_hybrid_pricer_async(
                 scrapingbee_api_key=scrapingbee_api_key,
                 limit=None,
                 upload=not args.no_upload,
                 concurrency=args.concurrency,
                 row_indices=row_indices,
+                deadline=deadline,
+                resume=args.resume,
+                parse_workers=args.parse_workers,
+                save_state=False,
             )
-        )
+        ))
         with pd.option_context("display.max_columns", None, "display.width", 220):
             print(df)
 
+        if profiling_enabled():
+            print("\n=== Profile ===")
+            for k, v in _profile_metadata().items():
+                print(f"{k}: {v}")
+
         print("\n\n" + export_logs_as_text())
-        export_logs_as_jsonl()
         return
 
+    # -------- SHARDED: one worker slice, or the final merge --------
+    if args.merge_shards is not None:
+        meta = asyncio.run(_closing_clients(
+            run_merge_shards_and_email(
+                workbook_path=workbook_path,
+                secrets_path=secrets_path,
+                num_shards=args.merge_shards,
+                shard_dir=Path(args.shard_dir),
+                upload=not args.no_upload,
+            )
+        ))
+    elif args.shard:
+        meta = asyncio.run(_closing_clients(
+            run_shard_scan(
+                secrets_path=secrets_path,
+                shard=parse_shard_spec(args.shard),
+                shard_dir=Path(args.shard_dir),
+                limit=args.limit,
+                concurrency=args.concurrency,
+                incremental=not args.full,
+                deadline=deadline,
+                resume=args.resume,
+                parse_workers=args.parse_workers,
+            )
+        ))
+
     # -------- FULL OR TEST PIPELINE --------
-    meta = asyncio.run(
-        run_scan_from_gsheet_and_email(
-            workbook_path=workbook_path,
-            secrets_path=secrets_path,
-            limit=args.limit,
-            concurrency=args.concurrency,
-            upload=not args.no_upload,
-        )
-    )
+    else:
+        meta = asyncio.run(_closing_clients(
+            run_scan_from_gsheet_and_email(
+                workbook_path=workbook_path,
+                secrets_path=secrets_path,
+                limit=args.limit,
+                concurrency=args.concurrency,
+                upload=not args.no_upload,
+                incremental=not args.full,
+                deadline=deadline,
+                resume=args.resume,
+                parse_workers=args.parse_workers,
+                save_state=args.limit is None,
+                save_copy=args.limit is None and not args.no_save_copy,
+            )
+        ))
+
+    if profiling_enabled():
+        meta.update(_profile_metadata())
 
     print("\n=== Pipeline metadata ===")
     for k, v in meta.items():
         print(f"{k}: {v}")
 
     print("\n\n" + export_logs_as_text())
-    export_logs_as_jsonl()
 
 
 # -------------------------------------------------------------------
@@ -383,6 +702,12 @@ if __name__ == "__main__":
     try:
         main()
     finally:
-        # ALWAYS write logs even on crash
-        path = export_logs_as_jsonl()
+        # ALWAYS flush/close (and compress) the run's log file, even on crash
+        path = close_logs()
         print(f"\n[logger] Logs written to: {path}")
+        if path:
+            prom, summary = export_metrics(Path(path).parent, RUN_ID)
+            print(f"[metrics] {prom}\n[metrics] {summary}")
+            if tracing_enabled():
+                trace = export_trace(Path(path).parent / f"trace-{RUN_ID}.json")
+                print(f"[trace] {trace} (open in https://ui.perfetto.dev)")
@@ -1,19 +1,73 @@
 # retail_selector/parsing.py
 from __future__ import annotations
 
+import asyncio
 import json
+import os
 import re
+import tempfile
 import time
-from typing import Dict, Any, Optional
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
+from urllib.parse import urlparse, parse_qs
 
 from . import config
-from .logger import log
+from .logger import log, capture_logs, take_captured_logs, replay_logs
+from .metrics import inc, observe, timed, host_label
+from .tracing import span
+from .scraping import FORMAT_SHOPIFY_JSON, FORMAT_EXTRACTED
 
 
-def parse_shopify_variant_json(page_text: str) -> Optional[Dict[str, Any]]:
+def _shopify_variant_id(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    values = parse_qs(urlparse(url).query).get("variant")
+    return values[0].strip() if values else None
+
+
+def select_shopify_variant(variants: List[Dict[str, Any]], url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    The variant the product page shows: ?variant=<id> from the URL, else
+    the first available one (Shopify's selected_or_first_available_variant),
+    else the first.
+    """
+    variant_id = _shopify_variant_id(url)
+    if variant_id:
+        for v in variants:
+            if str(v.get("id")) == variant_id:
+                return v
+    for v in variants:
+        if v.get("available") is True:
+            return v
+    return variants[0]
+
+
+def _shopify_variant_price_stock(v: Dict[str, Any]) -> Tuple[Optional[float], Optional[str]]:
+    price = None
+    raw_price = v.get("price")
+    if isinstance(raw_price, (int, float)):
+        # product .js / theme JSON: integer cents
+        price = round(float(raw_price) / 100.0, 2)
+    elif isinstance(raw_price, str):
+        # product .json: decimal string
+        try:
+            price = round(float(raw_price), 2)
+        except ValueError:
+            price = None
+
+    qty = v.get("inventory_quantity")
+    available = v.get("available")
+
+    stock = None
+    if isinstance(available, bool):
+        stock = "Y" if available else "N"
+    elif isinstance(qty, (int, float)):
+        stock = "Y" if qty > 0 else "N"
+    return price, stock
+
+
+def parse_shopify_variant_json(page_text: str, url: Optional[str] = None) -> Optional[Dict[str, Any]]:
     if "inventory_quantity" not in page_text or '"price"' not in page_text:
         return None
     m = re.search(r'(\[\s*\{.*?"inventory_quantity".*?\}\s*\])', page_text, re.DOTALL)
@@ -23,23 +77,11 @@ def parse_shopify_variant_json(page_text: str) -> Optional[Dict[str, Any]]:
         arr = json.loads(m.group(1))
         if not isinstance(arr, list) or not arr:
             return None
-        v = arr[0]
+        v = select_shopify_variant(arr, url)
     except Exception:
         return None
 
-    price = None
-    cents = v.get("price")
-    if isinstance(cents, (int, float)):
-        price = round(float(cents) / 100.0, 2)
-
-    qty = v.get("inventory_quantity")
-    available = v.get("available")
-
-    stock = None
-    if isinstance(available, bool):
-        stock = "Y" if available else "N"
-    elif isinstance(qty, (int, float)):
-        stock = "Y" if qty > 0 else "N"
+    price, stock = _shopify_variant_price_stock(v)
 
     log(
         f"shopify_variant price={price} stock={stock}",
@@ -48,6 +90,96 @@ def parse_shopify_variant_json(page_text: str) -> Optional[Dict[str, Any]]:
     return {"price": price, "stock": stock, "raw": v}
 
 
+def parse_shopify_product_json(text: str, url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Shopify /products/<handle>.js (or .json) endpoint → price / stock of
+    the variant the product URL selects. json.loads only, no HTML parsing.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    product = data.get("product", data) if isinstance(data, dict) else None
+    variants = product.get("variants") if isinstance(product, dict) else None
+    if not isinstance(variants, list) or not variants:
+        return None
+
+    v = select_shopify_variant(variants, url)
+    price, stock = _shopify_variant_price_stock(v)
+    if stock is None and isinstance(product.get("available"), bool) and len(variants) == 1:
+        stock = "Y" if product["available"] else "N"
+
+    log(
+        f"shopify_json variant={v.get('id')} price={price} stock={stock}",
+        context="parsing",
+    )
+    return {"price": price, "stock": stock, "variant_id": v.get("id")}
+
+
+RE_PRICE_TEXT = re.compile(r"(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?")
+
+
+def price_from_text(text: str) -> Optional[float]:
+    """
+    First amount in a price label ("$1,299.99", "Now 24.50") → float.
+    """
+    m = RE_PRICE_TEXT.search(text or "")
+    if not m:
+        return None
+    return float(m.group(1).replace(",", "") + "." + (m.group(2) or "0"))
+
+
+def parse_extracted_fields(extracted: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Fields pre-extracted by the scraper (extract_rules: CSS selector text
+    for "price" and "stock") → price / stock.
+    """
+    price = price_from_text(str(extracted.get("price") or ""))
+
+    stock_text = str(extracted.get("stock") or "").lower()
+    stock = stock_from_text(stock_text)
+    if stock is None and stock_text:
+        # schema.org availability values / attributes
+        compact = stock_text.replace(" ", "")
+        if "outofstock" in compact or "soldout" in compact:
+            stock = "N"
+        elif "instock" in compact:
+            stock = "Y"
+    if price is None and stock is None:
+        return None
+
+    log(f"extract_rules price={price} stock={stock} raw={extracted}", context="parsing")
+    return {"price": price, "stock": stock}
+
+
+def make_soup(html: str) -> Any:
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html, "html.parser")
+
+
+class ParsedPage:
+    """
+    A page as the HTML strategies see it. The BeautifulSoup document is
+    built on first use and shared, so each page is parsed at most once
+    however many strategies look at it.
+    """
+
+    __slots__ = ("url", "html", "_soup")
+
+    def __init__(self, url: str, html: str):
+        self.url = url
+        self.html = html
+        self._soup = None
+
+    @property
+    def soup(self) -> Any:
+        if self._soup is None:
+            with span("soup_build", cat="parse"):
+                self._soup = make_soup(self.html)
+        return self._soup
+
+
 def detect_retailer_family(url: str, html: str) -> str:
     host = urlparse(url).netloc.lower()
     if "amazon." in host:
@@ -61,8 +193,9 @@ def detect_retailer_family(url: str, html: str) -> str:
     return family
 
 
-def parse_jsonld_price_stock(html: str) -> Optional[Dict[str, Any]]:
-    soup = BeautifulSoup(html, "html.parser")
+def parse_jsonld_price_stock(html: str, soup: Any = None) -> Optional[Dict[str, Any]]:
+    if soup is None:
+        soup = make_soup(html)
 
     def _extract_prices_from_offers(offers):
         prices = []
@@ -142,16 +275,28 @@ def parse_jsonld_price_stock(html: str) -> Optional[Dict[str, Any]]:
     return None
 
 
-def parse_generic_price_stock(html: str) -> Optional[Dict[str, Any]]:
-    soup = BeautifulSoup(html, "html.parser")
+OUT_OF_STOCK_PHRASES = ("out of stock", "sold out", "unavailable", "backorder", "preorder", "coming soon")
+IN_STOCK_PHRASES = ("in stock", "available now", "ready to ship", "add to cart", "add to basket")
+
+
+def stock_from_text(lower: str) -> Optional[str]:
+    """
+    "Y" / "N" from availability wording in lowercased page text, else None.
+    """
+    if any(s in lower for s in OUT_OF_STOCK_PHRASES):
+        return "N"
+    if any(s in lower for s in IN_STOCK_PHRASES):
+        return "Y"
+    return None
+
+
+def parse_generic_price_stock(html: str, soup: Any = None) -> Optional[Dict[str, Any]]:
+    if soup is None:
+        soup = make_soup(html)
     full_text = soup.get_text(" ", strip=True)
     lower = full_text.lower()
 
-    stock = None
-    if any(s in lower for s in ["out of stock", "sold out", "unavailable", "backorder", "preorder", "coming soon"]):
-        stock = "N"
-    elif any(s in lower for s in ["in stock", "available now", "ready to ship", "add to cart", "add to basket"]):
-        stock = "Y"
+    stock = stock_from_text(lower)
 
     discount_kw = ["you save", "save ", "saving", "% off"]
     original_kw = ["rrp", "r.r.p", "was ", "compare at", "compare-at", "list price", "retail price", "original price"]
@@ -223,53 +368,288 @@ def parse_generic_price_stock(html: str) -> Optional[Dict[str, Any]]:
     }
 
 
-def parse_html_price_stock(url: str, html: str) -> Optional[Dict[str, Any]]:
-    family = detect_retailer_family(url, html)
+# -------------------------------------------------------------------
+# Amazon product pages
+# -------------------------------------------------------------------
+
+# Buybox price elements, most specific first: (element id, CSS inside it or
+# None for the element's own text). Strike-through list / "was" prices
+# (.a-text-price) and other sellers' offers are never read.
+AMAZON_BUYBOX_PRICE = ".a-price:not(.a-text-price) .a-offscreen"
+AMAZON_PRICE_SELECTORS = (
+    ("corePriceDisplay_desktop_feature_div", AMAZON_BUYBOX_PRICE),
+    ("corePrice_feature_div", AMAZON_BUYBOX_PRICE),
+    ("corePrice_desktop", AMAZON_BUYBOX_PRICE),
+    ("apex_desktop", AMAZON_BUYBOX_PRICE),
+    ("tp_price_block_total_price_ww", ".a-offscreen"),
+    ("priceblock_dealprice", None),
+    ("priceblock_saleprice", None),
+    ("priceblock_ourprice", None),
+    ("price_inside_buybox", None),
+    ("newBuyBoxPrice", None),
+)
+
+# Blocks whose whole / fraction spans hold the price when .a-offscreen is missing
+AMAZON_PRICE_BLOCKS = ("corePriceDisplay_desktop_feature_div", "corePrice_feature_div", "apex_desktop")
+
+AMAZON_IN_STOCK_PHRASES = ("usually ships within", "ships from and sold by")
+
+
+def _amazon_twister_price(soup: Any) -> Optional[float]:
+    """
+    New-condition price from the twister buying-options JSON
+    ({"desktop_buybox_group_1": [{"priceAmount": ..., "buyingOptionType": "NEW"}]}).
+    """
+    node = soup.find(class_="twister-plus-buying-options-price-data")
+    if node is None:
+        return None
+    try:
+        data = json.loads(node.get_text())
+    except ValueError:
+        return None
+    groups = data.values() if isinstance(data, dict) else [data]
+    options = [o for g in groups if isinstance(g, list) for o in g if isinstance(o, dict)]
+    options.sort(key=lambda o: o.get("buyingOptionType") != "NEW")
+    for o in options:
+        if isinstance(o.get("priceAmount"), (int, float)):
+            return round(float(o["priceAmount"]), 2)
+        price = price_from_text(str(o.get("displayPrice") or ""))
+        if price is not None:
+            return price
+    return None
 
-    if family == "shopify":
-        shopify_res = parse_shopify_variant_json(html)
-        if shopify_res and (shopify_res["price"] is not None or shopify_res["stock"] is not None):
-            log(
-                f"parse_html using shopify_variants price={shopify_res['price']} "
-                f"stock={shopify_res['stock']}",
-                context="parsing",
-            )
-            return {
-                "price": shopify_res["price"],
-                "stock": shopify_res["stock"],
-                "source": "shopify_variants",
-            }
-
-    jsonld_res = parse_jsonld_price_stock(html)
-    if jsonld_res:
-        log(
-            f"parse_html using jsonld_product price={jsonld_res['price']} "
-            f"stock={jsonld_res['stock']}",
-            context="parsing",
-        )
-        return {
-            "price": jsonld_res["price"],
-            "stock": jsonld_res["stock"],
-            "source": "jsonld_product",
-        }
 
-    generic_res = parse_generic_price_stock(html)
-    if generic_res:
+def parse_amazon_price_stock(html: str, soup: Any = None) -> Optional[Dict[str, Any]]:
+    """
+    Amazon product page: buybox price (core price block, legacy priceblock
+    ids, twister buying-options JSON) and the #availability message.
+    """
+    if soup is None:
+        soup = make_soup(html)
+    # One pass over the document; every lookup below starts from an id
+    by_id = {}
+    for tag in soup.find_all(id=True):
+        by_id.setdefault(tag["id"], tag)
+
+    price, price_from = None, None
+    for element_id, css in AMAZON_PRICE_SELECTORS:
+        node = by_id.get(element_id)
+        if node is not None and css is not None:
+            node = node.select_one(css)
+        if node is not None:
+            price = price_from_text(node.get_text(" ", strip=True))
+            if price is not None:
+                price_from = element_id
+                break
+    if price is None:
+        for block_id in AMAZON_PRICE_BLOCKS:
+            block = by_id.get(block_id)
+            whole = block.select_one(".a-price:not(.a-text-price) .a-price-whole") if block is not None else None
+            if whole is not None:
+                fraction = block.select_one(".a-price:not(.a-text-price) .a-price-fraction")
+                digits = whole.get_text("", strip=True).rstrip(".") + "." + (
+                    fraction.get_text("", strip=True) if fraction is not None else "00"
+                )
+                price = price_from_text(digits)
+                if price is not None:
+                    price_from = f"{block_id} whole+fraction"
+                    break
+    if price is None:
+        price = _amazon_twister_price(soup)
+        if price is not None:
+            price_from = "twister"
+
+    stock = None
+    availability = by_id.get("availability")
+    if availability is not None:
+        lower = availability.get_text(" ", strip=True).lower()
+        stock = stock_from_text(lower)
+        if stock is None and any(s in lower for s in AMAZON_IN_STOCK_PHRASES):
+            stock = "Y"
+    if stock is None:
+        if "outOfStock" in by_id:
+            stock = "N"
+        elif "add-to-cart-button" in by_id:
+            stock = "Y"
+
+    if price is None and stock is None:
+        log("amazon parser found no buybox price and no availability", context="parsing")
+        return None
+
+    log(f"amazon parser price={price} ({price_from}) stock={stock}", context="parsing")
+    return {"price": price, "stock": stock, "raw": {"price_from": price_from}}
+
+
+# parser name (retailer profile) → (span / source name, strategy on a ParsedPage)
+HTML_STRATEGIES = {
+    "amazon": ("amazon_buybox", lambda page: parse_amazon_price_stock(page.html, page.soup)),
+    # Shopify: the URL's ?variant= picks the variant
+    "shopify": ("shopify_variants", lambda page: parse_shopify_variant_json(page.html, page.url)),
+    "jsonld": ("jsonld_product", lambda page: parse_jsonld_price_stock(page.html, page.soup)),
+    "generic": ("generic_text", lambda page: parse_generic_price_stock(page.html, page.soup)),
+}
+
+
+def parse_html_price_stock(url: str, html: str, parser: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Run the HTML strategies (Amazon buybox on Amazon pages, Shopify variants
+    on Shopify pages, JSON-LD, generic text) until one finds something, all
+    on one shared parsed document. parser (from the retailer's fetch
+    profile) is tried first; parser="ai" skips the heuristics.
+
+    An in-stock Amazon page without a recognised buybox price returns None
+    (→ AI): the JSON-LD / generic heuristics would pick a list, accessory or
+    other seller's price there.
+    """
+    if parser == "ai":
+        log("parse_html skipped (retailer profile parser=ai); falling back to AI", context="parsing")
+        return None
+
+    order = ["jsonld", "generic"]
+    family = detect_retailer_family(url, html)
+    if family in ("amazon", "shopify"):
+        order.insert(0, family)
+    if parser in HTML_STRATEGIES:
+        order = [parser] + [name for name in order if name != parser]
+
+    page = ParsedPage(url, html)
+    for name in order:
+        source, strategy = HTML_STRATEGIES[name]
+        with span(source, cat="parse"):
+            res = strategy(page)
+        if not res:
+            continue
+        # Amazon / Shopify without price or stock is not an answer
+        if name in ("amazon", "shopify") and res["price"] is None and res["stock"] is None:
+            continue
+        if name == "amazon" and res["price"] is None and res["stock"] != "N":
+            log("amazon parser found no buybox price; falling back to AI", context="parsing")
+            return None
         log(
-            f"parse_html using generic_text price={generic_res['price']} "
-            f"stock={generic_res['stock']}",
+            f"parse_html using {source} price={res['price']} stock={res['stock']}",
             context="parsing",
         )
-        return {
-            "price": generic_res["price"],
-            "stock": generic_res["stock"],
-            "source": "generic_text",
-        }
+        return {"price": res["price"], "stock": res["stock"], "source": source}
 
     log("parse_html could not extract price/stock; falling back to AI", context="parsing")
     return None
 
 
+# -------------------------------------------------------------------
+# Optional process-pool parse stage
+# -------------------------------------------------------------------
+
+# Marker for "HTML not parsed yet" (None is a valid parse result: nothing found)
+NOT_PARSED: Any = object()
+
+# Pages larger than this are handed to parse workers via a spill file
+# instead of being pickled through the pool's pipe.
+PARSE_SPILL_BYTES = 512 * 1024
+
+
+def make_parse_executor(workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    ProcessPoolExecutor for CPU-bound HTML parsing, or None for in-thread parsing.
+    """
+    if not workers or workers <= 0:
+        return None
+    log(f"parse executor: {workers} worker processes", context="parsing")
+    return ProcessPoolExecutor(max_workers=workers, initializer=capture_logs)
+
+
+def parse_page_for_pool(
+    url: str,
+    html: Optional[str] = None,
+    spill_path: Optional[str] = None,
+    parser: Optional[str] = None,
+) -> Tuple[Optional[Dict[str, Any]], float, List[tuple]]:
+    """
+    Worker-process entry point: run the HTML heuristics on one page and
+    return only the compact result (no soup / raw payloads cross back),
+    plus the parse time in ms (metrics live in the parent process) and the
+    strategies' log events for the parent to replay.
+    """
+    if spill_path is not None:
+        with open(spill_path, "r", encoding="utf-8") as f:
+            html = f.read()
+    t0 = time.perf_counter()
+    parsed = parse_html_price_stock(url, html or "", parser)
+    parse_ms = (time.perf_counter() - t0) * 1000.0
+    if not parsed:
+        return None, parse_ms, take_captured_logs()
+    compact = {"price": parsed["price"], "stock": parsed["stock"], "source": parsed["source"]}
+    return compact, parse_ms, take_captured_logs()
+
+
+async def parse_html_in_executor(
+    executor: Executor,
+    url: str,
+    html: str,
+    parser: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Run parse_page_for_pool in the executor, spilling big pages to a temp file.
+    """
+    loop = asyncio.get_running_loop()
+    if len(html) < PARSE_SPILL_BYTES:
+        with span("parse_html_pool", cat="parse"):
+            parsed, parse_ms, logs = await loop.run_in_executor(executor, parse_page_for_pool, url, html, None, parser)
+        replay_logs(logs)
+        observe("parse_latency_ms", parse_ms, host=host_label(url))
+        return parsed
+
+    fd, spill_path = tempfile.mkstemp(prefix="retail_selector_page_", suffix=".html")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(html)
+        with span("parse_html_pool", cat="parse", spilled=True):
+            parsed, parse_ms, logs = await loop.run_in_executor(executor, parse_page_for_pool, url, None, spill_path, parser)
+        replay_logs(logs)
+        observe("parse_latency_ms", parse_ms, host=host_label(url))
+        return parsed
+    finally:
+        try:
+            os.unlink(spill_path)
+        except OSError:
+            pass
+
+
+async def hybrid_lookup_async(
+    product_id: str,
+    description: str,
+    retailer_key: str,
+    original_url: str,
+    bee: Dict[str, Any],
+    allow_ai: bool = True,
+    parse_executor: Optional[Executor] = None,
+    parser: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Async hybrid_lookup_from_bee_result: the HTML heuristics run in
+    parse_executor (if given), only the AI fallback decision and call
+    stay in this process (on a worker thread).
+
+    parser: the retailer profile's preferred HTML strategy (or "ai").
+    """
+    pre_parsed = NOT_PARSED
+    html = bee.get("page_text") or ""
+    if parse_executor is not None and html and not bee.get("error") and not bee.get("format"):
+        final_url = bee.get("final_url", original_url)
+        pre_parsed = await parse_html_in_executor(parse_executor, final_url, html, parser)
+
+    return await asyncio.to_thread(
+        hybrid_lookup_from_bee_result,
+        product_id=product_id,
+        description=description,
+        retailer_key=retailer_key,
+        original_url=original_url,
+        bee=bee,
+        allow_ai=allow_ai,
+        pre_parsed=pre_parsed,
+        parser=parser,
+    )
+
+
 def _clean_json_text(raw_text: str) -> str:
     clean = raw_text.strip()
     if clean.startswith("```"):
@@ -290,9 +670,19 @@ def hybrid_lookup_from_bee_result(
     original_url: str,
     bee: Dict[str, Any],
     debug: bool = False,
+    allow_ai: bool = True,
+    pre_parsed: Any = NOT_PARSED,
+    parser: Optional[str] = None,
 ) -> Dict[str, Any]:
-
-    if config.client is None:
+    """
+    Parse a ScrapingBee result: HTML heuristics first, OpenAI fallback second.
+    allow_ai=False (e.g. past the run deadline) skips the AI fallback.
+    pre_parsed: result of parse_html_price_stock computed elsewhere
+    (e.g. in a parse worker process); skips the in-process HTML parse.
+    parser: preferred HTML strategy, see parse_html_price_stock.
+    """
+
+    if config.OPENAI_API_KEY is None:
         raise RuntimeError("OpenAI client not initialized. Call load_secrets() first.")
 
     start = time.time()
@@ -302,7 +692,10 @@ def hybrid_lookup_from_bee_result(
     bee_error = bee.get("error")
     http_status = bee.get("status_code") or bee.get("status")
 
+    host = host_label(original_url)
+
     if bee_error:
+        inc("parse_results", method="fetch_error")
         elapsed_ms = int((time.time() - start) * 1000)
         log(
             f"bee_error url={final_url} status={http_status} error={bee_error}",
@@ -320,8 +713,25 @@ def hybrid_lookup_from_bee_result(
         }
 
     # pattern / HTML heuristic path
-    parsed = parse_html_price_stock(final_url, html)
+    if bee.get("format") == FORMAT_SHOPIFY_JSON:
+        # Product JSON endpoint: the variant comes from the row's URL
+        with timed("parse_latency_ms", host=host), span("shopify_json", cat="parse"):
+            parsed = parse_shopify_product_json(html, original_url)
+        if parsed:
+            parsed["source"] = "shopify_json"
+    elif bee.get("format") == FORMAT_EXTRACTED:
+        # Fields extracted by the scraper's CSS selectors: nothing to parse
+        with timed("parse_latency_ms", host=host), span("extract_rules", cat="parse"):
+            parsed = parse_extracted_fields(bee.get("extracted") or {})
+        if parsed:
+            parsed["source"] = "extract_rules"
+    elif pre_parsed is NOT_PARSED:
+        with timed("parse_latency_ms", host=host), span("parse_html", cat="parse"):
+            parsed = parse_html_price_stock(final_url, html, parser)
+    else:
+        parsed = pre_parsed
     if parsed and (parsed["price"] is not None or parsed["stock"] is not None):
+        inc("parse_results", method=parsed["source"])
         elapsed_ms = int((time.time() - start) * 1000)
         log(
             f"pattern_parse success url={final_url} price={parsed['price']} "
@@ -339,6 +749,21 @@ def hybrid_lookup_from_bee_result(
             "method": "ai_html",
         }
 
+    if not allow_ai:
+        inc("parse_results", method="ai_skipped")
+        elapsed_ms = int((time.time() - start) * 1000)
+        log(f"AI fallback skipped (deadline) url={final_url}", context="parsing")
+        return {
+            "price": None,
+            "stock": None,
+            "url_used": final_url,
+            "notes": "",
+            "error": "AI fallback skipped: run deadline reached",
+            "response_ms": elapsed_ms,
+            "status": "skipped_deadline",
+            "method": "ai_html",
+        }
+
     snippet = html[:15000]
     log(
         f"invoking AI fallback url={final_url} len_snippet={len(snippet)}",
@@ -377,14 +802,16 @@ Return JSON:
 }}
 """
 
+    inc("ai_calls", host=host)
     try:
-        resp = config.client.responses.create(
-            model=config.OPENAI_MODEL,
-            input=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-        )
+        with timed("ai_latency_ms", host=host), span("ai_call", cat="ai", model=config.OPENAI_MODEL):
+            resp = config.get_openai_client().responses.create(
+                model=config.OPENAI_MODEL,
+                input=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+            )
 
         elapsed_ms = int((time.time() - start) * 1000)
         raw_text = (resp.output_text or "").strip()
@@ -411,6 +838,7 @@ Return JSON:
         if in_stock == "unknown" and price is not None:
             in_stock = "Y"
 
+        inc("parse_results", method="ai")
         log(
             f"AI parse url={final_url} price={price} in_stock={in_stock} notes={notes[:120]}",
             context="parsing",
@@ -428,6 +856,8 @@ Return JSON:
         }
 
     except Exception as e:
+        inc("ai_errors", host=host)
+        inc("parse_results", method="ai_error")
         elapsed_ms = int((time.time() - start) * 1000)
         log(
             f"AI HTML parse error url={final_url} exc={e!r}",
@@ -0,0 +1,482 @@
+# retail_selector/pipeline.py
+from __future__ import annotations
+
+import asyncio
+import math
+from abc import ABC, abstractmethod
+import time
+from concurrent.futures import Executor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .config import PRODUCT_MAP_TAB, ACTIVE_WATCH_TAB, RETAILERS_TAB, DEADLINE_GRACE_SECONDS
+from .logger import log
+from .metrics import inc
+from .tracing import set_track, record_span
+from .profiling import phase
+from .journal import RunJournal, apply_journaled
+from .priority import compute_row_priorities, top_by_priority, watch_list_rows
+from .sharding import select_shard_rows
+from .retailers import FetchProfile, load_retailer_profiles
+from .scraping import scrapingbee_fetch_many
+from .parsing import hybrid_lookup_async
+from .state import (
+    row_key,
+    load_scan_state,
+    save_scan_state,
+    select_due_rows,
+    carry_forward,
+    record_scanned_rows,
+)
+
+# One scan engine for every entry point:
+#
+#   source → select rows → fetch → [queue] → parse (+ AI fallback) → validate → write row
+#                                                                   → sinks (after the scan)
+#
+# The fetch → parse hand-off is a bounded queue: when parsing falls behind,
+# fetch workers wait instead of piling up pages in memory. Each parsed row is
+# validated, written into the DataFrame and journaled as soon as it is done;
+# the sinks (output map upload, workbook) run once the whole scan finished.
+# orchestrator.run_hybrid_pricer_async and workbook.scan_workbook_tables_async
+# are thin configurations of run_pipeline.
+
+# Result columns written for every scanned row (float columns are coerced)
+KPI_COLUMNS = {
+    "In Stock (Y/N)": "object",
+    "Price ($USD)": "float64",
+    "Last Scan (UTC)": "object",
+    "HTTP Status": "object",
+    "Parse Method": "object",
+    "Response ms": "float64",
+    "Last Error": "object",
+    "URL Status": "object",
+    "Validation Issues": "object",
+}
+
+# Fetched pages waiting for a parse worker, per unit of concurrency
+PARSE_QUEUE_PER_WORKER = 2
+
+
+# -------------------------------------------------------------------
+# Sources and sinks
+# -------------------------------------------------------------------
+
+class Source(ABC):
+    """
+    Where the Product↔Retailer Map (plus Active Watch List and Retailers
+    tab) comes from.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def load(self) -> Tuple[pd.DataFrame, Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+        """
+        → (product map, watch list or None, retailers tab or None)
+        """
+
+
+class Sink(ABC):
+    """
+    Where the scanned map goes once the scan is complete.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def write(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Store the scanned map → this sink's report entry.
+        """
+
+
+class StorageMapSource(Source):
+    """
+    Map, watch list and retailers tabs from the storage backend (Google
+    sheets or the local stand-in). watch_list=False skips the Active Watch
+    List (explicit --rows runs don't need priorities).
+    """
+
+    name = "storage_map"
+
+    def __init__(self, watch_list: bool = True):
+        self.watch_list = watch_list
+
+    async def load(self) -> Tuple[pd.DataFrame, Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+        from .storage import get_storage_backend
+
+        tabs = (PRODUCT_MAP_TAB, ACTIVE_WATCH_TAB, RETAILERS_TAB)
+        if not self.watch_list:
+            tabs = (PRODUCT_MAP_TAB, RETAILERS_TAB)
+        log(f"Downloading {' + '.join(tabs)}...", context="pipeline")
+        with phase("download_inputs"):
+            frames = await get_storage_backend().download_master_tabs(tabs)
+        return frames[PRODUCT_MAP_TAB], frames.get(ACTIVE_WATCH_TAB), frames.get(RETAILERS_TAB)
+
+
+class StorageMapSink(Sink):
+    """
+    Upload the map to the output sheet through the storage backend (diff
+    against current_values when given).
+    """
+
+    name = "storage_map"
+
+    def __init__(self, current_values: Optional[List[List[Any]]] = None):
+        self.current_values = current_values
+
+    async def write(self, df: pd.DataFrame) -> Dict[str, Any]:
+        from .storage import get_storage_backend
+
+        log("Uploading Product↔Retailer Map to the output sheet...", context="pipeline")
+        with phase("upload", rows=len(df)):
+            sheet_id, web_link = await get_storage_backend().upload_product_map(
+                df, current_values=self.current_values
+            )
+        return {"sheet_id": sheet_id, "google_sheet_link": web_link}
+
+
+# -------------------------------------------------------------------
+# Validate + write-back
+# -------------------------------------------------------------------
+
+def _stock_flag(stock: Any) -> str:
+    if stock in (True, "Y", "y", "yes"):
+        return "Y"
+    if stock in (False, "N", "n", "no"):
+        return "N"
+    return str(stock or "")
+
+
+def validate_result(parsed: Dict[str, Any], bee: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parsed lookup + fetch result → the row's KPI values, with sanity
+    checks appended to Validation Issues.
+    """
+    price = parsed.get("price")
+    try:
+        price = float(price) if price is not None else float("nan")
+    except (TypeError, ValueError):
+        price = float("nan")
+    stock = _stock_flag(parsed.get("stock"))
+
+    issues = [i for i in str(parsed.get("validation_issues") or "").split(";") if i]
+    if not math.isnan(price) and price <= 0:
+        issues.append("non_positive_price")
+    if stock == "Y" and math.isnan(price):
+        issues.append("in_stock_without_price")
+
+    http_status = parsed.get("http_status") or bee.get("status_code") or bee.get("status")
+    return {
+        "In Stock (Y/N)": stock,
+        "Price ($USD)": price,
+        "HTTP Status": str(http_status or ""),
+        "Parse Method": parsed.get("method") or "",
+        # Fetch round trip only; parse / AI time is in parse_latency_ms / ai_latency_ms
+        "Response ms": float(bee.get("response_ms") or 0.0),
+        "Last Error": parsed.get("error") or "",
+        "URL Status": parsed.get("status") or "",
+        "Validation Issues": ";".join(issues),
+    }
+
+
+def error_result(exc: BaseException, bee: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    KPI values for a row whose parse raised.
+    """
+    return {
+        "In Stock (Y/N)": "",
+        "Price ($USD)": float("nan"),
+        "HTTP Status": str(bee.get("status_code") or bee.get("status") or ""),
+        "Parse Method": "error",
+        "Response ms": float(bee.get("response_ms") or 0.0),
+        "Last Error": f"parse_error: {exc!r}",
+        "URL Status": "error",
+        "Validation Issues": "exception_in_parser",
+    }
+
+
+# -------------------------------------------------------------------
+# Engine
+# -------------------------------------------------------------------
+
+def _row_text(row: pd.Series, *cols: str) -> str:
+    for c in cols:
+        v = row.get(c)
+        if v:
+            return str(v).strip()
+    return ""
+
+
+async def run_pipeline(
+    source: Source,
+    scrapingbee_api_key: str,
+    sinks: Sequence[Sink] = (),
+    limit: Optional[int] = None,
+    row_indices: Optional[Iterable[int]] = None,
+    watch_only: bool = False,
+    incremental: bool = False,
+    shard: Optional[Tuple[int, int]] = None,
+    concurrency: int = 20,
+    fetch_deadline: Optional[float] = None,
+    journal: Optional[RunJournal] = None,
+    resumed_rows: Optional[Dict[str, Dict[str, Any]]] = None,
+    parse_executor: Optional[Executor] = None,
+    drop_blank_urls: bool = False,
+    progress: bool = False,
+    save_state: bool = True,
+    state_path: Optional[Path] = None,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Scan the source's Product↔Retailer Map and hand the result to the sinks.
+
+    Row selection (in order): row_indices (positions) or limit (highest
+    priority rows) cut the map; shard=(i, N) keeps this worker's slice;
+    watch_only scans just the Active Watch List rows and incremental just
+    the rows due for a revisit – the others are carried forward from the
+    scan state. Rows in resumed_rows (a crashed run's journal) are restored
+    instead of scanned.
+
+    fetch_deadline (epoch seconds): no new fetches start after it; rows not
+    fetched keep their last result with URL Status=skipped_deadline.
+
+    Rows without a search_url are kept with URL Status=missing_url, or
+    removed from the map with drop_blank_urls=True.
+
+    progress=True prints (and logs) a [progress] line per row.
+
+    save_state=False (debug / test runs) reads the scan state for
+    priorities and carry-forward but never writes it back, so partial runs
+    don't reschedule production rows. state_path redirects the scanned
+    rows' entries to another file (a shard's own state file).
+
+    Returns (updated map, report) with per-sink results under "sinks".
+    """
+    df, watch_df, retailers_df = await source.load()
+    df.columns = [str(c).strip() for c in df.columns]
+    report: Dict[str, Any] = {"rows_in_map": len(df), "scanned": 0, "skipped_deadline": 0, "sinks": {}}
+
+    if df.empty:
+        log("Product↔Retailer Map is empty. Nothing to scan.", context="pipeline")
+        return df, report
+    if "search_url" not in df.columns:
+        raise KeyError("Expected column 'search_url'")
+    df["search_url"] = df["search_url"].fillna("").astype(str).str.strip()
+    if drop_blank_urls:
+        df = df[df["search_url"] != ""].copy()
+        log(f"Filtered to {len(df)} rows with valid search_url", context="pipeline")
+
+    # Priorities: Active Watch List + volatility + margin
+    scan_state = load_scan_state()
+    priorities = compute_row_priorities(df, watch_df, scan_state)
+
+    if row_indices is not None:
+        idx_list = sorted(set(int(i) for i in row_indices))
+        df = df.iloc[idx_list].copy()
+        log(f"Debug mode: filtered rows {idx_list}", context="pipeline")
+    elif limit is not None:
+        df = df.loc[top_by_priority(df.index.tolist(), priorities, limit)].copy()
+        log(f"Test mode: limit={limit} (highest priority rows)", context="pipeline")
+
+    if df.empty:
+        log("After filtering, no rows remain to scan.", context="pipeline")
+        report["rows_in_map"] = 0
+        return df, report
+    report["rows_in_map"] = len(df)
+
+    for col, dtype in KPI_COLUMNS.items():
+        if col not in df.columns:
+            df[col] = pd.Series([None] * len(df), index=df.index, dtype="object")
+        if dtype.startswith("float"):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    # ---------------- Row selection ----------------
+    candidates = df.index.tolist()
+    if shard is not None:
+        candidates = select_shard_rows(df, *shard)
+        log(f"Shard {shard[0]}/{shard[1]}: {len(candidates)} of {len(df)} rows", context="pipeline")
+
+    if watch_only:
+        due = watch_list_rows(df.loc[candidates], watch_df)
+        due_set = set(due)
+        carried = carry_forward(df, [i for i in candidates if i not in due_set], scan_state)
+        inc("rows", carried, outcome="carried_forward")
+        log(
+            f"Watch sweep: {len(due)} Active Watch List rows ({carried} others carried forward)",
+            context="pipeline",
+        )
+    elif incremental:
+        due, not_due = select_due_rows(df.loc[candidates], scan_state)
+        carried = carry_forward(df, not_due, scan_state)
+        inc("rows", carried, outcome="carried_forward")
+        log(
+            f"Incremental mode: {len(due)} rows due, {len(not_due)} not due "
+            f"({carried} carried forward)",
+            context="pipeline",
+        )
+    else:
+        due = list(candidates)
+
+    resumed: List[Any] = []
+    if resumed_rows:
+        for idx in due:
+            values = resumed_rows.get(row_key(df.loc[idx]))
+            if values:
+                apply_journaled(df, idx, values)
+                resumed.append(idx)
+        resumed_set = set(resumed)
+        due = [i for i in due if i not in resumed_set]
+        log(f"Resume: {len(resumed)} rows restored from journal", context="pipeline")
+
+    # Per-retailer fetch / parse settings (Retailers tab + local overrides)
+    retailer_profiles = load_retailer_profiles(retailers_df)
+
+    urls: List[str] = []
+    row_lookup: List[Any] = []
+    row_profiles: List[FetchProfile] = []
+    for idx in due:
+        url = df.at[idx, "search_url"]
+        if not url:
+            df.at[idx, "URL Status"] = "missing_url"
+            df.at[idx, "Last Error"] = "No search_url provided"
+            continue
+        urls.append(url)
+        row_lookup.append(idx)
+        row_profiles.append(retailer_profiles.resolve(_row_text(df.loc[idx], "retailer_key", "Retailer"), url))
+
+    log(f"Fetching {len(urls)} URLs (concurrency={concurrency})", context="pipeline")
+
+    # ---------------- Fetch → parse → validate → write ----------------
+    now_iso = datetime.now(timezone.utc).isoformat()
+    scanned: List[Any] = list(resumed)
+    total = len(row_lookup)
+    done = 0
+    workers = max(1, concurrency)
+    parse_queue: asyncio.Queue = asyncio.Queue(maxsize=workers * PARSE_QUEUE_PER_WORKER)
+    pending_puts: set = set()
+
+    def write_row(idx: Any, values: Dict[str, Any]) -> None:
+        for col, value in values.items():
+            df.at[idx, col] = value
+        df.at[idx, "Last Scan (UTC)"] = now_iso
+        if journal is not None:
+            row = df.loc[idx]
+            journal.record(row_key(row), {c: row.get(c) for c in KPI_COLUMNS})
+
+    def report_progress(idx: Any, product_id: str, retailer_key: str, url: str) -> None:
+        nonlocal done
+        done += 1
+        if progress:
+            msg = f"[progress] {done}/{total} row={idx} pid={product_id} retailer={retailer_key} url={url}"
+            print(msg, flush=True)
+            log(msg, context="pipeline")
+
+    async def parse_one(url: str, idx: Any, bee: Dict[str, Any], parser: Optional[str]) -> None:
+        row = df.loc[idx]
+        product_id = _row_text(row, "product_id", "Product ID")
+        retailer_key = _row_text(row, "retailer_key", "Retailer")
+        try:
+            parsed = await hybrid_lookup_async(
+                product_id=product_id,
+                description=_row_text(row, "DESCRIPTION", "product_name"),
+                retailer_key=retailer_key,
+                original_url=url,
+                bee=bee,
+                allow_ai=fetch_deadline is None or time.time() < fetch_deadline + DEADLINE_GRACE_SECONDS,
+                parse_executor=parse_executor,
+                parser=parser,
+            )
+        except Exception as e:
+            write_row(idx, error_result(e, bee))
+            report_progress(idx, product_id, retailer_key, url)
+            log(f"row={idx} pid={product_id} retailer={retailer_key} EXCEPTION={e!r}", context="pipeline")
+            return
+
+        t_write = time.perf_counter()
+        values = validate_result(parsed, bee)
+        write_row(idx, values)
+        record_span(
+            "write_back", t_write, time.perf_counter(),
+            method=values["Parse Method"], status=values["URL Status"],
+        )
+
+        report_progress(idx, product_id, retailer_key, url)
+        log(
+            f"row_result row={idx} pid={product_id} retailer={retailer_key} "
+            f"url={url} price={values['Price ($USD)']} stock={values['In Stock (Y/N)']} "
+            f"method={values['Parse Method']} status={values['URL Status']} err={values['Last Error']}",
+            context="pipeline",
+        )
+
+    async def parse_worker() -> None:
+        while True:
+            item = await parse_queue.get()
+            if item is None:
+                return
+            url, idx, bee, parser, queued_at = item
+            # Spans below (parse strategies, AI call) land on this row's track
+            set_track(url)
+            record_span("parse_queue_wait", queued_at, time.perf_counter())
+            await parse_one(url, idx, bee, parser)
+
+    def on_fetched(i: int, bee: Dict[str, Any]):
+        idx = row_lookup[i]
+        if bee.get("skipped"):
+            carry_forward(df, [idx], scan_state)
+            df.at[idx, "URL Status"] = bee["skipped"]
+            log(f"row={idx} url={urls[i]} {bee['skipped']}", context="pipeline")
+            return None
+        scanned.append(idx)
+        # Bounded hand-off: the fetch worker waits here while parsing is behind
+        put = asyncio.ensure_future(parse_queue.put((urls[i], idx, bee, row_profiles[i].parser, time.perf_counter())))
+        pending_puts.add(put)
+        put.add_done_callback(pending_puts.discard)
+        return put
+
+    parsers = [asyncio.create_task(parse_worker()) for _ in range(workers)]
+    try:
+        with phase("scan", rows=len(urls)):
+            await scrapingbee_fetch_many(
+                urls=urls,
+                api_key=scrapingbee_api_key,
+                concurrency=concurrency,
+                priorities=[priorities.get(i, 0.0) for i in row_lookup],
+                deadline=fetch_deadline,
+                grace_s=DEADLINE_GRACE_SECONDS,
+                on_result=on_fetched,
+                profiles=row_profiles,
+            )
+            # Hand-offs still waiting for queue space (their fetch worker was
+            # cancelled at the deadline) must land before the parsers stop
+            if pending_puts:
+                await asyncio.gather(*list(pending_puts))
+            for _ in parsers:
+                await parse_queue.put(None)
+            await asyncio.gather(*parsers)
+    finally:
+        for t in parsers:
+            t.cancel()
+    if journal is not None:
+        journal.sync()
+
+    skipped = len(row_lookup) + len(resumed) - len(scanned)
+    if skipped:
+        log(f"Deadline: {skipped} rows marked skipped_deadline", context="pipeline")
+    inc("rows", len(scanned) - len(resumed), outcome="scanned")
+    inc("rows", len(resumed), outcome="resumed")
+    if save_state:
+        save_scan_state(scan_state, path=state_path, keys=record_scanned_rows(scan_state, df, scanned))
+    else:
+        log("Scan state not saved (debug/test run)", context="pipeline")
+    report.update(scanned=len(scanned), skipped_deadline=skipped)
+
+    # ---------------- Sinks ----------------
+    for sink in sinks:
+        report["sinks"][sink.name] = await sink.write(df)
+
+    log(f"Pipeline scan complete: {len(scanned)} rows scanned, {skipped} skipped", context="pipeline")
+    return df, report
@@ -0,0 +1,129 @@
+# retail_selector/priority.py
+from __future__ import annotations
+
+import math
+from typing import Dict, Any, List, Optional
+
+import pandas as pd
+
+from .logger import log
+from .state import row_key, change_rate
+
+
+# Weights for the individual priority signals (higher score = fetched first)
+WATCH_LIST_WEIGHT = 100.0
+VOLATILITY_WEIGHT = 20.0
+MARGIN_WEIGHT = 10.0
+
+# Average sale price columns used as the resale reference for margin, best first
+SALE_PRICE_COLUMNS = [
+    "30 Day Avg. Sale Price",
+    "60 Day Avg Sale Price",
+    "90 Avg Sale Price",
+]
+
+
+def _pid(row: pd.Series) -> str:
+    return str(row.get("product_id") or row.get("Product ID") or "").strip()
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        f = float(str(value).replace("$", "").replace(",", "").strip())
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(f) else f
+
+
+def load_watch_list(watch_df: Optional[pd.DataFrame]) -> Dict[str, Dict[str, Any]]:
+    """
+    Index the Active Watch List tab by product_id.
+    """
+    if watch_df is None or watch_df.empty:
+        return {}
+
+    watch: Dict[str, Dict[str, Any]] = {}
+    for _, row in watch_df.iterrows():
+        pid = _pid(row)
+        if pid:
+            watch[pid] = row.to_dict()
+    return watch
+
+
+def _margin(row: pd.Series, watch_entry: Dict[str, Any], last_price: Optional[float]) -> float:
+    """
+    Expected resale margin as a fraction of the buy price, clamped to [0, 2].
+    """
+    price = _to_float(row.get("Price ($USD)"))
+    if price is None:
+        price = last_price
+    if not price or price <= 0:
+        return 0.0
+
+    for col in SALE_PRICE_COLUMNS:
+        sale = _to_float(row.get(col))
+        if sale is None:
+            sale = _to_float(watch_entry.get(col))
+        if sale is not None:
+            return min(2.0, max(0.0, (sale - price) / price))
+    return 0.0
+
+
+def compute_row_priorities(
+    df: pd.DataFrame,
+    watch_df: Optional[pd.DataFrame] = None,
+    scan_state: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[Any, float]:
+    """
+    Score each Product↔Retailer Map row; returns {df index label: priority}.
+
+    Signals:
+      - membership in the Active Watch List (plus its optional 'Priority' column)
+      - recent price/stock volatility from the incremental scan state
+      - expected margin vs. the average sale price columns
+    """
+    watch = load_watch_list(watch_df)
+    scan_state = scan_state or {}
+
+    priorities: Dict[Any, float] = {}
+    on_watch = 0
+    for idx, row in df.iterrows():
+        entry = scan_state.get(row_key(row)) or {}
+        watch_entry = watch.get(_pid(row)) or {}
+        last_price = _to_float((entry.get("last") or {}).get("Price ($USD)"))
+
+        score = 0.0
+        if watch_entry:
+            on_watch += 1
+            score += WATCH_LIST_WEIGHT
+            score += _to_float(watch_entry.get("Priority")) or 0.0
+        score += VOLATILITY_WEIGHT * change_rate(entry)
+        score += MARGIN_WEIGHT * _margin(row, watch_entry, last_price)
+        priorities[idx] = score
+
+    log(
+        f"Computed priorities for {len(priorities)} rows "
+        f"({on_watch} on Active Watch List)",
+        context="priority",
+    )
+    return priorities
+
+
+def watch_list_rows(df: pd.DataFrame, watch_df: Optional[pd.DataFrame]) -> List[Any]:
+    """
+    Index labels of the rows whose product is on the Active Watch List.
+    """
+    watch = load_watch_list(watch_df)
+    return [idx for idx, row in df.iterrows() if _pid(row) in watch]
+
+
+def top_by_priority(indices: List[Any], priorities: Dict[Any, float], limit: int) -> List[Any]:
+    """
+    Keep the `limit` highest-priority index labels, preserving sheet order.
+    Ties are broken by sheet order.
+    """
+    ranked = sorted(
+        enumerate(indices),
+        key=lambda pair: (-priorities.get(pair[1], 0.0), pair[0]),
+    )[:limit]
+    return [idx for _, idx in sorted(ranked)]
@@ -0,0 +1,187 @@
+# retail_selector/profiling.py
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from .metrics import histogram_total
+from .tracing import span
+
+try:
+    import resource  # not available on Windows: RSS is then reported as None
+except ImportError:
+    resource = None
+
+# `orchestrator --profile`: per-phase wall / CPU / peak memory plus a
+# deterministic cProfile of the main thread (the event loop), written next to
+# the run's log file as
+#   profile-<run id>.json   phases + fetch / parse / AI totals
+#   profile-<run id>.prof   raw cProfile stats (snakeviz, pstats)
+#   profile-<run id>.txt    top functions by cumulative time
+#
+# Phases are sequential blocks (download, load, scan, save, upload, email).
+# Fetch, parse and AI interleave per row inside "scan", so they are reported
+# as summed busy time from the metrics histograms instead.
+
+PROFILE_TOP_N = 40
+
+_ENABLED = False
+_LOCK = threading.Lock()
+_PHASES: Dict[str, Dict[str, Any]] = {}
+_ACTIVE: List["phase"] = []
+_PROFILER: Optional[cProfile.Profile] = None
+
+# metrics histogram → profile stage
+STAGE_HISTOGRAMS = {
+    "fetch": "fetch_latency_ms",
+    "parse": "parse_latency_ms",
+    "ai": "ai_latency_ms",
+}
+
+
+def enable_profiling() -> None:
+    """
+    Start tracemalloc and the cProfile of the calling thread.
+    """
+    global _ENABLED, _PROFILER
+    if _ENABLED:
+        return
+    _ENABLED = True
+    tracemalloc.start()
+    _PROFILER = cProfile.Profile()
+    _PROFILER.enable()
+
+
+def profiling_enabled() -> bool:
+    return _ENABLED
+
+
+def _rss_peak_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is KB on Linux (bytes on macOS; close enough for a trend)
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def _fold_peak() -> None:
+    """
+    Credit the traced-memory peak since the last phase boundary to every
+    phase still running, then start a new peak window. Keeps per-phase
+    peaks right when phases overlap (email ∥ save copy).
+    """
+    peak = tracemalloc.get_traced_memory()[1]
+    for p in _ACTIVE:
+        p.peak = max(p.peak, peak)
+    tracemalloc.reset_peak()
+
+
+class phase:
+    """
+    with phase("upload", rows=n): ...
+
+    A trace span (cat="phase") that, under --profile, also records wall
+    time, process CPU time and peak memory for the block.
+    """
+
+    def __init__(self, name: str, **args: Any):
+        self.name = name
+        self._span = span(name, cat="phase", **args)
+        self.peak = 0
+
+    def __enter__(self):
+        self._span.__enter__()
+        if _ENABLED:
+            with _LOCK:
+                _fold_peak()
+                _ACTIVE.append(self)
+            self._w0 = time.perf_counter()
+            self._c0 = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if _ENABLED:
+            wall_ms = (time.perf_counter() - self._w0) * 1000.0
+            cpu_ms = (time.process_time() - self._c0) * 1000.0
+            with _LOCK:
+                _fold_peak()
+                _ACTIVE.remove(self)
+                rec = _PHASES.setdefault(
+                    self.name, {"calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0, "peak_traced_mb": 0.0}
+                )
+                rec["calls"] += 1
+                rec["wall_ms"] = round(rec["wall_ms"] + wall_ms, 1)
+                rec["cpu_ms"] = round(rec["cpu_ms"] + cpu_ms, 1)
+                rec["peak_traced_mb"] = max(rec["peak_traced_mb"], round(self.peak / 2**20, 1))
+                rec["rss_peak_mb"] = _rss_peak_mb()
+        return self._span.__exit__(exc_type, exc, tb)
+
+
+def profile_summary() -> Dict[str, Any]:
+    """
+    {"phases": {name: wall/cpu/memory}, "stages": {fetch/parse/ai: busy time}}.
+    Stage CPU covers in-thread parsing and the AI call; parse-worker
+    processes and the event loop's share of fetching are not attributed.
+    """
+    stages = {}
+    for stage, hist in STAGE_HISTOGRAMS.items():
+        count, busy_ms, cpu_ms = histogram_total(hist)
+        stages[stage] = {
+            "count": count,
+            "busy_wall_ms": round(busy_ms, 1),
+            "cpu_ms": round(cpu_ms, 1) if cpu_ms is not None else None,
+        }
+    with _LOCK:
+        phases = {name: dict(rec) for name, rec in _PHASES.items()}
+    return {"phases": phases, "stages": stages, "rss_peak_mb": _rss_peak_mb()}
+
+
+def format_profile(summary: Dict[str, Any]) -> Dict[str, str]:
+    """
+    One line per phase / stage, for the printed pipeline metadata.
+    """
+    out = {}
+    for name, p in summary["phases"].items():
+        out[f"profile.{name}"] = (
+            f"wall={p['wall_ms']:.0f}ms cpu={p['cpu_ms']:.0f}ms "
+            f"peak_traced={p['peak_traced_mb']}MB rss_peak={p.get('rss_peak_mb')}MB"
+        )
+    for name, s in summary["stages"].items():
+        if s["count"]:
+            cpu = f" cpu={s['cpu_ms']:.0f}ms" if s["cpu_ms"] is not None else ""
+            out[f"profile.{name}"] = f"n={s['count']} busy={s['busy_wall_ms']:.0f}ms{cpu}"
+    return out
+
+
+def export_profile(out_dir: Path | str, run_id: str) -> Dict[str, Any]:
+    """
+    Stop the cProfile and write profile-<run_id>.json / .prof / .txt.
+    Returns the summary with the written paths under "files".
+    """
+    global _PROFILER
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    summary = profile_summary()
+    files = {"json": str(out_dir / f"profile-{run_id}.json")}
+
+    if _PROFILER is not None:
+        _PROFILER.disable()
+        prof = out_dir / f"profile-{run_id}.prof"
+        _PROFILER.dump_stats(str(prof))
+        text = io.StringIO()
+        pstats.Stats(_PROFILER, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        txt = out_dir / f"profile-{run_id}.txt"
+        txt.write_text(text.getvalue(), encoding="utf-8")
+        files.update(prof=str(prof), top=str(txt))
+        _PROFILER = None
+
+    summary["files"] = files
+    with open(files["json"], "w", encoding="utf-8") as f:
+        json.dump({"run_id": run_id, **summary}, f, indent=2)
+    return summary
@@ -0,0 +1,303 @@
+# retail_selector/retailers.py
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from .config import RETAILER_PROFILES_PATH
+from .logger import log
+
+# Per-retailer fetch profiles: how a retailer's pages are fetched and parsed.
+#
+# Sources (later wins, field by field):
+#   1. the master sheet's Retailers tab – one row per retailer, keyed by a
+#      retailer_key and/or host column, profile settings in the columns below
+#   2. the local override file (config.RETAILER_PROFILES_PATH):
+#        {"shop3": {"render_js": false, "timeout": 20},
+#         "www.example.com": {"premium_proxy": true, "concurrency": 2}}
+#
+# A setting left blank falls back to the scrapingbee_fetch_many arguments,
+# so retailers without a profile are fetched exactly as before. A row picks
+# up the entries for its retailer_key and its URL's host (parent domains
+# match subdomains, a leading "www." is ignored); within one source the
+# retailer_key entry beats the host entry.
+
+# Profile setting → parser for a Retailers tab cell / override value
+PROFILE_FIELDS = {
+    "render_js": "bool",
+    "wait_ms": "int",
+    "premium_proxy": "bool",
+    "timeout": "int",
+    "max_retries": "int",
+    "concurrency": "int",
+    "parser": "parser",
+    "fetch": "fetch",
+    "price_selector": "str",
+    "stock_selector": "str",
+}
+
+# Column names accepted for the profile key in the Retailers tab
+KEY_COLUMNS = ("retailer_key", "retailer")
+HOST_COLUMNS = ("host", "domain")
+
+# parser=... values understood by parsing.parse_html_price_stock
+PARSERS = ("auto", "amazon", "shopify", "jsonld", "generic", "ai")
+
+# fetch=... strategies understood by scraping.scrapingbee_fetch_many
+# (shopify_json: the product's .js JSON endpoint instead of the page;
+#  extract: only the price_selector / stock_selector text, via extract_rules)
+FETCH_MODES = ("html", "shopify_json", "extract")
+
+_TRUE = {"true", "yes", "y", "1"}
+_FALSE = {"false", "no", "n", "0"}
+
+
+def _norm_column(name: Any) -> str:
+    return str(name).strip().lower().replace(" ", "_")
+
+
+def _norm_host(host: str) -> str:
+    host = host.strip().lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _parse_value(kind: str, raw: Any) -> Any:
+    """
+    Sheet cell / JSON value → typed setting, or None for blank / unreadable.
+    """
+    if raw is None or (isinstance(raw, float) and pd.isna(raw)):
+        return None
+    if isinstance(raw, str):
+        raw = raw.strip()
+        if not raw:
+            return None
+    if kind == "bool":
+        if isinstance(raw, bool):
+            return raw
+        text = str(raw).strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+        return None
+    if kind == "int":
+        try:
+            return int(float(raw))
+        except (TypeError, ValueError):
+            return None
+    if kind == "str":
+        return str(raw).strip()
+    text = str(raw).strip().lower()
+    allowed = PARSERS if kind == "parser" else FETCH_MODES
+    return text if text in allowed else None
+
+
+class FetchProfile:
+    """
+    Fetch / parse settings for one retailer; None = use the call's default.
+    """
+
+    def __init__(self, name: str = "default", **settings: Any):
+        self.name = name
+        self.render_js: Optional[bool] = settings.get("render_js")
+        self.wait_ms: Optional[int] = settings.get("wait_ms")
+        self.premium_proxy: Optional[bool] = settings.get("premium_proxy")
+        self.timeout: Optional[int] = settings.get("timeout")
+        self.max_retries: Optional[int] = settings.get("max_retries")
+        self.concurrency: Optional[int] = settings.get("concurrency")
+        self.parser: Optional[str] = settings.get("parser")
+        self.fetch: Optional[str] = settings.get("fetch")
+        self.price_selector: Optional[str] = settings.get("price_selector")
+        self.stock_selector: Optional[str] = settings.get("stock_selector")
+
+    def settings(self) -> Dict[str, Any]:
+        return {f: getattr(self, f) for f in PROFILE_FIELDS if getattr(self, f) is not None}
+
+    def fetch_key(self) -> Tuple[Any, ...]:
+        """
+        URLs with equal keys are fetched as one group (parser does not matter).
+        """
+        return (
+            self.fetch, self.render_js, self.wait_ms, self.premium_proxy,
+            self.timeout, self.max_retries, self.concurrency,
+            self.price_selector, self.stock_selector,
+        )
+
+    def extract_rules(self) -> Optional[Dict[str, str]]:
+        """
+        ScrapingBee extract_rules for fetch="extract" ({"price": css, "stock": css}).
+        """
+        rules = {}
+        if self.price_selector:
+            rules["price"] = self.price_selector
+        if self.stock_selector:
+            rules["stock"] = self.stock_selector
+        return rules or None
+
+    def scraper_params(self) -> Dict[str, str]:
+        """
+        ScrapingBee query parameters set by this profile.
+        """
+        params: Dict[str, str] = {}
+        if self.render_js is not None:
+            params["render_js"] = "true" if self.render_js else "false"
+        if self.wait_ms is not None:
+            params["wait"] = str(self.wait_ms)
+        if self.premium_proxy is not None:
+            params["premium_proxy"] = "true" if self.premium_proxy else "false"
+        return params
+
+    def __repr__(self) -> str:
+        return f"FetchProfile({self.name!r}, {self.settings()})"
+
+
+DEFAULT_PROFILE = FetchProfile()
+
+
+# One table of entries per source
+Entries = Dict[str, Tuple[str, Dict[str, Any]]]
+
+
+class RetailerProfiles:
+    """
+    Lookup of FetchProfile by retailer_key / URL host. Entries are kept per
+    source (layer), in the order the sources were added.
+    """
+
+    def __init__(self):
+        # layer → ({retailer_key: (name, settings)}, {host: (name, settings)})
+        self.layers: Dict[str, Tuple[Entries, Entries]] = {}
+        self._resolved: Dict[Tuple[str, str], FetchProfile] = {}
+
+    def __len__(self) -> int:
+        return sum(len(by_key) + len(by_host) for by_key, by_host in self.layers.values())
+
+    def add(self, name: str, settings: Dict[str, Any], host: bool = False, layer: str = "tab") -> None:
+        """
+        Merge settings into a retailer_key's (or host's) entry of one layer.
+        """
+        by_key, by_host = self.layers.setdefault(layer, ({}, {}))
+        table = by_host if host else by_key
+        key = _norm_host(name) if host else name.strip().lower()
+        _, current = table.get(key, (name.strip(), {}))
+        table[key] = (name.strip(), {**current, **settings})
+        self._resolved.clear()
+
+    @staticmethod
+    def _host_entry(by_host: Entries, host: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        while host:
+            entry = by_host.get(host)
+            if entry is not None:
+                return entry
+            host = host.partition(".")[2]
+        return None
+
+    def resolve(self, retailer_key: str = "", url: str = "") -> FetchProfile:
+        """
+        Merge every matching entry, field by field: later layers win, and
+        within a layer the retailer_key entry wins over the host entry.
+        """
+        key = retailer_key.strip().lower()
+        host = _norm_host(urlparse(url).netloc) if url else ""
+        cached = self._resolved.get((key, host))
+        if cached is not None:
+            return cached
+
+        names: List[str] = []
+        settings: Dict[str, Any] = {}
+        for by_key, by_host in self.layers.values():
+            for entry in (self._host_entry(by_host, host), by_key.get(key) if key else None):
+                if entry is not None:
+                    if entry[0] not in names:
+                        names.append(entry[0])
+                    settings.update(entry[1])
+
+        profile = FetchProfile("+".join(names), **settings) if names else DEFAULT_PROFILE
+        self._resolved[(key, host)] = profile
+        return profile
+
+
+def _settings_from(values: Dict[str, Any]) -> Dict[str, Any]:
+    settings = {}
+    for col, raw in values.items():
+        kind = PROFILE_FIELDS.get(_norm_column(col))
+        if kind is None:
+            continue
+        value = _parse_value(kind, raw)
+        if value is not None:
+            settings[_norm_column(col)] = value
+    return settings
+
+
+def add_retailers_tab(profiles: RetailerProfiles, df: Optional[pd.DataFrame]) -> int:
+    """
+    Add the Retailers tab's profiles; returns how many rows set something.
+    """
+    if df is None or df.empty:
+        return 0
+    cols = {_norm_column(c): c for c in df.columns}
+    key_col = next((cols[c] for c in KEY_COLUMNS if c in cols), None)
+    host_col = next((cols[c] for c in HOST_COLUMNS if c in cols), None)
+    if key_col is None and host_col is None:
+        log("Retailers tab has no retailer_key / host column; no profiles loaded", context="retailers")
+        return 0
+
+    added = 0
+    for record in df.to_dict("records"):
+        settings = _settings_from(record)
+        if not settings:
+            continue
+        key = str(record.get(key_col) or "").strip() if key_col else ""
+        host = str(record.get(host_col) or "").strip() if host_col else ""
+        if key:
+            profiles.add(key, settings, layer="tab")
+        if host:
+            profiles.add(host, settings, host=True, layer="tab")
+        added += bool(key or host)
+    return added
+
+
+def add_override_file(profiles: RetailerProfiles, path: Path | str) -> int:
+    """
+    Add the local override file's profiles (keys containing a "." are hosts).
+    """
+    path = Path(path)
+    if not path.exists():
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        data: Dict[str, Dict[str, Any]] = json.load(f)
+    for name, values in data.items():
+        profiles.add(name, _settings_from(values), host="." in name, layer="file")
+    return len(data)
+
+
+def load_retailer_profiles(
+    retailers_df: Optional[pd.DataFrame] = None,
+    override_path: Optional[Path | str] = RETAILER_PROFILES_PATH,
+) -> RetailerProfiles:
+    """
+    Retailers tab profiles with the override file applied on top.
+    """
+    profiles = RetailerProfiles()
+    from_tab = add_retailers_tab(profiles, retailers_df)
+    from_file = add_override_file(profiles, override_path) if override_path else 0
+    if from_tab or from_file:
+        log(
+            f"retailer profiles: {from_tab} from Retailers tab, {from_file} from {override_path}",
+            context="retailers",
+        )
+    return profiles
+
+
+def group_by_fetch_profile(profiles: Iterable[FetchProfile]) -> List[Tuple[FetchProfile, List[int]]]:
+    """
+    [(profile, positions)] – one group per distinct fetch setting, in first-seen order.
+    """
+    groups: Dict[Tuple[Any, ...], Tuple[FetchProfile, List[int]]] = {}
+    for i, profile in enumerate(profiles):
+        groups.setdefault(profile.fetch_key(), (profile, []))[1].append(i)
+    return list(groups.values())
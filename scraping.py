@@ -2,20 +2,56 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import heapq
+import json
+import re
 import time
-from typing import List, Dict, Any, Iterable, Optional
-
-import aiohttp
+from typing import TYPE_CHECKING, List, Dict, Any, Awaitable, Callable, Iterable, Optional, Sequence, Tuple
+from urllib.parse import urlsplit, urlunsplit
 
+from .config import SCRAPINGBEE_ENDPOINT
 from .logger import log
+from .metrics import inc, observe, host_label
+from .tracing import span, record_span
+from .retailers import FetchProfile, DEFAULT_PROFILE, group_by_fetch_profile
+
+if TYPE_CHECKING:
+    import aiohttp
 
-# Base ScrapingBee endpoint
-SCRAPINGBEE_ENDPOINT = "https://app.scrapingbee.com/api/v1/"
 DEFAULT_TIMEOUT = 60  # seconds
 
 # HTTP codes we consider transient and worth retrying
 TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
 
+# URL Status for rows that were never fetched because the run deadline hit
+SKIPPED_DEADLINE = "skipped_deadline"
+
+# result["format"] when page_text is not the product page's HTML
+FORMAT_SHOPIFY_JSON = "shopify_json"
+FORMAT_EXTRACTED = "extracted"  # result["extracted"] holds the selector fields
+
+# Shopify product path (optionally under /<locale>/ or /collections/<c>/)
+RE_SHOPIFY_PRODUCT_PATH = re.compile(r"^(/(?:[^/]+/)*products/[^/?#]+?)(?:\.js|\.json)?/?$")
+
+
+def skipped_result(url: str, reason: str = SKIPPED_DEADLINE) -> Dict[str, Any]:
+    """
+    Normalized result for a URL that was never fetched (e.g. run deadline).
+    Same shape as _fetch_one_with_retries plus a 'skipped' reason.
+    """
+    return {
+        "status_code": None,
+        "final_url": url,
+        "page_text": None,
+        "error": None,
+        "response_ms": None,
+        "request_url": url,
+        "attempts": 0,
+        "last_exception_type": None,
+        "skipped": reason,
+    }
+
 
 def _build_params(
     api_key: str,
@@ -69,6 +105,7 @@ async def _fetch_one_with_retries(
 
     last_error: Optional[str] = None
     last_exception_type: Optional[str] = None
+    host = host_label(url)
 
     log(f"starting fetch url={url}", context="scraping")
 
@@ -89,6 +126,13 @@ async def _fetch_one_with_retries(
 
                 elapsed_ms = (time.perf_counter() - start_time) * 1000.0
                 final_url = str(resp.url)
+                inc("fetch_attempts", host=host, status=status)
+                record_span(
+                    "fetch_attempt", start_time, time.perf_counter(),
+                    cat="fetch", track=url, attempt=attempt, status=status,
+                )
+                inc("fetch_bytes_received", len(text), host=host)
+                observe("fetch_latency_ms", elapsed_ms, host=host)
 
                 log(
                     f"attempt={attempt} status={status} elapsed_ms={elapsed_ms:.1f} "
@@ -117,11 +161,13 @@ async def _fetch_one_with_retries(
                         }
 
                     sleep_for = base_backoff * attempt
+                    inc("fetch_retries", reason=str(status))
                     log(
                         f"transient {status} on url={url}, retrying in {sleep_for:.1f}s",
                         context="scraping",
                     )
-                    await asyncio.sleep(sleep_for)
+                    with span("backoff", cat="fetch", track=url):
+                        await asyncio.sleep(sleep_for)
                     continue
 
                 # Hard ScrapingBee errors we don't retry
@@ -163,6 +209,11 @@ async def _fetch_one_with_retries(
             last_exception_type = type(exc).__name__
             last_error = f"ScrapingBee timeout: {exc!r}"
             elapsed_ms = (time.perf_counter() - start_time) * 1000.0
+            inc("fetch_timeouts", host=host)
+            record_span(
+                "fetch_attempt", start_time, time.perf_counter(),
+                cat="fetch", track=url, attempt=attempt, error="timeout",
+            )
 
             if attempt == max_retries:
                 log(
@@ -182,16 +233,23 @@ async def _fetch_one_with_retries(
                 }
 
             sleep_for = base_backoff * attempt
+            inc("fetch_retries", reason="timeout")
             log(
                 f"timeout on url={url}, attempt={attempt}, retrying in {sleep_for:.1f}s",
                 context="scraping",
             )
-            await asyncio.sleep(sleep_for)
+            with span("backoff", cat="fetch", track=url):
+                await asyncio.sleep(sleep_for)
 
         except Exception as exc:
             last_exception_type = type(exc).__name__
             last_error = f"ScrapingBee exception: {type(exc).__name__}: {exc}"
             elapsed_ms = (time.perf_counter() - start_time) * 1000.0
+            inc("fetch_exceptions", type=last_exception_type)
+            record_span(
+                "fetch_attempt", start_time, time.perf_counter(),
+                cat="fetch", track=url, attempt=attempt, error=last_exception_type,
+            )
 
             if attempt == max_retries:
                 log(
@@ -211,11 +269,13 @@ async def _fetch_one_with_retries(
                 }
 
             sleep_for = base_backoff * attempt
+            inc("fetch_retries", reason="exception")
             log(
                 f"exception on url={url}, attempt={attempt}, retrying in {sleep_for:.1f}s",
                 context="scraping",
             )
-            await asyncio.sleep(sleep_for)
+            with span("backoff", cat="fetch", track=url):
+                await asyncio.sleep(sleep_for)
 
     # Should never really get here, but just in case
     elapsed_ms = None
@@ -235,6 +295,181 @@ async def _fetch_one_with_retries(
     }
 
 
+# -------------------------------------------------------------------
+# Shopify product JSON fast path
+# -------------------------------------------------------------------
+
+def shopify_json_url(url: str) -> Optional[str]:
+    """
+    https://shop/…/products/<handle>?variant=1 → https://shop/…/products/<handle>.js
+    (None if url is not a product URL). The .js endpoint is a few KB of
+    JSON with every variant's price (cents) and availability.
+    """
+    parts = urlsplit(url)
+    m = RE_SHOPIFY_PRODUCT_PATH.match(parts.path)
+    if not parts.scheme or not parts.netloc or not m:
+        return None
+    return urlunsplit((parts.scheme, parts.netloc, m.group(1) + ".js", "", ""))
+
+
+async def _fetch_shopify_product(
+    session: aiohttp.ClientSession,
+    api_key: str,
+    url: str,
+    max_retries: int,
+    base_backoff: float,
+    timeout: int,
+    extra_params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch the product JSON endpoint for a Shopify product URL, statically
+    (the row's other scraper params, e.g. premium_proxy, still apply).
+    Returns a normalized result with format=shopify_json, or None when the
+    caller should fall back to the HTML page (not a product URL, fetch
+    failed, not product JSON).
+    """
+    json_url = shopify_json_url(url)
+    if json_url is None:
+        inc("shopify_json", outcome="not_product_url")
+        return None
+
+    result = await _fetch_one_with_retries(
+        session=session,
+        api_key=api_key,
+        url=json_url,
+        max_retries=max_retries,
+        base_backoff=base_backoff,
+        timeout=timeout,
+        # JSON needs no browser: no JS rendering, nothing to wait for
+        extra_params={
+            **{k: v for k, v in (extra_params or {}).items() if k != "wait"},
+            "render_js": "false",
+        },
+        headers=headers,
+    )
+    text = result.get("page_text") or ""
+    try:
+        ok = result["status_code"] == 200 and bool(json.loads(text).get("variants"))
+    except (ValueError, AttributeError):
+        ok = False
+    if not ok:
+        inc("shopify_json", outcome="fallback")
+        log(
+            f"shopify_json fallback to HTML url={url} status={result['status_code']} "
+            f"error={result['error']}",
+            context="scraping",
+        )
+        return None
+
+    inc("shopify_json", outcome="ok")
+    result["request_url"] = url
+    result["format"] = FORMAT_SHOPIFY_JSON
+    return result
+
+
+# -------------------------------------------------------------------
+# Server-side extraction (ScrapingBee extract_rules)
+# -------------------------------------------------------------------
+
+def _first_text(value: Any) -> str:
+    if isinstance(value, list):
+        value = value[0] if value else ""
+    return "" if value is None else str(value).strip()
+
+
+async def _fetch_extracted(
+    session: aiohttp.ClientSession,
+    api_key: str,
+    url: str,
+    rules: Dict[str, str],
+    extra_params: Dict[str, Any],
+    max_retries: int,
+    base_backoff: float,
+    timeout: int,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch only the CSS-selected fields of the page: the scraper renders it
+    and returns {"price": "...", "stock": "..."} instead of the HTML.
+    Returns a normalized result with format=extracted and the fields under
+    "extracted", or None when the caller should fetch the full HTML
+    (request failed, or the selected text holds no price or stock, e.g.
+    "See price in cart" – the AI fallback then gets the page, not the text).
+    """
+    from .parsing import parse_extracted_fields  # parsing imports this module
+
+    result = await _fetch_one_with_retries(
+        session=session,
+        api_key=api_key,
+        url=url,
+        max_retries=max_retries,
+        base_backoff=base_backoff,
+        timeout=timeout,
+        extra_params={**extra_params, "extract_rules": json.dumps(rules)},
+        headers=headers,
+    )
+    extracted: Dict[str, str] = {}
+    if result["status_code"] == 200:
+        try:
+            fields = json.loads(result.get("page_text") or "")
+        except ValueError:
+            fields = None
+        if isinstance(fields, dict):
+            extracted = {k: _first_text(fields.get(k)) for k in rules}
+            extracted = {k: v for k, v in extracted.items() if v}
+    if not extracted or parse_extracted_fields(extracted) is None:
+        inc("extract_rules", outcome="fallback")
+        log(
+            f"extract_rules gave no price / stock ({extracted}), falling back to HTML url={url} "
+            f"status={result['status_code']} error={result['error']}",
+            context="scraping",
+        )
+        return None
+
+    inc("extract_rules", outcome="ok")
+    result["format"] = FORMAT_EXTRACTED
+    result["extracted"] = extracted
+    return result
+
+
+# -------------------------------------------------------------------
+# Warm session (daemon mode)
+# -------------------------------------------------------------------
+
+# Per event loop. One-shot runs leave this empty and get a fresh session per
+# batch; the daemon opens one so pooled TCP/TLS connections and the DNS cache
+# to the scraper API survive from one scan to the next.
+_WARM_SESSIONS: Dict[int, "aiohttp.ClientSession"] = {}
+
+# Keep idle scraper connections this long (aiohttp default is 15 s)
+WARM_KEEPALIVE_SECONDS = 120.0
+
+
+def open_warm_session(pool_size: int = 100) -> aiohttp.ClientSession:
+    """
+    Shared session for every scrapingbee_fetch_many on the running loop,
+    until close_warm_session().
+    """
+    import aiohttp
+
+    loop_id = id(asyncio.get_running_loop())
+    session = _WARM_SESSIONS.get(loop_id)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=WARM_KEEPALIVE_SECONDS)
+        )
+        _WARM_SESSIONS[loop_id] = session
+        log(f"warm scraper session opened (pool={pool_size})", context="scraping")
+    return session
+
+
+async def close_warm_session() -> None:
+    session = _WARM_SESSIONS.pop(id(asyncio.get_running_loop()), None)
+    if session is not None:
+        await session.close()
+
+
 async def scrapingbee_fetch_many(
     urls: Iterable[str],
     api_key: str,
@@ -244,9 +479,37 @@ async def scrapingbee_fetch_many(
     base_backoff: float = 1.5,
     extra_params: Dict[str, str] = {"render_js": "true"},
     headers: Optional[Dict[str, str]] = None,
+    priorities: Optional[Sequence[float]] = None,
+    deadline: Optional[float] = None,
+    grace_s: float = 60.0,
+    on_result: Optional[Callable[[int, Dict[str, Any]], Optional[Awaitable[Any]]]] = None,
+    profiles: Optional[Sequence[FetchProfile]] = None,
 ) -> List[Dict[str, Any]]:
     """
     Fetch many URLs via ScrapingBee concurrently with a concurrency limit.
+
+    URLs are dispatched from a priority queue: higher `priorities[i]` is
+    fetched first, ties (and the no-priorities case) go in input order.
+    Results are always returned in input order.
+
+    profiles[i] (retailers.FetchProfile) overrides render_js / wait /
+    premium proxy, timeout and max_retries for URL i; fetch="shopify_json"
+    gets the product JSON endpoint instead of the page, fetch="extract"
+    only the profile's CSS-selected price / stock text (HTML on failure).
+    URLs are grouped by profile, each group capped at the profile's
+    concurrency; `concurrency` workers bound the total in flight and always
+    take the highest-priority URL whose group still has a free slot, so
+    the global priority order holds across groups.
+
+    deadline (epoch seconds): no new fetches start after it; in-flight
+    fetches get `grace_s` more seconds and are then cancelled. URLs not
+    fetched come back as skipped_result(url).
+
+    on_result(i, result) is called as soon as each URL's result is ready
+    (including skipped ones), so callers can parse/journal incrementally.
+    If it returns an awaitable (e.g. a put into a bounded queue), the fetch
+    worker waits for it before taking the next URL – backpressure. It is
+    shielded, so a deadline cancellation never drops a hand-off half-way.
     """
     url_list = list(urls)
     log(
@@ -254,26 +517,149 @@ async def scrapingbee_fetch_many(
         context="scraping",
     )
 
+    inc("fetches", len(url_list))
     results: List[Dict[str, Any]] = [None] * len(url_list)  # type: ignore
-    semaphore = asyncio.Semaphore(max(1, concurrency))
-
-    async with aiohttp.ClientSession() as session:
-
-        async def worker(idx: int, u: str):
-            async with semaphore:
-                results[idx] = await _fetch_one_with_retries(
-                    session=session,
-                    api_key=api_key,
-                    url=u,
-                    max_retries=max_retries,
-                    base_backoff=base_backoff,
-                    timeout=timeout,
-                    extra_params=extra_params,
-                    headers=headers,
+    if profiles is None:
+        profiles = [DEFAULT_PROFILE] * len(url_list)
+    # One heap per profile group; dispatch compares the groups' heads
+    groups = []
+    for profile, positions in group_by_fetch_profile(profiles):
+        heap = [
+            (-(float(priorities[i]) if priorities is not None else 0.0), i, url_list[i])
+            for i in positions
+        ]
+        heapq.heapify(heap)
+        cap = min(max(1, concurrency), profile.concurrency or concurrency)
+        groups.append({"profile": profile, "heap": heap, "cap": max(1, cap), "active": 0})
+    if len(groups) > 1:
+        log(
+            "fetch profile groups: " + ", ".join(
+                f"{g['profile'].name}={len(g['heap'])} (max {g['cap']})" for g in groups
+            ),
+            context="scraping",
+        )
+
+    import aiohttp
+
+    enqueued_at = time.perf_counter()
+
+    warm = _WARM_SESSIONS.get(id(asyncio.get_running_loop()))
+    if warm is not None and not warm.closed:
+        session_cm = contextlib.nullcontext(warm)
+    else:
+        session_cm = aiohttp.ClientSession()
+
+    async with session_cm as session:
+
+        slot_freed = asyncio.Condition()
+
+        async def next_item() -> Optional[Tuple[Dict[str, Any], int, str]]:
+            """
+            Highest-priority URL among the groups below their cap (waits
+            while only capped groups have URLs left); None when done.
+            """
+            async with slot_freed:
+                while True:
+                    if deadline is not None and time.time() >= deadline:
+                        return None
+                    open_groups = [g for g in groups if g["heap"] and g["active"] < g["cap"]]
+                    if open_groups:
+                        group = min(open_groups, key=lambda g: g["heap"][0])
+                        _, idx, u = heapq.heappop(group["heap"])
+                        group["active"] += 1
+                        return group, idx, u
+                    if not any(g["heap"] for g in groups):
+                        return None
+                    await slot_freed.wait()
+
+        async def release(group: Dict[str, Any]) -> None:
+            async with slot_freed:
+                group["active"] -= 1
+                slot_freed.notify_all()
+
+        async def worker():
+            while True:
+                item = await next_item()
+                if item is None:
+                    return
+                group, idx, u = item
+                profile = group["profile"]
+                params = {**(extra_params or {}), **profile.scraper_params()}
+                try:
+                    record_span("queue_wait", enqueued_at, time.perf_counter(), cat="fetch", track=u)
+                    result = None
+                    if profile.fetch == FORMAT_SHOPIFY_JSON:
+                        result = await _fetch_shopify_product(
+                            session=session,
+                            api_key=api_key,
+                            url=u,
+                            max_retries=profile.max_retries or max_retries,
+                            base_backoff=base_backoff,
+                            timeout=profile.timeout or timeout,
+                            extra_params=params,
+                            headers=headers,
+                        )
+                    elif profile.fetch == "extract" and profile.extract_rules():
+                        result = await _fetch_extracted(
+                            session=session,
+                            api_key=api_key,
+                            url=u,
+                            rules=profile.extract_rules(),
+                            extra_params=params,
+                            max_retries=profile.max_retries or max_retries,
+                            base_backoff=base_backoff,
+                            timeout=profile.timeout or timeout,
+                            headers=headers,
+                        )
+                    if result is None:
+                        result = await _fetch_one_with_retries(
+                            session=session,
+                            api_key=api_key,
+                            url=u,
+                            max_retries=profile.max_retries or max_retries,
+                            base_backoff=base_backoff,
+                            timeout=profile.timeout or timeout,
+                            extra_params=params,
+                            headers=headers,
+                        )
+                    results[idx] = result
+                finally:
+                    await release(group)
+                inc("fetches_completed")
+                if on_result is not None:
+                    handoff = on_result(idx, results[idx])
+                    if handoff is not None:
+                        await asyncio.shield(handoff)
+
+        n_workers = min(max(1, concurrency), len(url_list))
+        tasks = [asyncio.create_task(worker()) for _ in range(n_workers)]
+
+        if deadline is None or not tasks:
+            await asyncio.gather(*tasks)
+        else:
+            hard_stop = max(0.0, deadline + grace_s - time.time())
+            _, pending = await asyncio.wait(tasks, timeout=hard_stop)
+            if pending:
+                log(
+                    f"deadline grace window closed, cancelling {len(pending)} in-flight fetches",
+                    context="scraping",
                 )
-
-        tasks = [asyncio.create_task(worker(i, u)) for i, u in enumerate(url_list)]
-        await asyncio.gather(*tasks)
+                for t in pending:
+                    t.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    skipped = 0
+    for i, u in enumerate(url_list):
+        if results[i] is None:
+            results[i] = skipped_result(u)
+            skipped += 1
+            if on_result is not None:
+                handoff = on_result(i, results[i])
+                if handoff is not None:
+                    await handoff
+    if skipped:
+        inc("fetch_skipped", skipped)
+        log(f"deadline reached: {skipped}/{len(url_list)} urls not fetched", context="scraping")
 
     log("batch fetch complete", context="scraping")
     return results
@@ -0,0 +1,139 @@
+# retail_selector/sharding.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+import pandas as pd
+
+from .logger import log
+from .state import row_key, json_safe
+
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """
+    Parse '--shard i/N' (0-based i) → (i, N).
+    """
+    try:
+        i_str, n_str = spec.split("/")
+        i, n = int(i_str), int(n_str)
+    except ValueError:
+        raise ValueError(f"Invalid shard spec {spec!r}; expected i/N, e.g. 0/4")
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"Invalid shard spec {spec!r}; need 0 <= i < N")
+    return i, n
+
+
+def shard_of(url: str, num_shards: int) -> int:
+    """
+    Deterministic shard for a search_url (stable across processes/machines,
+    unlike Python's salted hash()).
+    """
+    digest = hashlib.sha1(url.strip().encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % num_shards
+
+
+def select_shard_rows(df: pd.DataFrame, shard_index: int, num_shards: int) -> List[Any]:
+    """
+    Index labels of the rows that belong to one shard.
+    """
+    return [
+        idx
+        for idx, url in df["search_url"].items()
+        if shard_of(str(url or ""), num_shards) == shard_index
+    ]
+
+
+def partition_path(shard_dir: Path | str, shard_index: int, num_shards: int) -> Path:
+    return Path(shard_dir) / f"part-{shard_index:03d}-of-{num_shards:03d}.jsonl"
+
+
+def shard_state_path(shard_dir: Path | str, shard_index: int, num_shards: int) -> Path:
+    """
+    Scan state entries of the rows one shard scanned (merged by --merge-shards).
+    """
+    return Path(shard_dir) / f"state-{shard_index:03d}-of-{num_shards:03d}.json"
+
+
+def write_shard_partition(
+    df: pd.DataFrame,
+    indices: List[Any],
+    columns: List[str],
+    shard_dir: Path | str,
+    shard_index: int,
+    num_shards: int,
+) -> Path:
+    """
+    Write one shard's KPI results as JSONL (one row_key + values per line).
+    Written to a tmp file and renamed, so a merge never sees half a partition.
+    """
+    out = partition_path(shard_dir, shard_index, num_shards)
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    cols = [c for c in columns if c in df.columns]
+    with open(tmp, "w", encoding="utf-8") as f:
+        for idx in indices:
+            row = df.loc[idx]
+            rec = {"key": row_key(row), "values": {c: json_safe(row.get(c)) for c in cols}}
+            f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+    os.replace(tmp, out)
+
+    log(f"Wrote shard {shard_index}/{num_shards} partition ({len(indices)} rows) → {out}", context="sharding")
+    return out
+
+
+def load_shard_partitions(shard_dir: Path | str, num_shards: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Read all N partitions → {row_key: KPI values}. Raises if any is missing.
+    """
+    missing = [
+        i for i in range(num_shards)
+        if not partition_path(shard_dir, i, num_shards).exists()
+    ]
+    if missing:
+        raise FileNotFoundError(
+            f"Missing shard partitions {missing} of {num_shards} in {shard_dir}"
+        )
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    for i in range(num_shards):
+        with open(partition_path(shard_dir, i, num_shards), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    merged[rec["key"]] = rec["values"]
+
+    log(f"Loaded {len(merged)} rows from {num_shards} shard partitions in {shard_dir}", context="sharding")
+    return merged
+
+
+def load_shard_states(shard_dir: Path | str, num_shards: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Scan state entries written by all N shards → {row_key: entry}. Shards
+    that scanned nothing (or kept their state out) have no file.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for i in range(num_shards):
+        path = shard_state_path(shard_dir, i, num_shards)
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                merged.update(json.load(f))
+    log(f"Loaded scan state for {len(merged)} rows from {num_shards} shards in {shard_dir}", context="sharding")
+    return merged
+
+
+def clear_shard_partitions(shard_dir: Path | str, num_shards: int) -> None:
+    """
+    Remove partitions after a successful merge so stale results never leak
+    into the next merge.
+    """
+    for i in range(num_shards):
+        for path in (partition_path(shard_dir, i, num_shards), shard_state_path(shard_dir, i, num_shards)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
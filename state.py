@@ -0,0 +1,274 @@
+# retail_selector/state.py
+from __future__ import annotations
+
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+
+from .config import (
+    SCAN_STATE_PATH,
+    MIN_REVISIT_HOURS,
+    DEFAULT_REVISIT_HOURS,
+    MAX_REVISIT_HOURS,
+)
+from .logger import log
+
+
+# KPI columns remembered per row and carried forward when a row is not due
+CARRY_COLUMNS = [
+    "In Stock (Y/N)",
+    "Price ($USD)",
+    "Last Scan (UTC)",
+    "HTTP Status",
+    "Parse Method",
+    "Response ms",
+    "Last Error",
+    "URL Status",
+    "Validation Issues",
+]
+
+# URL Status values that mean "we did not get a real observation"
+FAILED_STATUSES = {"error", "ai_error", "missing_url", "skipped_deadline"}
+
+# Interval multipliers applied after each successful observation
+SHRINK_ON_CHANGE = 0.5
+GROW_ON_STABLE = 1.5
+
+
+# --------------------------------------------------------------
+# Keys + persistence
+# --------------------------------------------------------------
+
+def row_key(row: pd.Series) -> str:
+    """
+    Stable identity of a Product↔Retailer Map row across runs.
+    """
+    pid = str(row.get("product_id") or row.get("Product ID") or "").strip()
+    url = str(row.get("search_url") or "").strip()
+    return f"{pid}|{url}"
+
+
+def load_scan_state(path: Path | str | None = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Load the per-row scan history. Missing or unreadable file → empty state.
+    """
+    path = Path(path or SCAN_STATE_PATH)
+    if not path.exists():
+        log(f"No scan state at {path}; every row is due.", context="state")
+        return {}
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except Exception as e:
+        log(f"ERROR reading scan state {path}: {e!r}; starting fresh.", context="state")
+        return {}
+
+    log(f"Loaded scan state for {len(state)} rows from {path}", context="state")
+    return state
+
+
+def save_scan_state(
+    state: Dict[str, Dict[str, Any]],
+    path: Path | str | None = None,
+    keys: Optional[List[str]] = None,
+) -> Path:
+    """
+    Atomically write the per-row scan history (tmp file + rename).
+
+    With keys given, only those rows are written over the current file
+    contents. The read-modify-write is not locked: concurrent shards each
+    write their own file (sharding.shard_state_path), merged into the main
+    state once by --merge-shards.
+    """
+    path = Path(path or SCAN_STATE_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if keys is not None:
+        current = load_scan_state(path)
+        current.update({k: state[k] for k in keys if k in state})
+        state = current
+
+    tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, default=str)
+    os.replace(tmp, path)
+
+    log(f"Saved scan state for {len(state)} rows → {path}", context="state")
+    return path
+
+
+# --------------------------------------------------------------
+# Scheduling
+# --------------------------------------------------------------
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def is_due(entry: Optional[Dict[str, Any]], now: datetime) -> bool:
+    """
+    A row is due if we have never seen it or its next visit time has passed.
+    """
+    if not entry:
+        return True
+    next_due = _parse_ts(entry.get("next_due"))
+    return next_due is None or next_due <= now
+
+
+def change_rate(entry: Optional[Dict[str, Any]]) -> float:
+    """
+    Fraction of successful observations where price or stock moved.
+    """
+    if not entry:
+        return 0.0
+    scans = int(entry.get("scans") or 0)
+    if scans <= 1:
+        return 0.0
+    return float(entry.get("changes") or 0) / float(scans - 1)
+
+
+def select_due_rows(
+    df: pd.DataFrame,
+    state: Dict[str, Dict[str, Any]],
+    now: Optional[datetime] = None,
+) -> Tuple[List[Any], List[Any]]:
+    """
+    Split df index labels into (due, not_due) according to the scan state.
+    """
+    now = now or datetime.now(timezone.utc)
+    due, not_due = [], []
+    for idx, row in df.iterrows():
+        if is_due(state.get(row_key(row)), now):
+            due.append(idx)
+        else:
+            not_due.append(idx)
+    return due, not_due
+
+
+def carry_forward(
+    df: pd.DataFrame,
+    indices: List[Any],
+    state: Dict[str, Dict[str, Any]],
+) -> int:
+    """
+    Fill KPI columns of rows that are not due from their last stored result.
+    Returns the number of rows filled.
+    """
+    filled = 0
+    for idx in indices:
+        entry = state.get(row_key(df.loc[idx])) or {}
+        last = entry.get("last") or {}
+        if not last:
+            continue
+        for col in CARRY_COLUMNS:
+            if col not in df.columns:
+                df[col] = None
+            if col in last:
+                value = last[col]
+                if col in ("Price ($USD)", "Response ms"):
+                    value = float("nan") if value is None else float(value)
+                df.at[idx, col] = value
+        filled += 1
+    return filled
+
+
+# --------------------------------------------------------------
+# Recording results
+# --------------------------------------------------------------
+
+def json_safe(value: Any) -> Any:
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "item"):  # numpy scalars
+        try:
+            return value.item()
+        except Exception:
+            pass
+    return value
+
+
+def record_scan_result(
+    state: Dict[str, Dict[str, Any]],
+    key: str,
+    result: Dict[str, Any],
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Record one row's fresh KPI values and reschedule its next visit.
+
+    Successful observations adapt the revisit interval: a price/stock change
+    halves it, an unchanged result grows it by 1.5x (clamped to the
+    MIN/MAX_REVISIT_HOURS window). Failed scans are retried after the
+    minimum interval without touching the change history.
+    """
+    now = now or datetime.now(timezone.utc)
+    entry = dict(state.get(key) or {})
+    last = {col: json_safe(result.get(col)) for col in CARRY_COLUMNS if col in result}
+
+    interval = float(entry.get("interval_hours") or DEFAULT_REVISIT_HOURS)
+    failed = str(last.get("URL Status") or "") in FAILED_STATUSES or (
+        last.get("Price ($USD)") is None and not last.get("In Stock (Y/N)")
+    )
+
+    if failed:
+        next_hours = MIN_REVISIT_HOURS
+    else:
+        prev = entry.get("last") or {}
+        seen_before = int(entry.get("scans") or 0) > 0
+        changed = seen_before and (
+            prev.get("Price ($USD)") != last.get("Price ($USD)")
+            or prev.get("In Stock (Y/N)") != last.get("In Stock (Y/N)")
+        )
+
+        entry["scans"] = int(entry.get("scans") or 0) + 1
+        if changed:
+            entry["changes"] = int(entry.get("changes") or 0) + 1
+            entry["last_change"] = now.isoformat()
+            interval *= SHRINK_ON_CHANGE
+        elif seen_before:
+            interval *= GROW_ON_STABLE
+
+        interval = min(MAX_REVISIT_HOURS, max(MIN_REVISIT_HOURS, interval))
+        entry["interval_hours"] = interval
+        entry["last"] = last
+        next_hours = interval
+
+    entry["last_attempt"] = now.isoformat()
+    entry["next_due"] = (now + timedelta(hours=next_hours)).isoformat()
+    state[key] = entry
+    return entry
+
+
+def record_scanned_rows(
+    state: Dict[str, Dict[str, Any]],
+    df: pd.DataFrame,
+    indices: List[Any],
+    now: Optional[datetime] = None,
+) -> List[str]:
+    """
+    Record the freshly written KPI columns for every scanned row.
+    Returns the row keys that were updated.
+    """
+    now = now or datetime.now(timezone.utc)
+    cols = [c for c in CARRY_COLUMNS if c in df.columns]
+    keys = []
+    for idx in indices:
+        row = df.loc[idx]
+        key = row_key(row)
+        record_scan_result(state, key, {c: row.get(c) for c in cols}, now=now)
+        keys.append(key)
+    return keys
@@ -0,0 +1,254 @@
+# retail_selector/storage.py
+from __future__ import annotations
+
+import asyncio
+import io
+from abc import ABC, abstractmethod
+import json
+import os
+from pathlib import Path
+from typing import Tuple, Dict, Any, List, Optional
+
+import pandas as pd
+
+from . import config
+from .config import (
+    MASTER_SHEET_ID,
+    OUTPUT_SHEET_ID,
+    PRODUCT_MAP_TAB,
+    ACTIVE_WATCH_TAB,
+)
+from .logger import log
+
+
+# -------------------------------------------------------------------
+# Backend interface
+# -------------------------------------------------------------------
+
+class StorageBackend(ABC):
+    """
+    Where the pipeline reads the master workbook and writes the output map.
+
+    GoogleStorageBackend talks to the real sheets; LocalStorageBackend is a
+    file-backed stand-in for offline end-to-end runs and benchmarks.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def download_master_tabs(self, tabs: Tuple[str, ...]) -> Dict[str, pd.DataFrame]:
+        """
+        {tab: DataFrame} for the requested master tabs (missing tab → empty).
+        """
+
+    @abstractmethod
+    async def download_workbook_bytes(self) -> bytes:
+        """
+        The whole master workbook as XLSX bytes.
+        """
+
+    @abstractmethod
+    async def read_output_values(self) -> Optional[List[List[Any]]]:
+        """
+        Current output map value grid (diff base), or None if absent.
+        """
+
+    @abstractmethod
+    async def upload_product_map(
+        self,
+        df: pd.DataFrame,
+        mode: str = "diff",
+        current_values: Optional[List[List[Any]]] = None,
+    ) -> Tuple[str, str]:
+        """
+        Write the map to the output sheet → (sheet id, link).
+        """
+
+    async def close(self) -> None:
+        pass
+
+
+class GoogleStorageBackend(StorageBackend):
+    """
+    Master / output Google Sheets via the pooled async client. gsheet_async
+    is imported on first use so local runs never load the Google libraries.
+    """
+
+    name = "google"
+
+    async def download_master_tabs(self, tabs: Tuple[str, ...]) -> Dict[str, pd.DataFrame]:
+        from .gsheet_async import download_master_tabs_async
+        return await download_master_tabs_async(tabs)
+
+    async def download_workbook_bytes(self) -> bytes:
+        from .gsheet_async import download_gsheet_xlsx_bytes_cached_async
+        return await download_gsheet_xlsx_bytes_cached_async(MASTER_SHEET_ID)
+
+    async def read_output_values(self) -> Optional[List[List[Any]]]:
+        from .gsheet_async import read_output_sheet_values_async
+        return await read_output_sheet_values_async()
+
+    async def upload_product_map(
+        self,
+        df: pd.DataFrame,
+        mode: str = "diff",
+        current_values: Optional[List[List[Any]]] = None,
+    ) -> Tuple[str, str]:
+        from .gsheet_async import upload_product_map_async
+        return await upload_product_map_async(df, mode=mode, current_values=current_values)
+
+    async def close(self) -> None:
+        from .gsheet_async import close_async_client
+        await close_async_client()
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    File-backed stand-in for the Google sheets:
+
+        <root>/master.xlsx        master workbook (all tabs)
+        <root>/output_map.json    output Product↔Retailer Map as a value grid
+
+    Every call sleeps latency_ms first so runs can be profiled with
+    realistic API round trips. Uploads apply the same diff rules as
+    upload_product_map and report how many cells / batch calls the real
+    backend would have sent.
+    """
+
+    name = "local"
+
+    def __init__(self, root: Path | str, latency_ms: float = 0.0):
+        self.root = Path(root)
+        self.latency_s = max(0.0, float(latency_ms)) / 1000.0
+        self.master_path = self.root / "master.xlsx"
+        self.output_path = self.root / "output_map.json"
+
+    async def _call(self) -> None:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+
+    def _read_master(self) -> bytes:
+        if not self.master_path.exists():
+            raise FileNotFoundError(
+                f"Local master workbook not found: {self.master_path} "
+                "(create one with storage.seed_local_master)"
+            )
+        return self.master_path.read_bytes()
+
+    async def download_master_tabs(self, tabs: Tuple[str, ...]) -> Dict[str, pd.DataFrame]:
+        await self._call()
+        data = await asyncio.to_thread(self._read_master)
+        available = pd.ExcelFile(io.BytesIO(data)).sheet_names
+        frames: Dict[str, pd.DataFrame] = {}
+        for tab in tabs:
+            if tab not in available:
+                print(f"⚠️ No '{tab}' tab in local master {self.master_path}")
+                frames[tab] = pd.DataFrame()
+                continue
+            df = pd.read_excel(io.BytesIO(data), sheet_name=tab).fillna("")
+            df.columns = [str(c).strip() for c in df.columns]
+            frames[tab] = df
+            print(f"⬇️ Read {len(df)} rows from '{tab}' in local master {self.master_path}")
+        return frames
+
+    async def download_workbook_bytes(self) -> bytes:
+        await self._call()
+        data = await asyncio.to_thread(self._read_master)
+        print(f"⬇️ Read local master workbook {self.master_path} ({len(data)} bytes)")
+        return data
+
+    async def read_output_values(self) -> Optional[List[List[Any]]]:
+        await self._call()
+        if not self.output_path.exists():
+            return None
+        with open(self.output_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    async def upload_product_map(
+        self,
+        df: pd.DataFrame,
+        mode: str = "diff",
+        current_values: Optional[List[List[Any]]] = None,
+    ) -> Tuple[str, str]:
+        from .gsheet import frame_to_values, plan_upload, chunk_ranges
+
+        values = frame_to_values(df)
+        old = current_values if current_values is not None else await self.read_output_values()
+
+        data, changed = plan_upload(old, values, mode)
+        if data is None:
+            await self._call()  # clear
+            calls = 1
+            print(f"⬆️ Wrote {len(df)} rows to local output {self.output_path}")
+        else:
+            calls = len(chunk_ranges(data))
+            print(
+                f"⬆️ Updated {changed} changed cells in {len(data)} ranges "
+                f"({calls} batch calls) of local output {self.output_path}"
+            )
+        for _ in range(calls):
+            await self._call()
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.output_path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(values, f, ensure_ascii=False)
+        os.replace(tmp, self.output_path)
+
+        return OUTPUT_SHEET_ID, self.output_path.resolve().as_uri()
+
+
+def seed_local_master(
+    root: Path | str,
+    rows: int,
+    base_url: str = "https://shop{shop}.example.com/products/item-{i}",
+    shops: int = 10,
+) -> Path:
+    """
+    Write a synthetic master.xlsx (Product↔Retailer Map + Active Watch List)
+    with `rows` product URLs spread over `shops` fake retailers.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    product_map = pd.DataFrame({
+        "product_id": [f"P{i:05d}" for i in range(rows)],
+        "DESCRIPTION": [f"Synthetic product {i}" for i in range(rows)],
+        "retailer_key": [f"shop{i % shops}" for i in range(rows)],
+        "search_url": [base_url.format(shop=i % shops, i=i) for i in range(rows)],
+    })
+    watch = pd.DataFrame({"product_id": product_map["product_id"].iloc[::25]})
+
+    path = root / "master.xlsx"
+    with pd.ExcelWriter(path, engine="openpyxl") as xw:
+        product_map.to_excel(xw, sheet_name=PRODUCT_MAP_TAB, index=False)
+        watch.to_excel(xw, sheet_name=ACTIVE_WATCH_TAB, index=False)
+    log(f"Seeded local master with {rows} rows → {path}", context="storage")
+    return path
+
+
+# -------------------------------------------------------------------
+# Selection
+# -------------------------------------------------------------------
+
+_BACKEND: Optional[StorageBackend] = None
+
+
+def get_storage_backend() -> StorageBackend:
+    """
+    Backend chosen by config.STORAGE_BACKEND (env RETAIL_SELECTOR_STORAGE).
+    """
+    global _BACKEND
+    if _BACKEND is None or _BACKEND.name != config.STORAGE_BACKEND:
+        if config.STORAGE_BACKEND == "local":
+            _BACKEND = LocalStorageBackend(config.LOCAL_STORAGE_DIR, config.LOCAL_STORAGE_LATENCY_MS)
+        elif config.STORAGE_BACKEND == "google":
+            _BACKEND = GoogleStorageBackend()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND {config.STORAGE_BACKEND!r} (expected 'google' or 'local')")
+        log(f"storage backend={_BACKEND.name}", context="storage")
+    return _BACKEND
+
+
+async def close_storage_backend() -> None:
+    if _BACKEND is not None:
+        await _BACKEND.close()
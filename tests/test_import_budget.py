@@ -0,0 +1,10 @@
+# retail_selector/tests/test_import_budget.py
+from __future__ import annotations
+
+from retailer_selector.import_budget import check_budgets
+
+
+def test_entry_points_within_import_budget():
+    # Fresh interpreters per entry point; fails on a slow import or an
+    # eagerly loaded heavy library (see import_budget.LAZY_MODULES)
+    assert check_budgets(runs=1) == []
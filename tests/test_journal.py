@@ -0,0 +1,53 @@
+# retail_selector/tests/test_journal.py
+from __future__ import annotations
+
+import json
+import time
+
+from retailer_selector import journal
+from retailer_selector.journal import JOURNAL_MAX_AGE_HOURS, RunJournal, load_journal, open_journal
+
+
+def _write_stale(path, key, age_hours):
+    rec = {"key": key, "ts": time.time() - age_hours * 3600, "values": {"Price ($USD)": 1.0}}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec) + "\n")
+
+
+def test_stale_journal_rows_are_not_resumed(tmp_path):
+    path = tmp_path / "journal_workbook.jsonl"
+    RunJournal(path).close()
+    # Yesterday's run got as far as the email: every row is journaled
+    _write_stale(path, "yesterday", JOURNAL_MAX_AGE_HOURS + 12)
+    j = RunJournal(path, resume=True)
+    j.record("today", {"Price ($USD)": 2.0})
+    j.close()
+
+    assert list(load_journal(path)) == ["today"]
+
+
+def test_rows_before_the_resumed_run_are_dropped(tmp_path):
+    path = tmp_path / "journal_map.jsonl"
+    RunJournal(path).close()
+    _write_stale(path, "earlier", 1)
+    since = time.time() - 60
+    j = RunJournal(path, resume=True)
+    j.record("failed-run", {"Price ($USD)": 2.0})
+    j.close()
+
+    assert list(load_journal(path, since=since)) == ["failed-run"]
+
+
+def test_open_journal_starts_over_when_nothing_is_fresh(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "STATE_DIR", tmp_path)
+    path = journal.journal_path("workbook")
+    RunJournal(path).close()
+    _write_stale(path, "yesterday", JOURNAL_MAX_AGE_HOURS + 12)
+
+    j, done = open_journal("workbook", resume=True)
+    j.close()
+
+    assert done == {}
+    # Truncated: just the new run's header is left
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1 and "run" in json.loads(lines[0])
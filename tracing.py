@@ -0,0 +1,184 @@
+# retail_selector/tracing.py
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+# Lightweight spans exported as Chrome trace-event JSON (chrome://tracing,
+# https://ui.perfetto.dev).
+#
+#   - Global phases (download, load, scan, save, upload, email) are complete
+#     ("X") events on the thread that ran them.
+#   - Per-row stages run on a *track* (the row's URL): async "b"/"e" events
+#     sharing one id, so every row gets its own lane and a run's concurrency
+#     is visible at a glance. Spans opened inside a tracked span inherit its
+#     track (also across asyncio.to_thread), so parsing / AI code does not
+#     need to know which row it serves.
+#
+# Off by default; enable_tracing() (orchestrator --trace) turns it on. When
+# off, span() returns a shared no-op context manager.
+
+# Stop recording after this many events (keeps memory bounded on huge runs)
+MAX_TRACE_EVENTS = 2_000_000
+
+_ENABLED = False
+_LOCK = threading.Lock()
+_EVENTS: List[Dict[str, Any]] = []
+_DROPPED = 0
+_PID = os.getpid()
+_T0 = time.perf_counter()
+
+_TRACK: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_track", default=None)
+
+
+def enable_tracing(enabled: bool = True) -> None:
+    global _ENABLED
+    _ENABLED = enabled
+
+
+def tracing_enabled() -> bool:
+    return _ENABLED
+
+
+def set_track(track: Optional[str]) -> None:
+    """
+    Put the current asyncio task (or thread) on a track: spans opened
+    later in it without an explicit track land there. Each task runs in
+    its own context copy, so this never leaks into other rows.
+    """
+    if _ENABLED:
+        _TRACK.set(track)
+
+
+def _us(t: float) -> float:
+    return round((t - _T0) * 1e6, 1)
+
+
+def _emit(events: List[Dict[str, Any]]) -> None:
+    global _DROPPED
+    with _LOCK:
+        if len(_EVENTS) + len(events) > MAX_TRACE_EVENTS:
+            _DROPPED += len(events)
+            return
+        _EVENTS.extend(events)
+
+
+def record_span(
+    name: str,
+    start: float,
+    end: float,
+    cat: str = "row",
+    track: Optional[str] = None,
+    **args: Any,
+) -> None:
+    """
+    Record a span from explicit time.perf_counter() timestamps (e.g. a
+    queue wait measured between enqueue and dequeue).
+    """
+    if not _ENABLED:
+        return
+    track = track if track is not None else _TRACK.get()
+    if track is None:
+        _emit([{
+            "name": name, "cat": cat, "ph": "X", "pid": _PID, "tid": threading.get_ident(),
+            "ts": _us(start), "dur": round((end - start) * 1e6, 1), "args": args,
+        }])
+    else:
+        base = {"name": name, "cat": cat, "pid": _PID, "tid": 0, "id": track}
+        _emit([
+            {**base, "ph": "b", "ts": _us(start), "args": args},
+            {**base, "ph": "e", "ts": _us(end)},
+        ])
+
+
+class _Span:
+    __slots__ = ("name", "cat", "track", "args", "_start", "_token")
+
+    def __init__(self, name: str, cat: str, track: Optional[str], args: Dict[str, Any]):
+        self.name = name
+        self.cat = cat
+        self.track = track
+        self.args = args
+
+    def set(self, **args: Any) -> None:
+        """
+        Attach results known only at the end (status, parse source, ...).
+        """
+        self.args.update(args)
+
+    def __enter__(self):
+        if self.track is not None:
+            self._token = _TRACK.set(self.track)
+        else:
+            self.track = _TRACK.get()
+            self._token = None
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        if self._token is not None:
+            _TRACK.reset(self._token)
+        record_span(self.name, self._start, end, self.cat, self.track or None, **self.args)
+        return False
+
+
+class _NoSpan:
+    def set(self, **args: Any) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, cat: str = "row", track: Optional[str] = None, **args: Any):
+    """
+    with span("fetch_attempt", cat="fetch", track=url, attempt=1) as s:
+        ...
+        s.set(status=200)
+
+    track=None inherits the enclosing span's track (or, at top level,
+    records a plain thread-scoped span).
+    """
+    if not _ENABLED:
+        return _NO_SPAN
+    return _Span(name, cat, track, dict(args))
+
+
+def export_trace(path: Path | str) -> Path:
+    """
+    Write all recorded events as Chrome trace-event JSON.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _LOCK:
+        events = list(_EVENTS)
+        dropped = _DROPPED
+    meta = [{
+        "name": "process_name", "ph": "M", "pid": _PID, "tid": 0,
+        "args": {"name": "retail_selector"},
+    }]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "traceEvents": meta + events,
+                "displayTimeUnit": "ms",
+                "otherData": {"dropped_events": dropped},
+            },
+            f,
+            default=str,
+        )
+    return path
@@ -1,32 +1,41 @@
 # retail_selector/workbook.py
 from __future__ import annotations
 
-import asyncio
-from datetime import datetime, timezone
+import io
+from concurrent.futures import Executor
 from pathlib import Path
-from typing import Dict, Any, List, Tuple, Optional
+from typing import TYPE_CHECKING, Dict, Any, BinaryIO, Tuple, Optional
 
 import pandas as pd
-import openpyxl
 
-from .scraping import scrapingbee_fetch_many
-from .parsing import hybrid_lookup_from_bee_result
+from .config import ACTIVE_WATCH_TAB, RETAILERS_TAB
 from .logger import log
+from .journal import RunJournal
+from .pipeline import Source, Sink, run_pipeline
+from .profiling import phase
+
+if TYPE_CHECKING:
+    import openpyxl  # only needed when writing a workbook
 
 
 # --------------------------------------------------------------
 # Load XLSX workbook safely into multiple pandas DataFrames
 # --------------------------------------------------------------
 
-def load_workbook_tables(workbook_path: Path) -> Dict[str, pd.DataFrame]:
+def load_workbook_tables(workbook: Path | bytes | BinaryIO) -> Dict[str, pd.DataFrame]:
     """
     Loads all sheets from XLSX safely into pandas DataFrames.
+    Accepts a path, the raw XLSX bytes, or a binary buffer (no disk round-trip).
     Returns dict: sheet_name -> DataFrame
     """
-    log(f"Loading workbook: {workbook_path}", context="workbook")
+    if isinstance(workbook, (bytes, bytearray, memoryview)):
+        log(f"Loading workbook from memory ({len(workbook)} bytes)", context="workbook")
+        workbook = io.BytesIO(workbook)
+    else:
+        log(f"Loading workbook: {workbook}", context="workbook")
 
     try:
-        xl = pd.ExcelFile(workbook_path)
+        xl = pd.ExcelFile(workbook)
     except Exception as e:
         log(f"ERROR loading workbook: {e!r}", context="workbook")
         raise
@@ -72,9 +81,19 @@ def extract_product_map(sheets: Dict[str, pd.DataFrame]) -> pd.DataFrame:
 
 
 # --------------------------------------------------------------
-# Save updated workbook back to disk
+# Save updated workbook (in memory and/or back to disk)
 # --------------------------------------------------------------
 
+def workbook_to_bytes(sheets: Dict[str, pd.DataFrame]) -> bytes:
+    """
+    Renders the updated sheets as XLSX bytes, without touching disk.
+    """
+    buf = io.BytesIO()
+    _build_workbook(sheets).save(buf)
+    log(f"Workbook rendered in memory ({buf.tell()} bytes).", context="workbook")
+    return buf.getvalue()
+
+
 def save_updated_workbook(
     workbook_path: Path,
     sheets: Dict[str, pd.DataFrame],
@@ -84,6 +103,15 @@ def save_updated_workbook(
     """
     log(f"Saving updated workbook → {workbook_path}", context="workbook")
 
+    wb = _build_workbook(sheets)
+    wb.save(workbook_path)
+    log("Workbook saved.", context="workbook")
+    return workbook_path
+
+
+def _build_workbook(sheets: Dict[str, pd.DataFrame]) -> openpyxl.Workbook:
+    import openpyxl
+
     wb = openpyxl.Workbook()
     wb.remove(wb.active)
 
@@ -97,9 +125,7 @@ def save_updated_workbook(
         for row in df.itertuples(index=False, name=None):
             ws.append(list(row))
 
-    wb.save(workbook_path)
-    log("Workbook saved.", context="workbook")
-    return workbook_path
+    return wb
 
 
 # --------------------------------------------------------------
@@ -109,154 +135,95 @@ def save_updated_workbook(
 async def scan_workbook_async(
     workbook_path: Path,
     scrapingbee_api_key: str,
-    limit: Optional[int] = None,
-    concurrency: int = 20,
+    **scan_kwargs: Any,
 ) -> Tuple[Path, pd.DataFrame]:
     """
     LOAD XLSX → extract Product↔Retailer Map → scrape → parse →
     update sheet → write XLSX → return path + updated df.
-    """
 
-    # ----------------------------------------------------------
-    # Load workbook
-    # ----------------------------------------------------------
+    Disk-based wrapper around scan_workbook_tables_async (same options).
+    """
     sheets = load_workbook_tables(workbook_path)
-    df = extract_product_map(sheets)
-
-    if df.empty:
-        log("Product map is empty — nothing to scan.", context="workbook")
-        sheets["Product↔Retailer Map"] = df
+    sheets, df = await scan_workbook_tables_async(sheets, scrapingbee_api_key, **scan_kwargs)
+    with phase("save_workbook"):
         save_updated_workbook(workbook_path, sheets)
-        return workbook_path, df
-
-    # ----------------------------------------------------------
-    # Clean + filter URLs (same logic as orchestrator)
-    # ----------------------------------------------------------
-    df["search_url"] = df["search_url"].astype(str).str.strip()
-    df = df[df["search_url"] != ""].copy()
-
-    log(f"Filtered to {len(df)} rows with valid search_url", context="workbook")
+    return workbook_path, df
 
-    if df.empty:
-        log("No valid URLs to scan.", context="workbook")
-        sheets["Product↔Retailer Map"] = df
-        save_updated_workbook(workbook_path, sheets)
-        return workbook_path, df
 
-    # Apply limit (like orchestrator)
-    if limit is not None:
-        df = df.head(limit).copy()
-        log(f"Limit applied: scanning first {limit} valid rows", context="workbook")
+class WorkbookSource(Source):
+    """
+    Product↔Retailer Map, Active Watch List and Retailers tab from
+    in-memory workbook sheets.
+    """
 
-    if df.empty:
-        log("After limit, nothing to scan.", context="workbook")
-        sheets["Product↔Retailer Map"] = df
-        save_updated_workbook(workbook_path, sheets)
-        return workbook_path, df
-
-    # ----------------------------------------------------------
-    # Ensure KPI columns
-    # ----------------------------------------------------------
-    kpis = [
-        "In Stock (Y/N)",
-        "Price ($USD)",
-        "Last Scan (UTC)",
-        "HTTP Status",
-        "Parse Method",
-        "Response ms",
-        "Last Error",
-        "URL Status",
-        "Validation Issues",
-    ]
+    name = "workbook"
 
-    for col in kpis:
-        if col not in df.columns:
-            df[col] = None
+    def __init__(self, sheets: Dict[str, pd.DataFrame]):
+        self.sheets = sheets
 
-    # ----------------------------------------------------------
-    # Build lists for scanning
-    # ----------------------------------------------------------
-    urls = df["search_url"].tolist()
-    df_indices = df.index.tolist()
+    async def load(self) -> Tuple[pd.DataFrame, Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+        return (
+            extract_product_map(self.sheets),
+            self.sheets.get(ACTIVE_WATCH_TAB),
+            self.sheets.get(RETAILERS_TAB),
+        )
 
-    log(f"Fetching {len(urls)} URLs (concurrency={concurrency})", context="workbook")
 
-    bee_results = await scrapingbee_fetch_many(
-        urls=urls,
-        api_key=scrapingbee_api_key,
-        concurrency=concurrency,
-    )
+class WorkbookSink(Sink):
+    """
+    Put the scanned map back into the workbook sheets.
+    """
 
-    now_iso = datetime.now(timezone.utc).isoformat()
+    name = "workbook"
 
-    # ----------------------------------------------------------
-    # Parse results & refill DataFrame
-    # ----------------------------------------------------------
-    for url, idx_in_df, bee in zip(urls, df_indices, bee_results):
-        row = df.loc[idx_in_df]
+    def __init__(self, sheets: Dict[str, pd.DataFrame]):
+        self.sheets = sheets
 
-        pid = str(row.get("product_id") or row.get("Product ID") or "").strip()
-        desc = str(row.get("DESCRIPTION") or row.get("product_name") or "").strip()
-        rkey = str(row.get("retailer_key") or row.get("Retailer") or "").strip()
+    async def write(self, df: pd.DataFrame) -> Dict[str, Any]:
+        self.sheets["Product↔Retailer Map"] = df
+        return {"rows": len(df)}
 
-        try:
-            parsed = hybrid_lookup_from_bee_result(
-                product_id=pid,
-                description=desc,
-                retailer_key=rkey,
-                original_url=url,
-                bee=bee,
-            )
 
-        except Exception as e:
-            log(f"Parse exception row={idx_in_df} {e!r}", context="workbook")
-            df.at[idx_in_df, "In Stock (Y/N)"] = ""
-            df.at[idx_in_df, "Price ($USD)"] = float("nan")
-            df.at[idx_in_df, "Last Error"] = f"parse_exception: {e!r}"
-            df.at[idx_in_df, "URL Status"] = "error"
-            df.at[idx_in_df, "HTTP Status"] = str(bee.get("status_code") or "")
-            df.at[idx_in_df, "Response ms"] = float(bee.get("response_ms") or 0.0)
-            df.at[idx_in_df, "Last Scan (UTC)"] = now_iso
-            continue
-
-        stock = parsed.get("stock")
-        price = parsed.get("price")
-        method = parsed.get("method")
-        status = parsed.get("status")
-        http_status = bee.get("status_code")
-        elapsed_ms = parsed.get("response_ms")
-        err = parsed.get("error")
-
-        # Normalize stock
-        if stock in (True, "Y", "y", "yes"):
-            sf = "Y"
-        elif stock in (False, "N", "n", "no"):
-            sf = "N"
-        else:
-            sf = stock or ""
-
-        df.at[idx_in_df, "In Stock (Y/N)"] = sf
-        df.at[idx_in_df, "Price ($USD)"] = float(price) if price is not None else float("nan")
-        df.at[idx_in_df, "Parse Method"] = method
-        df.at[idx_in_df, "HTTP Status"] = str(http_status or "")
-        df.at[idx_in_df, "URL Status"] = status
-        df.at[idx_in_df, "Response ms"] = float(elapsed_ms or 0.0)
-        df.at[idx_in_df, "Last Error"] = err or ""
-        df.at[idx_in_df, "Last Scan (UTC)"] = now_iso
-
-        log(
-            f"row={idx_in_df} url={url} price={price} stock={sf} "
-            f"method={method} status={status} http={http_status}",
-            context="workbook",
-        )
+async def scan_workbook_tables_async(
+    sheets: Dict[str, pd.DataFrame],
+    scrapingbee_api_key: str,
+    limit: Optional[int] = None,
+    concurrency: int = 20,
+    incremental: bool = False,
+    deadline: Optional[float] = None,
+    journal: Optional[RunJournal] = None,
+    resumed_rows: Optional[Dict[str, Dict[str, Any]]] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    parse_executor: Optional[Executor] = None,
+    save_state: bool = True,
+    state_path: Optional[Path] = None,
+) -> Tuple[Dict[str, pd.DataFrame], pd.DataFrame]:
+    """
+    In-memory workbook scan: extract Product↔Retailer Map → scrape →
+    parse → update sheet → return updated sheets + updated df.
 
-    # ----------------------------------------------------------
-    # Update sheets + write back to disk
-    # ----------------------------------------------------------
+    Rows without a search_url are dropped from the map. Options are those
+    of pipeline.run_pipeline (deadline = its fetch_deadline).
+    """
+    df, _ = await run_pipeline(
+        WorkbookSource(sheets),
+        scrapingbee_api_key,
+        sinks=[WorkbookSink(sheets)],
+        limit=limit,
+        incremental=incremental,
+        shard=shard,
+        concurrency=concurrency,
+        fetch_deadline=deadline,
+        journal=journal,
+        resumed_rows=resumed_rows,
+        parse_executor=parse_executor,
+        drop_blank_urls=True,
+        save_state=save_state,
+        state_path=state_path,
+    )
+    # Empty map / nothing left after filtering: no sink ran
     sheets["Product↔Retailer Map"] = df
 
-    save_updated_workbook(workbook_path, sheets)
-
     log("Workbook scan complete.", context="workbook")
 
-    return workbook_path, df
+    return sheets, df